@@ -7,11 +7,11 @@ This script simulates different types of database errors to test alerting
 import requests
 import json
 import time
-import threading
 import random
-from concurrent.futures import ThreadPoolExecutor
 import sys
 
+from scenario_engine import run_scenario_file
+
 FLASK_URL = "http://localhost:5000"
 
 class ErrorSimulator:
@@ -86,179 +86,54 @@ class ErrorSimulator:
             return False
     
     def health_check(self):
-        """Check service health"""
+        """Check service readiness (/ready serves the app's cached MySQL probe)"""
         try:
-            response = self.session.get(f"{self.base_url}/health")
+            response = self.session.get(f"{self.base_url}/ready")
             return response.status_code == 200
         except requests.exceptions.RequestException:
             return False
 
+    def circuit_status(self):
+        """MySQL circuit breaker state from /circuit-stats, or None if the app is not answering"""
+        try:
+            return self.session.get(f"{self.base_url}/circuit-stats").json()
+        except (requests.exceptions.RequestException, ValueError):
+            return None
+
+    def readiness(self):
+        """Readiness details from /ready, or None if the app is not answering"""
+        try:
+            return self.session.get(f"{self.base_url}/ready").json()
+        except (requests.exceptions.RequestException, ValueError):
+            return None
+
 def scenario_1_connection_pool_exhaustion(simulator):
     """
     Scenario 1: Database Connection Pool Exhaustion
     This simulates what happens when too many concurrent requests exhaust the connection pool
     """
-    print("\n" + "="*60)
-    print("SCENARIO 1: Database Connection Pool Exhaustion")
-    print("="*60)
-    
-    # Enable pool exhaustion simulation
-    if not simulator.simulate_pool_exhaustion():
-        print("Failed to enable simulation")
-        return
-    
-    # Generate multiple concurrent requests to trigger connection errors
-    def make_concurrent_requests():
-        operations = [
-            lambda: simulator.add_book(f"Book_{random.randint(1000, 9999)}", f"Author_{random.randint(100, 999)}"),
-            lambda: simulator.get_book(random.randint(1, 10)),
-            lambda: simulator.list_books(),
-        ]
-        
-        for _ in range(5):  # 5 operations per thread
-            operation = random.choice(operations)
-            operation()
-            time.sleep(random.uniform(0.1, 0.3))
-    
-    print("Generating concurrent database requests...")
-    
-    # Use ThreadPoolExecutor to create concurrent requests
-    with ThreadPoolExecutor(max_workers=8) as executor:
-        futures = [executor.submit(make_concurrent_requests) for _ in range(8)]
-        
-        # Wait for all threads to complete
-        for future in futures:
-            future.result()
-    
-    print("✓ Connection pool exhaustion scenario completed")
-    print("Expected: Multiple DATABASE_CONNECTION_ERROR entries in logs")
-    print("This should trigger the 'High Database Connection Errors' alert")
-    
-    # Reset after scenario
-    time.sleep(2)
-    simulator.reset_pool()
+    run_scenario_file("scenario1", simulator.base_url)
 
 def scenario_2_sustained_database_errors(simulator):
     """
     Scenario 2: Sustained Database Operation Errors
     This simulates ongoing database issues affecting multiple operations
     """
-    print("\n" + "="*60)
-    print("SCENARIO 2: Sustained Database Operation Errors")
-    print("="*60)
-    
-    # Enable pool exhaustion
-    simulator.simulate_pool_exhaustion()
-    
-    print("Generating sustained database errors over 5 minutes...")
-    
-    start_time = time.time()
-    error_count = 0
-    
-    while time.time() - start_time < 300:  # Run for 5 minutes
-        # Mix of different operations
-        operations = [
-            ("add_book", lambda: simulator.add_book(f"TestBook_{random.randint(1000, 9999)}", "Test Author")),
-            ("get_book", lambda: simulator.get_book(random.randint(1, 100))),
-            ("list_books", lambda: simulator.list_books()),
-            ("health_check", lambda: simulator.health_check()),
-        ]
-        
-        op_name, operation = random.choice(operations)
-        try:
-            operation()
-            error_count += 1
-        except:
-            pass
-        
-        time.sleep(random.uniform(2, 8))  # Random interval between requests
-        
-        # Print progress every minute
-        elapsed = time.time() - start_time
-        if int(elapsed) % 60 == 0 and int(elapsed) > 0:
-            print(f"  Progress: {int(elapsed/60)} minutes elapsed, ~{error_count} operations attempted")
-    
-    print("✓ Sustained error scenario completed")
-    print("Expected: Multiple DATABASE_ERROR entries spread over time")
-    print("This should trigger the 'Multiple Database Operation Errors' alert")
-    
-    # Reset after scenario
-    simulator.reset_pool()
+    run_scenario_file("scenario2", simulator.base_url)
 
 def scenario_3_error_rate_spike(simulator):
     """
     Scenario 3: Sudden Error Rate Spike
     This simulates a sudden burst of errors that would indicate a system failure
     """
-    print("\n" + "="*60)
-    print("SCENARIO 3: Sudden Error Rate Spike")
-    print("="*60)
-    
-    # Enable pool exhaustion for maximum error generation
-    simulator.simulate_pool_exhaustion()
-    
-    print("Generating rapid burst of errors...")
-    
-    def rapid_fire_requests():
-        """Generate rapid requests to create error spike"""
-        operations = [
-            lambda: simulator.add_book(f"RapidBook_{random.randint(10000, 99999)}", "Rapid Author"),
-            lambda: simulator.get_book(random.randint(1, 1000)),
-            lambda: simulator.list_books(),
-            lambda: simulator.stress_test_database(),
-        ]
-        
-        for _ in range(10):  # 10 rapid operations
-            operation = random.choice(operations)
-            operation()
-            time.sleep(0.1)  # Very short delay
-    
-    # Create multiple threads for rapid-fire requests
-    threads = []
-    for i in range(6):  # 6 concurrent threads
-        thread = threading.Thread(target=rapid_fire_requests)
-        threads.append(thread)
-        thread.start()
-        time.sleep(0.2)  # Stagger thread starts slightly
-    
-    # Wait for all threads to complete
-    for thread in threads:
-        thread.join()
-    
-    print("✓ Error rate spike scenario completed")
-    print("Expected: High concentration of errors in short time period")
-    print("This should trigger the 'Error Rate Spike Detection' alert")
-    
-    # Reset after scenario
-    time.sleep(2)
-    simulator.reset_pool()
+    run_scenario_file("scenario3", simulator.base_url)
 
 def scenario_4_service_degradation(simulator):
     """
     Scenario 4: Service Health Degradation
     This simulates gradual service degradation leading to health check failures
     """
-    print("\n" + "="*60)
-    print("SCENARIO 4: Service Health Degradation")
-    print("="*60)
-    
-    print("Simulating gradual service degradation...")
-    
-    # First, cause some database stress
-    simulator.simulate_pool_exhaustion()
-    
-    # Perform multiple health checks that will fail
-    for i in range(10):
-        print(f"  Health check attempt {i+1}/10")
-        simulator.health_check()
-        time.sleep(random.uniform(5, 15))  # Space out health checks
-    
-    print("✓ Service degradation scenario completed")
-    print("Expected: Multiple 'Health check failed' log entries")
-    print("This should trigger the 'Service Health Check Failures' alert")
-    
-    # Reset after scenario
-    simulator.reset_pool()
+    run_scenario_file("scenario4", simulator.base_url)
 
 def interactive_menu(simulator):
     """Interactive menu for manual testing"""
@@ -387,10 +262,31 @@ def view_status(simulator):
         print(f"Service Status: ✗ Not accessible ({e})")
     
     # Health check
-    if simulator.health_check():
+    status = simulator.readiness()
+    if status is None:
+        print("Health Check: ✗ Not accessible")
+    elif status.get('ready'):
         print("Health Check: ✓ Healthy")
     else:
         print("Health Check: ✗ Unhealthy")
+    if status is not None:
+        for name, check in status.get('checks', {}).items():
+            print(f"  {name}: {'ok' if check.get('ok') else check.get('error')} "
+                  f"({check.get('latency_ms')} ms, {status.get('age_s')}s ago)")
+        warmup = status.get('warmup', {})
+        if not warmup.get('done'):
+            print(f"  Startup: waiting on {warmup.get('current_step')} ({warmup.get('last_error')})")
+
+    # Circuit breaker (book routes answer 503 while it is open)
+    circuit = simulator.circuit_status()
+    if circuit is not None:
+        state = circuit.get('state')
+        marker = '✓' if state == 'closed' else '✗'
+        retry = f", retry in {circuit.get('retry_after')}s" if state == 'open' else ''
+        print(f"MySQL Circuit: {marker} {state}{retry} "
+              f"(opened {circuit.get('opened')}x, rejected {circuit.get('rejected')})")
+        if state != 'closed':
+            print(f"  Last error: {circuit.get('last_error')}")
 
 def run_all_scenarios(simulator):
     """Run all scenarios in sequence for comprehensive testing"""
@@ -430,6 +326,27 @@ def main():
     print("Flask App Error Simulation Tool")
     print("This tool generates various database errors to test Kibana alerting")
     
+    # Open-loop mode drives the scenarios at a fixed arrival rate
+    # e.g. --open-loop --scenario scenario1 --rate 200 --duration 60
+    if len(sys.argv) > 1 and sys.argv[1] == "--open-loop":
+        from load_engine import main as open_loop_main
+        open_loop_main(sys.argv[2:])
+        return
+
+    # Distributed mode splits the open-loop rate across one load worker process per CPU
+    # e.g. --distributed --scenario scenario1 --rate 5000 --duration 60 [--workers 8]
+    if len(sys.argv) > 1 and sys.argv[1] == "--distributed":
+        from load_engine import main as open_loop_main
+        open_loop_main(["--workers", "0"] + sys.argv[2:])
+        return
+    
+    # Declarative scenarios from scenarios/ (or any definition file)
+    # e.g. --run pool_exhaustion_cycle --rate-scale 2
+    if len(sys.argv) > 1 and sys.argv[1] == "--run":
+        from scenario_engine import main as scenario_main
+        scenario_main(sys.argv[2:])
+        return
+
     simulator = ErrorSimulator()
     
     # Test connection first
@@ -454,6 +371,9 @@ def main():
             scenario_4_service_degradation(simulator)
         else:
             print("Usage: python error_simulation.py [--all|--scenario1|--scenario2|--scenario3|--scenario4]")
+            print("       python error_simulation.py --open-loop [--scenario NAME] [--rate N] [--duration S] [--stand-in]")
+            print("       python error_simulation.py --run NAME|FILE [--rate-scale F]   (python scenario_engine.py --list)")
+            print("       python error_simulation.py --distributed [--workers N] [--scenario NAME] [--rate N] [--duration S]")
     else:
         interactive_menu(simulator)
 
@@ -0,0 +1,155 @@
+import random
+import threading
+import time
+
+import elasticapm
+from elasticapm.conf import constants
+from elasticapm.contrib.flask import ElasticAPM
+from elasticapm.traces import execution_context
+from elasticapm.contrib.flask.utils import get_data_from_request
+from elasticapm.utils import build_name_with_http_method_prefix
+from elasticapm.utils.disttracing import TraceParent
+from flask import request
+
+# Base agent settings per profile. 'debug' is what the app has always used:
+# every transaction fully captured with bodies and headers.
+APM_PROFILES = {
+    'debug': {
+        'DEBUG': True,
+        'CAPTURE_BODY': 'all',
+        'CAPTURE_HEADERS': True,
+    },
+    'production': {
+        'DEBUG': False,
+        'CAPTURE_BODY': 'errors',
+        'CAPTURE_HEADERS': False,
+        # Sampling is decided per route by SampledElasticAPM; the agent's own
+        # head sampling must not drop transactions before that.
+        'TRANSACTION_SAMPLE_RATE': 1.0,
+        'COLLECT_LOCAL_VARIABLES': 'off',
+    },
+}
+
+DEFAULT_ROUTE_SAMPLE_RATES = {
+    '/books/<book_id>': 0.05,
+    '/success': 0.1,
+    '/': 0.1,
+}
+
+
+class RouteSampler:
+    """
+    Per-route transaction sampling with an adaptive load factor.
+
+    Each route has a base rate (``default_rate`` when not listed). Once the
+    observed request rate goes above ``target_rps``, every base rate is
+    scaled by ``target_rps / observed_rps`` so the number of sampled
+    transactions stays roughly flat as traffic grows. The observed rate is
+    recomputed every ``window`` seconds.
+    """
+
+    def __init__(self, route_rates=None, default_rate=0.2, target_rps=50.0, window=1.0):
+        self.route_rates = dict(DEFAULT_ROUTE_SAMPLE_RATES if route_rates is None else route_rates)
+        self.default_rate = default_rate
+        self.target_rps = target_rps
+        self.window = window
+        self.scale = 1.0
+        self._lock = threading.Lock()
+        self._window_start = time.monotonic()
+        self._window_count = 0
+        self._counters = {'requests': 0, 'sampled': 0, 'kept_errors': 0, 'kept_slow': 0}
+
+    def _observe(self):
+        now = time.monotonic()
+        with self._lock:
+            self._window_count += 1
+            self._counters['requests'] += 1
+            elapsed = now - self._window_start
+            if elapsed >= self.window:
+                rps = self._window_count / elapsed
+                self.scale = min(1.0, self.target_rps / rps) if rps > 0 and self.target_rps > 0 else 1.0
+                self._window_start = now
+                self._window_count = 0
+
+    def rate_for(self, rule):
+        return self.route_rates.get(rule, self.default_rate) * self.scale
+
+    def should_sample(self, rule):
+        self._observe()
+        rate = self.rate_for(rule)
+        sampled = rate >= 1.0 or random.random() < rate
+        if sampled:
+            with self._lock:
+                self._counters['sampled'] += 1
+        return sampled, rate
+
+    def count_kept(self, reason):
+        with self._lock:
+            self._counters[reason] += 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, scale=round(self.scale, 4), target_rps=self.target_rps)
+
+
+class SampledElasticAPM(ElasticAPM):
+    """
+    ElasticAPM with per-route sampling decided by a RouteSampler.
+
+    The decision is made as the transaction starts, before the agent builds
+    the request context, so unsampled requests skip that work entirely.
+    Requests that continue an upstream trace keep the upstream decision.
+    Unsampled transactions that end in a 5xx or take longer than
+    ``slow_threshold_ms`` are kept anyway, without spans.
+    """
+
+    def __init__(self, app=None, sampler=None, slow_threshold_ms=1000.0, **kwargs):
+        self.sampler = sampler or RouteSampler()
+        self.slow_threshold_ms = slow_threshold_ms
+        super().__init__(app, **kwargs)
+
+    def request_started(self, app):
+        if (not self.app.debug or self.client.config.debug) and not self.client.should_ignore_url(request.path):
+            trace_parent = TraceParent.from_headers(request.headers)
+            transaction = self.client.begin_transaction("request", trace_parent=trace_parent)
+            rule = request.url_rule.rule if request.url_rule is not None else ""
+            if trace_parent is None:
+                self._sample(transaction, rule)
+            elasticapm.set_context(
+                lambda: get_data_from_request(request, self.client.config, constants.TRANSACTION), "request"
+            )
+            elasticapm.set_transaction_name(build_name_with_http_method_prefix(rule, request), override=False)
+
+    def _sample(self, transaction, rule):
+        sampled, rate = self.sampler.should_sample(rule)
+        transaction.is_sampled = sampled
+        transaction.trace_parent.trace_options.recorded = sampled
+        if sampled:
+            transaction.sample_rate = str(round(rate, 4))
+            transaction.trace_parent.add_tracestate(constants.TRACESTATE.SAMPLE_RATE, transaction.sample_rate)
+
+    def _keep(self, reason):
+        transaction = execution_context.get_transaction()
+        if transaction is None or transaction.is_sampled:
+            return
+        transaction.is_sampled = True
+        transaction.sample_rate = '1.0'
+        self.sampler.count_kept(reason)
+        elasticapm.set_context(
+            lambda: get_data_from_request(request, self.client.config, constants.TRANSACTION), "request"
+        )
+
+    def request_finished(self, app, response):
+        if response.status_code and response.status_code >= 500:
+            self._keep('kept_errors')
+        else:
+            transaction = execution_context.get_transaction()
+            if transaction is not None and \
+                    (time.perf_counter() - transaction.start_time) * 1000 >= self.slow_threshold_ms:
+                self._keep('kept_slow')
+        super().request_finished(app, response)
+
+    def handle_exception(self, *args, **kwargs):
+        # The agent ends the transaction here, before request_finished runs
+        self._keep('kept_errors')
+        super().handle_exception(*args, **kwargs)
@@ -1,40 +1,143 @@
-from flask import Flask, request, jsonify, abort
-from elasticapm.contrib.flask import ElasticAPM
+import time
+from startup import ReadinessProbe, StartupTimer, Warmup
+
+# Startup phases in ms, reported by /health. elasticapm is imported by the
+# warmup step that initializes APM, off the import path.
+startup_timer = StartupTimer()
+with startup_timer.phase('import.flask'):
+    from flask import Flask, Response, request, jsonify, abort
 import logging
 import random
-import time
 import os
-import mysql.connector
-from mysql.connector import Error
+import json
+import csv
+import io
+import base64
+with startup_timer.phase('import.mysql.connector'):
+    import mysql.connector
+    from mysql.connector import Error, IntegrityError, errorcode
 from http import HTTPStatus
+from werkzeug.exceptions import ServiceUnavailable
+from db_pool import ConnectionPool, SharedFlag
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from statement_cache import StatementCache
+from book_cache import BookCache
+from single_flight import SingleFlight
+from search_index import BookSearchIndex, tokenize
+from log_pipeline import QueueLogPipeline
+from log_format import EcsJsonFormatter
+from log_rotation import CompressingRotatingFileHandler
+from log_filters import (DuplicateSuppressor, InfoSampler, logger_levels, parse_levels, parse_route_rates,
+                         set_logger_levels)
+from metrics import MetricsRegistry, RequestMetrics, WorkerMetrics
 
 app = Flask(__name__)
 
 # Configure logging to file and console
+# LOG_MODE=queue moves the file/console writes onto a background thread
+# LOG_FORMAT=json writes ECS JSON lines to app.log for Filebeat's NDJSON input
+# app.log rotates by size (LOG_MAX_BYTES) or time (LOG_ROTATE_INTERVAL seconds);
+# rotated segments are gzipped in the background and LOG_BACKUP_COUNT are kept
+LOG_MODE = os.getenv('LOG_MODE', 'sync')
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')
+log_formatter = logging.Formatter('%(asctime)s %(levelname)s: %(message)s')
+LOG_FILE = os.getenv('LOG_FILE', '/var/log/flask/app.log')
+file_handler = CompressingRotatingFileHandler(
+    LOG_FILE,
+    max_bytes=int(os.getenv('LOG_MAX_BYTES', str(50 * 1024 * 1024))),
+    interval=int(os.getenv('LOG_ROTATE_INTERVAL', '86400')),
+    backup_count=int(os.getenv('LOG_BACKUP_COUNT', '14')),
+    compress=os.getenv('LOG_COMPRESS', '1') == '1',
+    compress_delay=float(os.getenv('LOG_COMPRESS_DELAY', '30'))
+)
+if LOG_FORMAT == 'json':
+    file_handler.setFormatter(EcsJsonFormatter(
+        service_name=os.getenv('ELASTIC_APM_SERVICE_NAME', 'flask-app'),
+        environment=os.getenv('APP_ENVIRONMENT', 'development')
+    ))
+else:
+    file_handler.setFormatter(log_formatter)
+console_handler = logging.StreamHandler()
+console_handler.setFormatter(log_formatter)
+log_handlers = [file_handler, console_handler]
+log_pipeline = None
+if LOG_MODE == 'queue':
+    log_pipeline = QueueLogPipeline(
+        log_handlers,
+        max_size=int(os.getenv('LOG_QUEUE_SIZE', '10000')),
+        policy=os.getenv('LOG_QUEUE_POLICY', 'drop_debug'),
+        batch_size=int(os.getenv('LOG_BATCH_SIZE', '256')),
+        flush_interval=float(os.getenv('LOG_FLUSH_INTERVAL', '0.5'))
+    )
+    log_handlers = [log_pipeline.handler]
+# Log volume control: INFO records on the routes in LOG_INFO_SAMPLE_RATES are
+# kept 1 in N; identical records at LOG_DEDUP_LEVEL and above within
+# LOG_DEDUP_WINDOW seconds collapse into one "(repeated N times)" summary;
+# /log-levels changes logger levels at runtime
+LOG_DEDUP_WINDOW = float(os.getenv('LOG_DEDUP_WINDOW', '10'))
+log_sampler = InfoSampler(parse_route_rates(os.getenv('LOG_INFO_SAMPLE_RATES', '')))
+log_dedup = None
+if LOG_DEDUP_WINDOW > 0:
+    log_dedup = DuplicateSuppressor(
+        window=LOG_DEDUP_WINDOW,
+        level=logging.getLevelName(os.getenv('LOG_DEDUP_LEVEL', 'WARNING').upper())
+    )
+for handler in log_handlers:
+    handler.addFilter(log_sampler)
+    if log_dedup is not None:
+        handler.addFilter(log_dedup)
 logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s %(levelname)s: %(message)s',
-    handlers=[
-        logging.FileHandler('/var/log/flask/app.log'),
-        logging.StreamHandler()
-    ]
+    level=os.getenv('LOG_LEVEL', 'DEBUG').upper(),
+    handlers=log_handlers
 )
+set_logger_levels(parse_levels(os.getenv('LOG_LEVELS', '')))
 logger = logging.getLogger(__name__)
-logger.debug("Flask app starting")
+logger.debug(f"Flask app starting (log mode={LOG_MODE})")
 
 # Configure Elastic APM
-app.config['ELASTIC_APM'] = {
-    'SERVICE_NAME': os.getenv('ELASTIC_APM_SERVICE_NAME', 'flask-app'),
-    'SERVER_URL': os.getenv('ELASTIC_APM_SERVER_URL', 'http://apm-server:8200'),
-    'DEBUG': True,
-    'CAPTURE_BODY': 'all',
-    'CAPTURE_HEADERS': True
-}
-try:
-    apm = ElasticAPM(app)
-    logger.debug("Elastic APM initialized successfully")
-except Exception as e:
-    logger.error(f"Failed to initialize Elastic APM: {str(e)}")
+# APM_PROFILE=production samples per route and only captures bodies on errors
+APM_PROFILE = os.getenv('APM_PROFILE', 'debug')
+apm_sampler = None
+apm = None
+
+def init_apm():
+    # Runs as a startup step; requests served before it finishes are not traced
+    global apm, apm_sampler
+    try:
+        with startup_timer.phase('import.elasticapm'):
+            from elasticapm.contrib.flask import ElasticAPM
+            from apm_profile import APM_PROFILES, RouteSampler, SampledElasticAPM
+        app.config['ELASTIC_APM'] = dict(
+            APM_PROFILES[APM_PROFILE],
+            SERVICE_NAME=os.getenv('ELASTIC_APM_SERVICE_NAME', 'flask-app'),
+            SERVER_URL=os.getenv('ELASTIC_APM_SERVER_URL', 'http://apm-server:8200'),
+            # Probes and scrapes would otherwise outnumber real transactions
+            TRANSACTIONS_IGNORE_PATTERNS=['^GET /health', '^GET /ready', '^GET /metrics']
+        )
+        if APM_PROFILE == 'production':
+            apm_sampler = RouteSampler(
+                route_rates=parse_route_rates(os.getenv('APM_ROUTE_SAMPLE_RATES', '')) or None,
+                default_rate=float(os.getenv('APM_DEFAULT_SAMPLE_RATE', '0.2')),
+                target_rps=float(os.getenv('APM_TARGET_RPS', '50'))
+            )
+            apm = SampledElasticAPM(app, sampler=apm_sampler,
+                                    slow_threshold_ms=float(os.getenv('APM_SLOW_THRESHOLD_MS', '1000')))
+        else:
+            apm = ElasticAPM(app)
+        logger.debug(f"Elastic APM initialized successfully (profile={APM_PROFILE})")
+    except Exception as e:
+        logger.error(f"Failed to initialize Elastic APM: {str(e)}")
+
+# In-process metrics for /metrics (Prometheus text format). Under gunicorn
+# each worker also writes them to METRICS_DIR and a scrape sums every
+# worker's values (see WorkerMetrics); without it they describe one process
+metrics_registry = MetricsRegistry()
+request_metrics = RequestMetrics(app, metrics_registry)
+db_query_seconds = metrics_registry.histogram(
+    'db_query_duration_seconds', 'MySQL statement time by operation', ('operation',))
+db_acquire_seconds = metrics_registry.histogram(
+    'db_pool_acquire_duration_seconds', 'Time to check a connection out of the pool, including waits')
+
 # Database configuration
 DB_CONFIG = {
     'host': 'mysql',
@@ -43,28 +146,122 @@ DB_CONFIG = {
     'password': 'flask_password'
 }
 
+# SERVING_MODE=async (gevent workers, see gunicorn.conf.py): the C extension
+# would block the whole worker while it waits on MySQL, the pure-Python
+# driver yields to other requests instead. Many more requests are in flight
+# per worker, so the pool defaults larger too.
+SERVING_MODE = os.getenv('SERVING_MODE', 'threads')
+if SERVING_MODE == 'async':
+    DB_CONFIG['use_pure'] = True
+
+# Connection pool settings
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '50' if SERVING_MODE == 'async' else '10'))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '5'))
+DB_POOL_HEALTH_CHECK_INTERVAL = float(os.getenv('DB_POOL_HEALTH_CHECK_INTERVAL', '30'))
+# Connections opened by the startup warmup so the first requests don't connect
+DB_POOL_WARM = int(os.getenv('DB_POOL_WARM', '2'))
+
+# Circuit breaker: DB_BREAKER_FAILURE_THRESHOLD consecutive connection errors
+# or pool timeouts open it; book routes then answer 503 DATABASE_CIRCUIT_OPEN
+# without touching MySQL until DB_BREAKER_COOLDOWN seconds have passed
+db_breaker = CircuitBreaker(
+    failure_threshold=int(os.getenv('DB_BREAKER_FAILURE_THRESHOLD', '5')),
+    cooldown=float(os.getenv('DB_BREAKER_COOLDOWN', '10')),
+    success_threshold=int(os.getenv('DB_BREAKER_SUCCESS_THRESHOLD', '1')),
+    is_failure=lambda e: db_error_type(e) == 'database_connection',
+    enabled=os.getenv('DB_BREAKER_ENABLED', '1') == '1'
+)
+
+# The book queries run as server-side prepared statements, prepared once per
+# pooled connection (at most PREPARED_STATEMENTS_PER_CONNECTION each) and
+# dropped with it. PREPARED_STATEMENTS_ENABLED=0 sends them as text again.
+db_statements = StatementCache(
+    max_per_connection=int(os.getenv('PREPARED_STATEMENTS_PER_CONNECTION', '16')),
+    enabled=os.getenv('PREPARED_STATEMENTS_ENABLED', '1') == '1'
+)
+
+# Connections are opened on first checkout, so this never touches MySQL
+db_pool = ConnectionPool(
+    DB_CONFIG,
+    size=DB_POOL_SIZE,
+    timeout=DB_POOL_TIMEOUT,
+    health_check_interval=DB_POOL_HEALTH_CHECK_INTERVAL,
+    acquire_observer=lambda seconds: db_acquire_seconds.observe((), seconds),
+    breaker=db_breaker,
+    statements=db_statements,
+    # A file, so POST /simulate-pool-exhaustion reaches every gunicorn worker
+    simulate_exhaustion=SharedFlag(os.getenv('POOL_EXHAUSTION_FLAG') or None)
+)
+
+# Bulk ingestion settings
+BULK_BATCH_SIZE = int(os.getenv('BULK_BATCH_SIZE', '500'))
+BULK_MAX_BATCH_SIZE = 5000
+
+# Listing and export settings
+BOOKS_PAGE_SIZE = int(os.getenv('BOOKS_PAGE_SIZE', '50'))
+BOOKS_MAX_PAGE_SIZE = 500
+EXPORT_FETCH_SIZE = int(os.getenv('EXPORT_FETCH_SIZE', '1000'))
+
+# Read-through cache for GET /books/<book_id>
+book_cache = BookCache(
+    max_size=int(os.getenv('BOOK_CACHE_SIZE', '1024')),
+    ttl=float(os.getenv('BOOK_CACHE_TTL', '60')),
+    enabled=os.getenv('BOOK_CACHE_ENABLED', '1') == '1'
+)
+
+# Concurrent lookups of the same book id share one SELECT (cache misses, or
+# every lookup with the cache off); waiters give up after BOOK_COALESCE_TIMEOUT
+book_lookups = SingleFlight(
+    timeout=float(os.getenv('BOOK_COALESCE_TIMEOUT', '5')),
+    enabled=os.getenv('BOOK_COALESCE_ENABLED', '1') == '1'
+)
+
+# GET /books/search is answered from an in-process index of titles and
+# authors. The startup warmup builds it; every SEARCH_SYNC_INTERVAL seconds
+# it picks up rows other workers added, and every SEARCH_REBUILD_INTERVAL
+# seconds it is rebuilt from the table. With SEARCH_INDEX_ENABLED=0, or until
+# it is built, searches use the MySQL FULLTEXT index instead.
+SEARCH_SYNC_INTERVAL = float(os.getenv('SEARCH_SYNC_INTERVAL', '5'))
+SEARCH_REBUILD_INTERVAL = float(os.getenv('SEARCH_REBUILD_INTERVAL', '600'))
+SEARCH_PAGE_SIZE = int(os.getenv('SEARCH_PAGE_SIZE', '20'))
+SEARCH_MAX_PAGE_SIZE = 100
+search_index = BookSearchIndex(enabled=os.getenv('SEARCH_INDEX_ENABLED', '1') == '1')
+
 def init_db():
-    conn=None
-    cursor=None
     try:
-        conn = mysql.connector.connect(**DB_CONFIG)
-        cursor = conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS books (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                title VARCHAR(255) NOT NULL UNIQUE,
-                author VARCHAR(255) NOT NULL
-            )
-        ''')
-        conn.commit()
-        logger.debug("MySQL database initialized successfully")
+        with db_pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                with db_query_seconds.time(('init_db',)):
+                    cursor.execute('''
+                        CREATE TABLE IF NOT EXISTS books (
+                            id INT AUTO_INCREMENT PRIMARY KEY,
+                            title VARCHAR(255) NOT NULL UNIQUE,
+                            author VARCHAR(255) NOT NULL
+                        )
+                    ''')
+                    # Serves GET /books/search when the in-process index is off
+                    try:
+                        cursor.execute("ALTER TABLE books ADD FULLTEXT INDEX ft_books_title_author (title, author)")
+                    except Error as e:
+                        if e.errno != errorcode.ER_DUP_KEYNAME:
+                            raise
+                conn.commit()
+            finally:
+                cursor.close()
+        warmed = db_pool.warm(DB_POOL_WARM)
+        logger.debug(f"MySQL database initialized successfully (pool size={DB_POOL_SIZE}, warmed={warmed})")
     except Error as e:
-        logger.error(f"MySQL initialization failed: {str(e)}")
+        logger.error(f"MySQL initialization failed: {str(e)}", extra={'error_type': db_error_type(e)})
         raise
-    finally:
-        if conn.is_connected():
-            cursor.close()
-            conn.close()
+
+def db_error_type(e):
+    if isinstance(e, CircuitOpenError):
+        return 'database_circuit_open'
+    # Lost or refused connections are alerted on separately from query errors
+    if e.errno in (2003, 2006, 2013):
+        return 'database_connection'
+    return 'database_general'
 
 # Custom exceptions
 class BookNotFoundError(Exception):
@@ -82,8 +279,56 @@ class InvalidBookIdError(Exception):
         self.message = f"Invalid book ID: {book_id}"
         super().__init__(self.message)
 
-# Initialize database
-init_db()
+def reject_circuit_open(e, operation):
+    # One message per operation, so duplicate suppression folds an outage into a few lines
+    logger.warning(f"DATABASE_CIRCUIT_OPEN: {operation} rejected while the MySQL circuit is open",
+                   extra={'operation': operation, 'error_type': 'database_circuit_open'})
+    raise ServiceUnavailable(description="Database unavailable", retry_after=int(e.retry_after) + 1)
+
+def load_books(after_id=0):
+    """Yield (id, title, author) rows with id > after_id, one short query per EXPORT_FETCH_SIZE rows"""
+    while True:
+        with db_pool.connection() as conn:
+            with db_query_seconds.time(('load_books',)):
+                rows = db_statements.execute(
+                    conn, "SELECT id, title, author FROM books WHERE id > %s ORDER BY id LIMIT %s",
+                    (after_id, EXPORT_FETCH_SIZE)
+                ).rows
+        yield from rows
+        if len(rows) < EXPORT_FETCH_SIZE:
+            return
+        after_id = rows[-1][0]
+
+def init_search_index():
+    search_index.rebuild(load_books())
+    search_index.start_sync(load_books, load_books, SEARCH_SYNC_INTERVAL, SEARCH_REBUILD_INTERVAL)
+
+def check_database():
+    with db_pool.connection() as conn:
+        db_statements.execute(conn, "SELECT 1")
+
+# Initialize APM and the database. STARTUP_MODE=background (default) does it
+# on a thread, retrying until MySQL is reachable, so workers start serving
+# at once and /ready reports when they can handle book requests.
+# STARTUP_MODE=blocking does it here and fails the import like it used to.
+STARTUP_MODE = os.getenv('STARTUP_MODE', 'background')
+warmup_steps = [('apm', init_apm), ('database', init_db)]
+if search_index.enabled:
+    warmup_steps.append(('search_index', init_search_index))
+warmup = Warmup(warmup_steps, startup_timer,
+                max_retry_delay=float(os.getenv('STARTUP_MAX_RETRY_DELAY', '10')))
+if STARTUP_MODE == 'blocking':
+    warmup.run(retry=False)
+else:
+    warmup.start()
+
+# /ready serves the last result of a probe that queries MySQL every
+# READY_PROBE_INTERVAL seconds, so probes never add queries of their own
+readiness = ReadinessProbe(
+    {'database': check_database},
+    interval=float(os.getenv('READY_PROBE_INTERVAL', '5')),
+    gates=[warmup.done.is_set]
+).start()
 
 @app.route('/')
 def home():
@@ -112,8 +357,9 @@ def error():
 @app.route('/slow')
 def slow():
     duration = random.uniform(1, 5)
+    # Holds a thread in threads mode; under SERVING_MODE=async only this greenlet waits
     time.sleep(duration)
-    logger.info(f"Slow endpoint accessed, slept for {duration} seconds")
+    logger.info("Slow endpoint accessed, slept for %s seconds", duration)
     return {"message": f"Slow response after {duration} seconds"}
 
 @app.route('/generate-error')
@@ -128,45 +374,63 @@ def random_endpoint():
         raise Exception("Random failure")
     logger.info("Random endpoint succeeded")
     return {"message": "Random success"}
+def fetch_book(book_id):
+    with db_pool.connection() as conn:
+        with db_query_seconds.time(('get_book',)):
+            rows = db_statements.execute(conn, "SELECT id, title, author FROM books WHERE id = %s", (book_id,)).rows
+        return rows[0] if rows else None
+
+def load_book(book_id):
+    return book_lookups.do(book_id, fetch_book)
+
+def invalidate_book(book_id):
+    book_cache.invalidate(book_id)
+    book_lookups.forget(book_id)
+
 @app.route('/books', methods=['POST'])
 def add_book():
-    conn=None
-    cursor=None
     try:
         data = request.get_json()
         if not data or 'title' not in data or 'author' not in data:
-            logger.error("Invalid book data: missing title or author")
+            logger.error("Invalid book data: missing title or author",
+                         extra={'operation': 'add_book', 'error_type': 'validation'})
             abort(400, description="Missing title or author")
         title = data['title']
         author = data['author']
-        conn = mysql.connector.connect(**DB_CONFIG)
-        cursor = conn.cursor()
-        cursor.execute("SELECT id FROM books WHERE title = %s", (title,))
-        if cursor.fetchone():
-            raise BookAlreadyRegisteredError(title)
-        cursor.execute("INSERT INTO books (title, author) VALUES (%s, %s)", (title, author))
-        conn.commit()
-        book_id = cursor.lastrowid
-        logger.info(f"Book added: ID={book_id}, Title={title}")
+        with db_pool.connection() as conn:
+            # UNIQUE(title) rejects duplicates atomically; no SELECT round trip
+            try:
+                with db_query_seconds.time(('add_book',)):
+                    book_id = db_statements.execute(
+                        conn, "INSERT INTO books (title, author) VALUES (%s, %s)", (title, author)
+                    ).lastrowid
+            except IntegrityError as e:
+                if e.errno == errorcode.ER_DUP_ENTRY:
+                    raise BookAlreadyRegisteredError(title)
+                raise
+            conn.commit()
+        invalidate_book(book_id)
+        search_index.add(book_id, title, author)
+        # Lazy arguments: sampled-out records are never formatted
+        logger.info("Book added: ID=%s, Title=%s", book_id, title, extra={'operation': 'add_book'})
         return {"message": "Book added", "id": book_id}, 201
     except BookAlreadyRegisteredError as e:
-        logger.error(f"Add book failed: {str(e)}")
+        logger.error(f"Add book failed: {str(e)}",
+                     extra={'operation': 'add_book', 'error_type': 'business_logic'})
         abort(409, description=str(e))
+    except CircuitOpenError as e:
+        reject_circuit_open(e, 'add_book')
     except Error as e:
-        logger.error(f"MySQL error adding book: {str(e)}")
+        logger.error(f"MySQL error adding book: {str(e)}",
+                     extra={'operation': 'add_book', 'error_type': db_error_type(e)})
         abort(500, description="Database error")
     except Exception as e:
-        logger.error(f"Unexpected error adding book: {str(e)}")
+        logger.error(f"Unexpected error adding book: {str(e)}",
+                     extra={'operation': 'add_book', 'error_type': 'unexpected'})
         abort(500, description="Unexpected error")
-    finally:
-        if conn.is_connected():
-            cursor.close()
-            conn.close()
 
 @app.route('/books/<book_id>', methods=['GET'])
 def get_book(book_id):
-    conn=None
-    cursor=None 
     try:
         try:
             book_id = int(book_id)
@@ -174,31 +438,500 @@ def get_book(book_id):
                 raise ValueError
         except ValueError:
             raise InvalidBookIdError(book_id)
-        conn = mysql.connector.connect(**DB_CONFIG)
-        cursor = conn.cursor()
-        cursor.execute("SELECT id, title, author FROM books WHERE id = %s", (book_id,))
-        book = cursor.fetchone()
+        book = book_cache.get_or_load(book_id, load_book)
         if not book:
             raise BookNotFoundError(book_id)
-        logger.info(f"Book fetched: ID={book_id}, Title={book[1]}")
+        logger.info("Book fetched: ID=%s, Title=%s", book_id, book[1], extra={'operation': 'get_book'})
         return {"id": book[0], "title": book[1], "author": book[2]}, 200
     except BookNotFoundError as e:
-        logger.error(f"Get book failed: {str(e)}")
+        logger.error(f"Get book failed: {str(e)}", extra={'operation': 'get_book'})
         abort(404, description=str(e))
     except InvalidBookIdError as e:
-        logger.error(f"Get book failed: {str(e)}")
+        logger.error(f"Get book failed: {str(e)}",
+                     extra={'operation': 'get_book', 'error_type': 'validation'})
         abort(400, description=str(e))
+    except CircuitOpenError as e:
+        reject_circuit_open(e, 'get_book')
     except Error as e:
-        logger.error(f"MySQL error fetching book: {str(e)}")
+        logger.error(f"MySQL error fetching book: {str(e)}",
+                     extra={'operation': 'get_book', 'error_type': db_error_type(e)})
         abort(500, description="Database error")
     except Exception as e:
-        logger.error(f"Unexpected error fetching book: {str(e)}")
+        logger.error(f"Unexpected error fetching book: {str(e)}",
+                     extra={'operation': 'get_book', 'error_type': 'unexpected'})
         abort(500, description="Unexpected error")
+
+def validate_bulk_item(item):
+    if not isinstance(item, dict) or 'title' not in item or 'author' not in item:
+        return "Missing title or author"
+    title, author = item['title'], item['author']
+    if not isinstance(title, str) or not isinstance(author, str) or not title or not author:
+        return "Title and author must be non-empty strings"
+    if len(title) > 255 or len(author) > 255:
+        return "Title and author must be at most 255 characters"
+    return None
+
+def insert_book_batch(conn, batch):
+    """
+    Insert (index, title, author) rows with one multi-row INSERT IGNORE.
+    Returns {index: book_id or None}; None means the title already existed.
+
+    Ids are looked up by title rather than derived from LAST_INSERT_ID(),
+    which need not be a contiguous block (innodb_autoinc_lock_mode=2). The
+    first SELECT fixes the transaction's snapshot (REPEATABLE READ), so the
+    second sees only the rows that existed then plus this batch's own. A
+    title another writer inserted in between is skipped by INSERT IGNORE and
+    stays invisible, so it is reported as a duplicate, not as created.
+    """
+    cursor = conn.cursor()
+
+    def select_ids(titles):
+        with db_query_seconds.time(('bulk_add_books',)):
+            cursor.execute(
+                "SELECT id, title FROM books WHERE title IN (" + ", ".join(["%s"] * len(titles)) + ")",
+                titles
+            )
+            return {title: book_id for book_id, title in cursor.fetchall()}
+
+    try:
+        existing = select_ids([title for _, title, _ in batch])
+        new = [row for row in batch if row[1] not in existing]
+        ids = {}
+        if new:
+            values = []
+            for _, title, author in new:
+                values.extend((title, author))
+            with db_query_seconds.time(('bulk_add_books',)):
+                cursor.execute(
+                    "INSERT IGNORE INTO books (title, author) VALUES " + ", ".join(["(%s, %s)"] * len(new)),
+                    values
+                )
+            if cursor.rowcount:
+                ids = select_ids([title for _, title, _ in new])
+        conn.commit()
+        return {index: ids.get(title) for index, title, _ in batch}
+    finally:
+        cursor.close()
+
+def iter_bulk_items():
+    if request.mimetype in ('application/x-ndjson', 'application/ndjson'):
+        for line in request.stream:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield None
+        return
+    data = request.get_json(silent=True)
+    if not isinstance(data, list):
+        logger.error("Invalid bulk book data: expected a JSON array or NDJSON",
+                     extra={'operation': 'bulk_add_books', 'error_type': 'validation'})
+        abort(400, description="Expected a JSON array or NDJSON body")
+    yield from data
+
+@app.route('/books/bulk', methods=['POST'])
+def bulk_add_books():
+    batch_size = min(request.args.get('batch_size', BULK_BATCH_SIZE, type=int), BULK_MAX_BATCH_SIZE)
+    if batch_size <= 0:
+        abort(400, description="batch_size must be positive")
+    results = []
+    batch = []
+    seen_titles = set()
+    counts = {'created': 0, 'duplicate': 0, 'invalid': 0}
+
+    def flush():
+        books = {index: (title, author) for index, title, author in batch}
+        # A connection per batch: none is held while the request body streams in
+        with db_pool.connection() as conn:
+            inserted = insert_book_batch(conn, batch)
+        for index, book_id in inserted.items():
+            if book_id is None:
+                results[index] = {"index": index, "status": "duplicate"}
+                counts['duplicate'] += 1
+            else:
+                results[index] = {"index": index, "status": "created", "id": book_id}
+                counts['created'] += 1
+                invalidate_book(book_id)
+                search_index.add(book_id, *books[index])
+        batch.clear()
+
+    try:
+        for index, item in enumerate(iter_bulk_items()):
+            problem = "Invalid JSON" if item is None else validate_bulk_item(item)
+            if problem:
+                results.append({"index": index, "status": "invalid", "error": problem})
+                counts['invalid'] += 1
+                continue
+            if item['title'] in seen_titles:
+                results.append({"index": index, "status": "duplicate"})
+                counts['duplicate'] += 1
+                continue
+            seen_titles.add(item['title'])
+            results.append(None)
+            batch.append((index, item['title'], item['author']))
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+        logger.info(f"Bulk books added: {counts['created']} created, {counts['duplicate']} duplicate, "
+                    f"{counts['invalid']} invalid", extra={'operation': 'bulk_add_books'})
+        return dict(counts, items=results), 200
+    except CircuitOpenError as e:
+        reject_circuit_open(e, 'bulk_add_books')
+    except Error as e:
+        logger.error(f"MySQL error bulk adding books: {str(e)}",
+                     extra={'operation': 'bulk_add_books', 'error_type': db_error_type(e)})
+        abort(500, description="Database error")
+
+def encode_cursor(book_id):
+    return base64.urlsafe_b64encode(str(book_id).encode()).decode().rstrip('=')
+
+def decode_cursor(token):
+    try:
+        book_id = int(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode())
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError(f"Invalid cursor: {token}")
+    if book_id <= 0:
+        raise ValueError(f"Invalid cursor: {token}")
+    return book_id
+
+@app.route('/books', methods=['GET'])
+def list_books():
+    try:
+        limit = request.args.get('limit', BOOKS_PAGE_SIZE, type=int)
+        if limit <= 0 or limit > BOOKS_MAX_PAGE_SIZE:
+            raise ValueError(f"limit must be between 1 and {BOOKS_MAX_PAGE_SIZE}")
+        order = request.args.get('order', 'asc')
+        if order not in ('asc', 'desc'):
+            raise ValueError("order must be 'asc' or 'desc'")
+        token = request.args.get('cursor')
+        after_id = decode_cursor(token) if token else None
+    except ValueError as e:
+        logger.error(f"List books failed: {str(e)}",
+                     extra={'operation': 'list_books', 'error_type': 'validation'})
+        abort(400, description=str(e))
+    # Keyset pagination: seek past the last id of the previous page instead of OFFSET
+    query = "SELECT id, title, author FROM books"
+    params = []
+    if after_id is not None:
+        query += " WHERE id > %s" if order == 'asc' else " WHERE id < %s"
+        params.append(after_id)
+    query += " ORDER BY id ASC LIMIT %s" if order == 'asc' else " ORDER BY id DESC LIMIT %s"
+    params.append(limit + 1)
+    try:
+        with db_pool.connection() as conn:
+            with db_query_seconds.time(('list_books',)):
+                rows = db_statements.execute(conn, query, params).rows
+    except CircuitOpenError as e:
+        reject_circuit_open(e, 'list_books')
+    except Error as e:
+        logger.error(f"MySQL error listing books: {str(e)}",
+                     extra={'operation': 'list_books', 'error_type': db_error_type(e)})
+        abort(500, description="Database error")
+    next_cursor = encode_cursor(rows[limit - 1][0]) if len(rows) > limit else None
+    books = [{"id": row[0], "title": row[1], "author": row[2]} for row in rows[:limit]]
+    logger.info(f"Books listed: {len(books)} books", extra={'operation': 'list_books'})
+    return {"books": books, "count": len(books), "next_cursor": next_cursor}, 200
+
+def export_rows(conn, fmt):
+    """
+    Yield the books table as NDJSON or CSV chunks from a checked-out connection.
+    Rows come from an unbuffered cursor EXPORT_FETCH_SIZE at a time, so
+    memory stays flat regardless of table size.
+    """
+    finished = False
+    exported = 0
+    error = None
+    try:
+        cursor = conn.cursor(buffered=False)
+        # Only the statement; rows are streamed while the response is written
+        with db_query_seconds.time(('export_books',)):
+            cursor.execute("SELECT id, title, author FROM books ORDER BY id")
+        if fmt == 'csv':
+            yield "id,title,author\r\n"
+        while True:
+            rows = cursor.fetchmany(EXPORT_FETCH_SIZE)
+            if not rows:
+                break
+            if fmt == 'csv':
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows(rows)
+                yield buffer.getvalue()
+            else:
+                yield "".join(
+                    json.dumps({"id": row[0], "title": row[1], "author": row[2]}) + "\n" for row in rows
+                )
+            exported += len(rows)
+        cursor.close()
+        finished = True
+        logger.info(f"Books exported: {exported} books as {fmt}", extra={'operation': 'export_books'})
+    except Error as e:
+        error = e
+        logger.error(f"MySQL error exporting books: {str(e)}",
+                     extra={'operation': 'export_books', 'error_type': db_error_type(e)})
+        raise
     finally:
-        if conn.is_connected():
-            cursor.close()
-            conn.close()
+        # An abandoned stream leaves unread rows on the socket; drop that connection
+        db_pool.release(conn, discard=not finished, error=error)
+
+@app.route('/books/export', methods=['GET'])
+def export_books():
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in ('ndjson', 'csv'):
+        logger.error(f"Export books failed: unsupported format {fmt}",
+                     extra={'operation': 'export_books', 'error_type': 'validation'})
+        abort(400, description="format must be 'ndjson' or 'csv'")
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    # Check out before streaming starts, while the status code can still say what went wrong
+    try:
+        conn = db_pool.get_connection()
+    except CircuitOpenError as e:
+        reject_circuit_open(e, 'export_books')
+    except Error as e:
+        logger.error(f"MySQL error exporting books: {str(e)}",
+                     extra={'operation': 'export_books', 'error_type': db_error_type(e)})
+        abort(500, description="Database error")
+    return Response(
+        export_rows(conn, fmt),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename=books.{fmt}'}
+    )
+
+def search_fulltext(tokens, limit):
+    # Boolean mode with the same semantics as the index: every word required, the last one as a prefix
+    terms = " ".join(f"+{token}" for token in tokens[:-1]) + f" +{tokens[-1]}*"
+    with db_pool.connection() as conn:
+        with db_query_seconds.time(('search_books',)):
+            return db_statements.execute(
+                conn,
+                "SELECT id, title, author FROM books WHERE MATCH(title, author) AGAINST (%s IN BOOLEAN MODE) "
+                "ORDER BY id LIMIT %s",
+                (terms, limit)
+            ).rows
+
+@app.route('/books/search', methods=['GET'])
+def search_books():
+    query = request.args.get('q', '')
+    limit = request.args.get('limit', SEARCH_PAGE_SIZE, type=int)
+    tokens = tokenize(query)
+    if not tokens or limit <= 0 or limit > SEARCH_MAX_PAGE_SIZE:
+        problem = "q must contain a word" if not tokens else f"limit must be between 1 and {SEARCH_MAX_PAGE_SIZE}"
+        logger.error(f"Search books failed: {problem}",
+                     extra={'operation': 'search_books', 'error_type': 'validation'})
+        abort(400, description=problem)
+    if search_index.enabled and search_index.ready:
+        source = 'index'
+        rows = search_index.search(query, limit)
+    else:
+        source = 'fulltext'
+        try:
+            rows = search_fulltext(tokens, limit)
+        except CircuitOpenError as e:
+            reject_circuit_open(e, 'search_books')
+        except Error as e:
+            logger.error(f"MySQL error searching books: {str(e)}",
+                         extra={'operation': 'search_books', 'error_type': db_error_type(e)})
+            abort(500, description="Database error")
+    books = [{"id": row[0], "title": row[1], "author": row[2]} for row in rows]
+    logger.info("Books searched: %s results from %s", len(books), source, extra={'operation': 'search_books'})
+    return {"query": query, "books": books, "count": len(books), "source": source}, 200
+
+@app.route('/health')
+def health():
+    # Liveness only: answers while the worker can serve, whatever MySQL does
+    return {
+        "status": "alive",
+        "pid": os.getpid(),
+        "uptime_s": round(time.perf_counter() - startup_timer.started, 1),
+        "startup_mode": STARTUP_MODE,
+        "startup_ms": startup_timer.stats(),
+    }, 200
+
+@app.route('/ready')
+def ready():
+    status = dict(readiness.status(), warmup=warmup.stats())
+    return status, 200 if status['ready'] else 503
+
+@app.route('/pool-stats')
+def pool_stats():
+    return dict(db_pool.stats(), serving_mode=SERVING_MODE), 200
+
+@app.route('/simulate-pool-exhaustion', methods=['POST'])
+def simulate_pool_exhaustion():
+    db_pool.simulate_exhaustion.set()
+    logger.warning("SIMULATION: Database connection pool exhaustion enabled")
+    return {"message": "Pool exhaustion simulation enabled"}, 200
+
+@app.route('/reset-pool', methods=['POST'])
+def reset_pool():
+    db_pool.simulate_exhaustion.clear()
+    logger.info("SIMULATION: Database connection pool reset")
+    return {"message": "Pool exhaustion simulation disabled"}, 200
+
+@app.route('/statement-stats')
+def statement_stats():
+    return db_statements.stats(), 200
+
+@app.route('/statement-stats', methods=['POST'])
+def toggle_statements():
+    data = request.get_json(silent=True) or {}
+    if 'enabled' in data:
+        db_statements.enabled = bool(data['enabled'])
+        logger.info(f"Prepared statements {'enabled' if db_statements.enabled else 'disabled'}")
+    return db_statements.stats(), 200
+
+@app.route('/circuit-stats')
+def circuit_stats():
+    return db_breaker.stats(), 200
+
+@app.route('/circuit-stats', methods=['POST'])
+def change_circuit():
+    data = request.get_json(silent=True) or {}
+    if 'enabled' in data:
+        db_breaker.enabled = bool(data['enabled'])
+        logger.info(f"MySQL circuit breaker {'enabled' if db_breaker.enabled else 'disabled'}")
+    if data.get('reset'):
+        db_breaker.reset()
+    return db_breaker.stats(), 200
+
+@app.route('/search-stats')
+def search_stats():
+    return search_index.stats(), 200
+
+@app.route('/search-stats', methods=['POST'])
+def change_search():
+    data = request.get_json(silent=True) or {}
+    if 'enabled' in data:
+        search_index.enabled = bool(data['enabled'])
+        logger.info(f"Book search index {'enabled' if search_index.enabled else 'disabled'}")
+    if data.get('rebuild'):
+        try:
+            init_search_index()
+        except Error as e:
+            logger.error(f"MySQL error rebuilding search index: {str(e)}",
+                         extra={'operation': 'search_books', 'error_type': db_error_type(e)})
+            abort(500, description="Database error")
+    return search_index.stats(), 200
+
+@app.route('/log-stats')
+def log_stats():
+    stats = {"mode": LOG_MODE, "rotation": file_handler.stats(), "sampling": log_sampler.stats()}
+    if log_dedup is not None:
+        stats["dedup"] = log_dedup.stats()
+    if log_pipeline is not None:
+        stats.update(log_pipeline.stats())
+    return stats, 200
+
+def pool_metrics():
+    stats = db_pool.stats()
+    return [(('idle',), stats['idle']), (('in_use',), stats['in_use'])]
+
+def pool_event_metrics():
+    stats = db_pool.stats()
+    return [((event,), stats[event]) for event in ('checkouts', 'waits', 'timeouts', 'created', 'discarded')]
+
+def statement_metrics():
+    stats = db_statements.stats()
+    return [((event,), stats[event]) for event in ('hits', 'misses', 'evicted', 'dropped')]
+
+def circuit_metrics():
+    state = db_breaker.stats()['state']
+    return [((name,), int(name == state)) for name in ('closed', 'open', 'half_open')]
+
+def circuit_event_metrics():
+    stats = db_breaker.stats()
+    return [((event,), stats[event]) for event in ('rejected', 'opened', 'failures', 'trials')]
+
+metrics_registry.gauges('db_circuit_state', 'MySQL circuit breaker state (1 for the current one)',
+                        ('state',), circuit_metrics)
+metrics_registry.gauges('db_circuit_events_total', 'Calls rejected while open, openings, failures and trials',
+                        ('event',), circuit_event_metrics, kind='counter')
+metrics_registry.gauges('db_prepared_statements_total', 'Prepared statement cache hits, misses, evictions and drops',
+                        ('event',), statement_metrics, kind='counter')
+metrics_registry.gauges('db_pool_connections', 'Open pool connections by state', ('state',), pool_metrics)
+metrics_registry.gauges('db_pool_events_total', 'Pool checkouts, waits, timeouts and connection churn',
+                        ('event',), pool_event_metrics, kind='counter')
+
+METRICS_DIR = os.getenv('METRICS_DIR', '')
+worker_metrics = None
+if METRICS_DIR:
+    worker_metrics = WorkerMetrics(metrics_registry, METRICS_DIR,
+                                   interval=float(os.getenv('METRICS_WRITE_INTERVAL', '1'))).start()
+
+@app.route('/metrics')
+def prometheus_metrics():
+    text = worker_metrics.expose() if worker_metrics is not None else metrics_registry.expose()
+    return Response(text, mimetype='text/plain; version=0.0.4')
+
+@app.route('/log-levels')
+def log_levels():
+    return logger_levels(), 200
+
+@app.route('/log-levels', methods=['POST'])
+def change_log_levels():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not data:
+        abort(400, description='Expected a JSON object of {"logger": "LEVEL"}')
+    try:
+        set_logger_levels(data)
+    except ValueError as e:
+        abort(400, description=str(e))
+    logger.warning(f"Log levels changed: {data}")
+    return logger_levels(), 200
+
+@app.route('/apm-stats')
+def apm_stats():
+    if apm_sampler is None:
+        return {"profile": APM_PROFILE}, 200
+    return dict(apm_sampler.stats(), profile=APM_PROFILE), 200
+
+@app.route('/cache-stats')
+def cache_stats():
+    return book_cache.stats(), 200
+
+@app.route('/cache-stats', methods=['POST'])
+def toggle_cache():
+    data = request.get_json(silent=True) or {}
+    if 'enabled' in data:
+        book_cache.enabled = bool(data['enabled'])
+        book_cache.clear()
+        logger.info(f"Book cache {'enabled' if book_cache.enabled else 'disabled'}")
+    return book_cache.stats(), 200
+
+@app.route('/coalesce-stats')
+def coalesce_stats():
+    return book_lookups.stats(), 200
+
+@app.route('/coalesce-stats', methods=['POST'])
+def toggle_coalescing():
+    data = request.get_json(silent=True) or {}
+    if 'enabled' in data:
+        book_lookups.enabled = bool(data['enabled'])
+        logger.info(f"Book lookup coalescing {'enabled' if book_lookups.enabled else 'disabled'}")
+    return book_lookups.stats(), 200
+
+def shutdown():
+    # Called by gunicorn's worker_exit hook once in-flight requests have drained
+    logger.debug(f"Worker {os.getpid()} shutting down")
+    warmup.stop()
+    readiness.stop()
+    search_index.stop()
+    if db_pool is not None:
+        db_pool.close()
+    if apm is not None:
+        apm.client.close()
+    if log_dedup is not None:
+        log_dedup.close()
+    if log_pipeline is not None:
+        log_pipeline.stop()
+    if worker_metrics is not None:
+        worker_metrics.stop()
+
+startup_timer.mark('app_import')
 
+# Development server only; production runs gunicorn with gunicorn.conf.py
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000,debug=True)
 
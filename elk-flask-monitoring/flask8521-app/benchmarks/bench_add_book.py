@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+add_book write path: SELECT-then-INSERT vs a single INSERT on UNIQUE(title)
+
+1. Concurrency check: ``--threads`` threads send ``POST /books`` with the
+   same title at the same moment, in-process through Flask's test client,
+   to app.py backed by the SQLite stand-in. That covers the pool checkout,
+   the prepared statement path and the duplicate key to 409 mapping of
+   ``add_book``. Exactly one request must get 201 and every other one 409.
+2. Throughput (with ``--host``): sequential inserts of unique titles with
+   the old SELECT+INSERT statements and the single INSERT, against a real
+   MySQL server using a scratch ``books_bench`` table with the same schema
+   as ``books``.
+
+Usage: python benchmarks/bench_add_book.py [--threads 50] [--host 127.0.0.1 --inserts 2000]
+"""
+
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+TABLE = 'books_bench'
+
+
+class Duplicate(Exception):
+    pass
+
+
+def two_query_insert(conn, title, author):
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"SELECT id FROM {TABLE} WHERE title = %s", (title,))
+        if cursor.fetchone():
+            raise Duplicate(title)
+        cursor.execute(f"INSERT INTO {TABLE} (title, author) VALUES (%s, %s)", (title, author))
+        conn.commit()
+        return cursor.lastrowid
+    finally:
+        cursor.close()
+
+
+def single_insert(conn, title, author):
+    from mysql.connector import IntegrityError, errorcode
+
+    cursor = conn.cursor()
+    try:
+        try:
+            cursor.execute(f"INSERT INTO {TABLE} (title, author) VALUES (%s, %s)", (title, author))
+        except IntegrityError as e:
+            if e.errno == errorcode.ER_DUP_ENTRY:
+                conn.rollback()
+                raise Duplicate(title)
+            raise
+        conn.commit()
+        return cursor.lastrowid
+    finally:
+        cursor.close()
+
+
+def concurrency_check(flask_app, threads):
+    """Status code counts for ``threads`` simultaneous POST /books of one title"""
+    title = f"race-{uuid.uuid4().hex}"
+    barrier = threading.Barrier(threads)
+    statuses = Counter()
+    lock = threading.Lock()
+
+    def worker():
+        client = flask_app.app.test_client()
+        barrier.wait()
+        status = client.post('/books', json={'title': title, 'author': 'Race Author'}).status_code
+        with lock:
+            statuses[status] += 1
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return statuses
+
+
+def throughput(db_config, insert, inserts):
+    import mysql.connector
+
+    conn = mysql.connector.connect(**db_config)
+    prefix = uuid.uuid4().hex
+    start = time.perf_counter()
+    for i in range(inserts):
+        insert(conn, f"{prefix}-{i}", 'Bench Author')
+    elapsed = time.perf_counter() - start
+    conn.close()
+    return inserts / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', help='MySQL server for the throughput comparison; skipped without it')
+    parser.add_argument('--port', type=int, default=3306)
+    parser.add_argument('--user', default='flask_user')
+    parser.add_argument('--password', default='flask_password')
+    parser.add_argument('--database', default='flask_app')
+    parser.add_argument('--threads', type=int, default=50)
+    parser.add_argument('--inserts', type=int, default=2000)
+    args = parser.parse_args()
+
+    import sqlite_mysql
+    workdir = tempfile.mkdtemp(prefix='bench-add-book-')
+    db_path = os.path.join(workdir, 'books.db')
+    sqlite_mysql.seed_books(db_path, 10)
+    sqlite_mysql.install(db_path)
+    os.environ.update(LOG_FILE=os.path.join(workdir, 'app.log'), ELASTIC_APM_ENABLED='false',
+                      STARTUP_MODE='blocking', DB_POOL_TIMEOUT='30')
+    import app as flask_app
+    logging.getLogger().removeHandler(flask_app.console_handler)
+
+    print(f"Concurrency check: {args.threads} simultaneous POST /books of one title "
+          f"(pool size {flask_app.DB_POOL_SIZE})")
+    statements_before = flask_app.db_statements.stats()
+    statuses = concurrency_check(flask_app, args.threads)
+    statements_after = flask_app.db_statements.stats()
+    prepared = sum(statements_after[k] - statements_before[k] for k in ('hits', 'misses'))
+    print(f"  201={statuses[201]} 409={statuses[409]} other={sum(statuses.values()) - statuses[201] - statuses[409]} "
+          f"prepared executions={prepared} connections in use after={flask_app.db_pool.stats()['in_use']}")
+    failed = statuses[201] != 1 or statuses[409] != args.threads - 1
+    if failed:
+        print(f"FAIL: expected one 201 and {args.threads - 1} 409s, got {dict(statuses)}")
+    flask_app.db_pool.close()
+
+    if args.host:
+        run_throughput(args)
+    if failed:
+        raise SystemExit(1)
+
+
+def run_throughput(args):
+    import mysql.connector
+
+    db_config = {
+        'host': args.host,
+        'port': args.port,
+        'user': args.user,
+        'password': args.password,
+        'database': args.database,
+    }
+    conn = mysql.connector.connect(**db_config)
+    cursor = conn.cursor()
+    cursor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+    cursor.execute(f'''
+        CREATE TABLE {TABLE} (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            title VARCHAR(255) NOT NULL UNIQUE,
+            author VARCHAR(255) NOT NULL
+        )
+    ''')
+    conn.commit()
+
+    paths = [('select+insert', two_query_insert), ('insert-only', single_insert)]
+    try:
+        print(f"Throughput: {args.inserts} sequential inserts")
+        for name, insert in paths:
+            print(f"  {name:<14} {throughput(db_config, insert, args.inserts):8.0f} inserts/s")
+    finally:
+        cursor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+        conn.commit()
+        cursor.close()
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
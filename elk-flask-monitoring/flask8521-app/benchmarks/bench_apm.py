@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Request throughput with APM off, the current debug settings and the production profile
+
+Each mode runs in its own process (the agent instruments globally) against a
+Flask app with stand-ins for /success and /books/<book_id>. A local HTTP
+server stands in for apm-server, so the agent's serialization and transport
+costs are included.
+
+Usage: python benchmarks/bench_apm.py [--requests N]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+MODES = ('off', 'debug', 'production')
+
+
+class IntakeHandler(BaseHTTPRequestHandler):
+    """Accepts APM intake requests and answers the server info probe"""
+
+    def do_GET(self):
+        body = json.dumps({'version': '8.10.2'}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.send_response(202)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def build_app(mode, server_url):
+    from flask import Flask
+
+    app = Flask(__name__)
+
+    @app.route('/success')
+    def success():
+        return {"message": "Success"}, 200
+
+    @app.route('/books/<book_id>')
+    def get_book(book_id):
+        return {"id": int(book_id), "title": "The Great Gatsby", "author": "F. Scott Fitzgerald"}, 200
+
+    if mode != 'off':
+        from elasticapm.contrib.flask import ElasticAPM
+        from apm_profile import APM_PROFILES, SampledElasticAPM
+
+        app.config['ELASTIC_APM'] = dict(
+            APM_PROFILES[mode],
+            SERVICE_NAME='flask-app-bench',
+            SERVER_URL=server_url,
+        )
+        if mode == 'production':
+            SampledElasticAPM(app)
+        else:
+            ElasticAPM(app)
+    return app
+
+
+def run_mode(mode, requests):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), IntakeHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    app = build_app(mode, f"http://127.0.0.1:{server.server_port}")
+    client = app.test_client()
+    paths = ['/success', '/books/1', '/books/2', '/books/3']
+    # buffered=True closes each response, which is where the agent ends the transaction
+    for i in range(200):
+        client.get(paths[i % len(paths)], buffered=True)
+    start = time.perf_counter()
+    for i in range(requests):
+        client.get(paths[i % len(paths)], buffered=True)
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+    print(json.dumps({'mode': mode, 'requests': requests, 'rps': requests / elapsed}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--mode', choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args.mode, args.requests)
+        return
+
+    results = {}
+    for mode in MODES:
+        out = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--mode', mode, '--requests', str(args.requests)],
+            check=True, capture_output=True, text=True
+        ).stdout
+        results[mode] = json.loads(out.strip().splitlines()[-1])['rps']
+
+    print(f"{'mode':<12} {'req/s':>8} {'vs off':>8}")
+    for mode in MODES:
+        print(f"{mode:<12} {results[mode]:>8.0f} {results[mode] / results['off']:>7.0%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Book requests and /success while MySQL is down, with and without the circuit breaker
+
+One gunicorn worker with ``--threads`` threads serves app.py. Every MySQL
+connect times out after ``--connect-timeout`` seconds (sqlite_mysql.refuse).
+For ``--duration`` seconds, ``--concurrency`` closed-loop clients request
+``GET /books/<id>`` with the cache off. Meanwhile two clients request
+``/success``, which never touches MySQL. Without the breaker, book requests
+hold the worker's threads for a connect timeout each, and /success waits
+behind them. With it, book requests fail with 503 as soon as the circuit
+opens, and /success keeps its normal latency. The last line is the cost of
+a checkout refused by an open circuit, measured in-process.
+
+Usage: python benchmarks/bench_circuit_breaker.py [--threads 8] [--concurrency 32] [--duration 10]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from collections import Counter
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(BENCH_DIR, '..')
+sys.path.insert(0, APP_DIR)
+sys.path.insert(0, os.path.join(APP_DIR, '..'))
+
+from bench_serving import free_port, wait_for_port  # noqa: E402
+from load_engine import HttpClient, LatencyHistogram  # noqa: E402
+
+SEED_BOOKS = 1000
+
+
+def start_server(breaker, args, workdir, port):
+    env = dict(os.environ, LOG_FILE=os.path.join(workdir, f'breaker-{breaker}.log'),
+               BENCH_DB_PATH=os.path.join(workdir, 'books.db'), BENCH_DB_DOWN=str(args.connect_timeout),
+               ELASTIC_APM_ENABLED='false', BOOK_CACHE_ENABLED='0', DB_BREAKER_ENABLED='1' if breaker else '0',
+               DB_POOL_SIZE=str(args.threads), GUNICORN_WORKERS='1', GUNICORN_THREADS=str(args.threads),
+               GUNICORN_TIMEOUT='120', GUNICORN_GRACEFUL_TIMEOUT='1')
+    command = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--pythonpath', BENCH_DIR,
+               '--bind', f'127.0.0.1:{port}', 'standin_wsgi:app']
+    output = open(os.path.join(workdir, f'breaker-{breaker}-server.out'), 'w')
+    process = subprocess.Popen(command, cwd=APP_DIR, env=env, stdout=output, stderr=subprocess.STDOUT,
+                               start_new_session=True)
+    wait_for_port(port, process)
+    return process, output
+
+
+def stop_server(process, output):
+    os.killpg(process.pid, signal.SIGKILL)
+    process.wait()
+    output.close()
+
+
+async def closed_loop(base_url, path, concurrency, duration, timeout):
+    client = HttpClient(base_url, max_connections=concurrency, timeout=timeout)
+    histogram = LatencyHistogram()
+    statuses = Counter()
+    end = time.perf_counter() + duration
+
+    async def worker():
+        while time.perf_counter() < end:
+            start = time.perf_counter()
+            try:
+                status = await client.request('GET', path())
+            except (OSError, asyncio.TimeoutError):
+                status = 'timeout'
+            histogram.record(time.perf_counter() - start)
+            statuses[status] += 1
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    await client.close()
+    return {
+        'requests': sum(statuses.values()),
+        'statuses': dict(statuses),
+        'p50_ms': round(histogram.value_at(50) * 1000, 2),
+        'p99_ms': round(histogram.value_at(99) * 1000, 2),
+    }
+
+
+async def outage(base_url, args):
+    return await asyncio.gather(
+        closed_loop(base_url, lambda: f"/books/{random.randint(1, SEED_BOOKS)}", args.concurrency,
+                    args.duration, args.timeout),
+        closed_loop(base_url, lambda: '/success', 2, args.duration, args.timeout),
+    )
+
+
+def rejection_us(iterations=100000):
+    from circuit_breaker import CircuitBreaker, CircuitOpenError
+    from db_pool import ConnectionPool
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=3600)
+    breaker.record_error(Exception('down'))
+    pool = ConnectionPool({}, breaker=breaker)
+    started = time.perf_counter()
+    for _ in range(iterations):
+        try:
+            pool.get_connection()
+        except CircuitOpenError:
+            pass
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--concurrency', type=int, default=32, help='Closed-loop clients on GET /books/<id>')
+    parser.add_argument('--connect-timeout', type=float, default=1.0, help='Seconds each connect takes to fail')
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--timeout', type=float, default=30.0, help='Seconds a client waits for an answer')
+    args = parser.parse_args()
+
+    import sqlite_mysql
+    workdir = tempfile.mkdtemp(prefix='bench-breaker-')
+    sqlite_mysql.seed_books(os.path.join(workdir, 'books.db'), SEED_BOOKS)
+
+    results = []
+    for breaker in (False, True):
+        port = free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        process, output = start_server(breaker, args, workdir, port)
+        try:
+            books, success = asyncio.run(outage(base_url, args))
+            with urllib.request.urlopen(f"{base_url}/circuit-stats", timeout=args.timeout) as response:
+                circuit = json.loads(response.read())
+        finally:
+            stop_server(process, output)
+        results.append((breaker, books, success, circuit))
+
+    print(f"1 worker x {args.threads} threads; MySQL down, connects fail after {args.connect_timeout:.1f} s; "
+          f"{args.concurrency} clients on GET /books/<id>, 2 on /success, {args.duration:.0f} s\n")
+    print(f"{'breaker':<8} {'route':<10} {'requests':>9} {'p50 ms':>9} {'p99 ms':>9}  statuses")
+    for breaker, books, success, circuit in results:
+        for route, r in (('books', books), ('success', success)):
+            statuses = ', '.join(f"{status}: {count}" for status, count in sorted(r['statuses'].items(), key=str))
+            print(f"{'on' if breaker else 'off':<8} {route:<10} {r['requests']:>9} {r['p50_ms']:>9.1f} "
+                  f"{r['p99_ms']:>9.1f}  {statuses}")
+        print(f"{'':<8} circuit: opened {circuit['opened']}x, rejected {circuit['rejected']}, "
+              f"failures {circuit['failures']}, trials {circuit['trials']}")
+    print(f"\ncheckout refused by an open circuit: {rejection_us():.2f} us")
+
+
+if __name__ == '__main__':
+    main()
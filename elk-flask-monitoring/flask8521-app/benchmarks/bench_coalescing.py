@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+GET /books/<id> bursts on a few hot ids with and without lookup coalescing
+
+Reproduces the ``get_book(random.randint(1, 10))`` traffic of
+error_simulator's scenario 1 in-process: ``--threads`` request threads hit
+app.py through Flask's test client, with the book cache off and a small
+pool, against the SQLite stand-in with ``--db-latency`` seconds per query.
+Reports how many SELECTs ran per request and how often the pool made
+requests wait or time out.
+
+Usage: python benchmarks/bench_coalescing.py [--threads 32] [--hot-ids 10] [--duration 5]
+"""
+
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+SEED_BOOKS = 1000
+
+
+def percentile(sorted_values, pct):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * pct / 100))]
+
+
+def run(flask_app, args):
+    pool_before = flask_app.db_pool.stats()
+    lookups_before = flask_app.book_lookups.stats()
+    latencies = []
+    failures = []
+    end = time.perf_counter() + args.duration
+
+    def worker():
+        client = flask_app.app.test_client()
+        mine, failed = [], 0
+        while time.perf_counter() < end:
+            start = time.perf_counter()
+            response = client.get(f"/books/{random.randint(1, args.hot_ids)}")
+            mine.append(time.perf_counter() - start)
+            if response.status_code >= 500:
+                failed += 1
+        latencies.extend(mine)
+        failures.append(failed)
+
+    threads = [threading.Thread(target=worker) for _ in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    pool_after = flask_app.db_pool.stats()
+    lookups_after = flask_app.book_lookups.stats()
+    latencies.sort()
+    requests = len(latencies)
+    selects = lookups_after['executions'] - lookups_before['executions']
+    return {
+        'requests': requests,
+        'rps': requests / args.duration,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'errors': sum(failures),
+        'selects': selects,
+        'selects_per_request': selects / requests,
+        'coalesced': lookups_after['coalesced'] - lookups_before['coalesced'],
+        'pool_waits': pool_after['waits'] - pool_before['waits'],
+        'pool_timeouts': pool_after['timeouts'] - pool_before['timeouts'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--hot-ids', type=int, default=10, help='Requests pick ids from 1..N')
+    parser.add_argument('--duration', type=float, default=5.0)
+    parser.add_argument('--db-latency', type=float, default=0.02, help='Seconds added to every query')
+    parser.add_argument('--pool-size', type=int, default=5)
+    args = parser.parse_args()
+
+    import sqlite_mysql
+    workdir = tempfile.mkdtemp(prefix='bench-coalescing-')
+    db_path = os.path.join(workdir, 'books.db')
+    sqlite_mysql.seed_books(db_path, SEED_BOOKS)
+    sqlite_mysql.install(db_path, args.db_latency)
+    os.environ.update(LOG_FILE=os.path.join(workdir, 'app.log'), ELASTIC_APM_ENABLED='false',
+                      BOOK_CACHE_ENABLED='0', DB_POOL_SIZE=str(args.pool_size), DB_POOL_TIMEOUT='2')
+    import app as flask_app
+    logging.getLogger().removeHandler(flask_app.console_handler)
+
+    results = {}
+    for enabled in (False, True):
+        flask_app.book_lookups.enabled = enabled
+        results['coalesced' if enabled else 'per request'] = run(flask_app, args)
+
+    print(f"{args.threads} threads on ids 1..{args.hot_ids}; pool size {args.pool_size}; "
+          f"{args.db_latency * 1000:.0f} ms per query; cache off\n")
+    print(f"{'lookups':<12} {'req/s':>7} {'p50 ms':>7} {'p99 ms':>7} {'5xx':>5} {'SELECTs':>8} "
+          f"{'per req':>8} {'joined':>7} {'pool waits':>11} {'timeouts':>9}")
+    for name, r in results.items():
+        print(f"{name:<12} {r['rps']:>7.0f} {r['p50_ms']:>7.1f} {r['p99_ms']:>7.1f} {r['errors']:>5} "
+              f"{r['selects']:>8} {r['selects_per_request']:>8.3f} {r['coalesced']:>7} "
+              f"{r['pool_waits']:>11} {r['pool_timeouts']:>9}")
+
+
+if __name__ == '__main__':
+    main()
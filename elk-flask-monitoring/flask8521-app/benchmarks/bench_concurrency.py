@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Simultaneous slow requests one gunicorn worker can hold: threads vs async
+
+For each mode a single gunicorn worker serves app.py on the SQLite stand-in
+and receives one wave of ``--concurrency`` simultaneous requests, against a
+fresh server per endpoint:
+
+- ``/slow``, which sleeps 1-5 s
+- ``GET /books/<id>`` with the book cache off and ``--db-latency`` seconds
+  added to every query, standing in for the MySQL round trip
+
+In ``threads`` mode (gthread, ``--threads`` threads) requests queue for a
+thread. In ``async`` mode (SERVING_MODE=async, gevent) they all wait at
+once, bounded only by the DB pool for the book lookups. Requests without an
+answer after ``--timeout`` seconds count as timeouts.
+
+Usage: python benchmarks/bench_concurrency.py [--concurrency 1000] [--threads 4] [--timeout 20]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(BENCH_DIR, '..')
+sys.path.insert(0, APP_DIR)
+sys.path.insert(0, os.path.join(APP_DIR, '..'))
+
+from bench_serving import free_port, wait_for_port  # noqa: E402
+from load_engine import HttpClient, LatencyHistogram  # noqa: E402
+
+SEED_BOOKS = 1000
+
+
+def start_server(mode, args, workdir, port):
+    env = dict(os.environ, LOG_FILE=os.path.join(workdir, f'{mode}.log'),
+               BENCH_DB_PATH=os.path.join(workdir, 'books.db'), BENCH_DB_LATENCY=str(args.db_latency),
+               ELASTIC_APM_ENABLED='false', BOOK_CACHE_ENABLED='0', SERVING_MODE=mode,
+               GUNICORN_WORKERS='1', GUNICORN_THREADS=str(args.threads),
+               GUNICORN_WORKER_CONNECTIONS=str(args.concurrency * 2), GUNICORN_GRACEFUL_TIMEOUT='1')
+    command = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--pythonpath', BENCH_DIR,
+               '--bind', f'127.0.0.1:{port}', '--backlog', str(args.concurrency * 2), 'standin_wsgi:app']
+    output = open(os.path.join(workdir, f'{mode}-server.out'), 'a')
+    process = subprocess.Popen(command, cwd=APP_DIR, env=env, stdout=output, stderr=subprocess.STDOUT,
+                               start_new_session=True)
+    wait_for_port(port, process)
+    return process, output
+
+
+def stop_server(process, output):
+    # Threads mode still has a queue of requests whose clients gave up; don't wait for them
+    os.killpg(process.pid, signal.SIGKILL)
+    process.wait()
+    output.close()
+
+
+async def wave(base_url, paths, timeout):
+    """Send every path at once; one connection each"""
+    client = HttpClient(base_url, max_connections=len(paths), timeout=timeout)
+    histogram = LatencyHistogram()
+    outcome = {'ok': 0, 'errors': 0, 'timeouts': 0}
+
+    async def one(path):
+        start = time.perf_counter()
+        try:
+            status = await client.request('GET', path)
+        except asyncio.TimeoutError:
+            outcome['timeouts'] += 1
+            return
+        except OSError:
+            outcome['errors'] += 1
+            return
+        if status >= 400:
+            outcome['errors'] += 1
+            return
+        outcome['ok'] += 1
+        histogram.record(time.perf_counter() - start)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(path) for path in paths))
+    elapsed = time.perf_counter() - started
+    await client.close()
+    return dict(
+        outcome,
+        seconds=round(elapsed, 2),
+        rps=round(outcome['ok'] / elapsed, 1),
+        p50_ms=round(histogram.value_at(50) * 1000, 1) if outcome['ok'] else None,
+        p99_ms=round(histogram.value_at(99) * 1000, 1) if outcome['ok'] else None,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--concurrency', type=int, default=1000, help='Simultaneous requests per wave')
+    parser.add_argument('--threads', type=int, default=4, help='Threads of the threads-mode worker')
+    parser.add_argument('--db-latency', type=float, default=0.05, help='Seconds added to every query')
+    parser.add_argument('--timeout', type=float, default=20.0, help='Seconds a client waits for an answer')
+    parser.add_argument('--output', help='Write results as JSON')
+    args = parser.parse_args()
+
+    import sqlite_mysql
+    workdir = tempfile.mkdtemp(prefix='bench-concurrency-')
+    sqlite_mysql.seed_books(os.path.join(workdir, 'books.db'), SEED_BOOKS)
+
+    endpoints = {
+        'slow': lambda: '/slow',
+        'get_book': lambda: f"/books/{random.randint(1, SEED_BOOKS)}",
+    }
+    results = []
+    for mode in ('threads', 'async'):
+        for endpoint, path in endpoints.items():
+            port = free_port()
+            process, output = start_server(mode, args, workdir, port)
+            try:
+                paths = [path() for _ in range(args.concurrency)]
+                result = asyncio.run(wave(f"http://127.0.0.1:{port}", paths, args.timeout))
+            finally:
+                stop_server(process, output)
+            results.append(dict(mode=mode, endpoint=endpoint, **result))
+
+    print(f"1 worker; threads mode {args.threads} threads; {args.concurrency} simultaneous requests; "
+          f"{args.db_latency * 1000:.0f} ms per query; {args.timeout:.0f} s client timeout\n")
+    print(f"{'mode':<8} {'endpoint':<10} {'ok':>6} {'timeouts':>9} {'errors':>7} {'seconds':>8} "
+          f"{'req/s':>8} {'p50 ms':>9} {'p99 ms':>9}")
+    for r in results:
+        p50 = f"{r['p50_ms']:.0f}" if r['p50_ms'] is not None else '-'
+        p99 = f"{r['p99_ms']:.0f}" if r['p99_ms'] is not None else '-'
+        print(f"{r['mode']:<8} {r['endpoint']:<10} {r['ok']:>6} {r['timeouts']:>9} {r['errors']:>7} "
+              f"{r['seconds']:>8.1f} {r['rps']:>8.1f} {p50:>9} {p99:>9}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
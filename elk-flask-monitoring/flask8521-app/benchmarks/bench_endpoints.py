@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Throughput and latency percentiles for app.py endpoints, without MySQL
+
+The real app runs in a child process under werkzeug's threaded WSGI server,
+with ``mysql.connector.connect`` routed to a scratch SQLite file
+(benchmarks/sqlite_mysql.py) seeded with ``--seed-books`` rows. The parent
+drives each endpoint closed-loop at every concurrency level for
+``--duration`` seconds and records latencies with load_engine's histograms.
+Logging goes to a temporary app.log and APM is disabled unless ``--apm``
+is given, in which case a local stand-in receives the agent's events.
+
+Results are written as JSON with ``--output``. ``--baseline`` compares the
+run against a saved results file and exits 1 when an endpoint lost more than
+``--threshold`` of its throughput or its p99 grew by more than
+``--latency-threshold``. ``--results`` compares an existing file instead of
+running.
+
+Usage: python benchmarks/bench_endpoints.py [--concurrency 1,8,32] [--duration 5]
+                                            [--output results.json] [--baseline baseline.json]
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(BENCH_DIR, '..')
+sys.path.insert(0, APP_DIR)
+sys.path.insert(0, os.path.join(APP_DIR, '..'))
+
+ENDPOINTS = ('index', 'success', 'add_book', 'get_book')
+
+
+def serve(db_path, seed_books, apm):
+    """Child process: seed the stand-in database, import app.py and serve it"""
+    sys.path.insert(0, BENCH_DIR)
+    import sqlite_mysql
+    sqlite_mysql.install(db_path)
+
+    if apm:
+        import threading
+        from http.server import ThreadingHTTPServer
+        from bench_apm import IntakeHandler
+        intake = ThreadingHTTPServer(('127.0.0.1', 0), IntakeHandler)
+        threading.Thread(target=intake.serve_forever, daemon=True).start()
+        os.environ['ELASTIC_APM_SERVER_URL'] = f"http://127.0.0.1:{intake.server_port}"
+    else:
+        os.environ['ELASTIC_APM_ENABLED'] = 'false'
+
+    import app as flask_app
+    from werkzeug.serving import make_server
+
+    # Schema creation runs in the background (STARTUP_MODE); seed after it
+    flask_app.warmup.wait()
+
+    with flask_app.db_pool.connection() as conn:
+        cursor = conn.cursor()
+        for start in range(0, seed_books, 500):
+            rows = [(f"Seed Book {i}", f"Author {i % 97}") for i in range(start, min(start + 500, seed_books))]
+            cursor.execute(
+                "INSERT IGNORE INTO books (title, author) VALUES " + ", ".join(["(%s, %s)"] * len(rows)),
+                [value for row in rows for value in row]
+            )
+        conn.commit()
+        cursor.close()
+
+    server = make_server('127.0.0.1', 0, flask_app.app, threaded=True)
+    print(f"READY {server.server_port}", flush=True)
+    server.serve_forever()
+
+
+def operations(seed_books):
+    titles = itertools.count()
+    run_id = f"{os.getpid()}-{int(time.time())}"
+    return {
+        'index': lambda: ('GET', '/', None),
+        'success': lambda: ('GET', '/success', None),
+        'add_book': lambda: ('POST', '/books', {"title": f"Bench {run_id} {next(titles)}", "author": "Bench"}),
+        'get_book': lambda: ('GET', f"/books/{random.randint(1, seed_books)}", None),
+    }
+
+
+async def drive(base_url, build, concurrency, duration, warmup):
+    """Closed loop: ``concurrency`` workers each send the next request as soon as one returns"""
+    from load_engine import HttpClient, LatencyHistogram
+
+    client = HttpClient(base_url, max_connections=concurrency)
+    histogram = LatencyHistogram()
+    errors = 0
+    completed = 0
+    warmup_end = time.perf_counter() + warmup
+    end = warmup_end + duration
+
+    async def worker():
+        nonlocal errors, completed
+        while True:
+            method, path, body = build()
+            start = time.perf_counter()
+            if start >= end:
+                return
+            try:
+                status = await client.request(method, path, body)
+            except (OSError, asyncio.TimeoutError):
+                status = None
+            if start < warmup_end:
+                continue
+            histogram.record(time.perf_counter() - start)
+            completed += 1
+            if status is None or status >= 400:
+                errors += 1
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    await client.close()
+    return {
+        'requests': completed,
+        'errors': errors,
+        'rps': round(completed / duration, 1),
+        'p50_ms': round(histogram.value_at(50) * 1000, 3),
+        'p90_ms': round(histogram.value_at(90) * 1000, 3),
+        'p99_ms': round(histogram.value_at(99) * 1000, 3),
+        'max_ms': round(histogram.max * 1000, 3),
+        'histogram': histogram.to_dict(),
+    }
+
+
+def run(args):
+    workdir = tempfile.mkdtemp(prefix='bench-endpoints-')
+    env = dict(os.environ, LOG_FILE=os.path.join(workdir, 'app.log'))
+    child_log = open(os.path.join(workdir, 'server.log'), 'w')
+    server = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), '--serve', os.path.join(workdir, 'books.db'),
+         '--seed-books', str(args.seed_books)] + (['--apm'] if args.apm else []),
+        cwd=APP_DIR, env=env, stdout=subprocess.PIPE, stderr=child_log, text=True
+    )
+    try:
+        line = server.stdout.readline()
+        if not line.startswith('READY'):
+            raise SystemExit(f"App server failed to start, see {child_log.name}")
+        base_url = f"http://127.0.0.1:{line.split()[1]}"
+        builders = operations(args.seed_books)
+        results = []
+        for endpoint in args.endpoints:
+            for concurrency in args.concurrency:
+                result = asyncio.run(drive(base_url, builders[endpoint], concurrency, args.duration, args.warmup))
+                result.update(endpoint=endpoint, concurrency=concurrency)
+                results.append(result)
+                print(f"{endpoint:<10} c={concurrency:<4} {result['rps']:>8.0f} req/s  "
+                      f"p50 {result['p50_ms']:>7.2f} ms  p99 {result['p99_ms']:>8.2f} ms  "
+                      f"errors {result['errors']}")
+    finally:
+        server.terminate()
+        server.wait()
+        child_log.close()
+
+    return {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'commit': git_commit(),
+            'duration': args.duration,
+            'seed_books': args.seed_books,
+            'apm': args.apm,
+            'book_cache': os.getenv('BOOK_CACHE_ENABLED', '1') == '1',
+        },
+        'results': results,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCH_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, baseline, threshold, latency_threshold):
+    """Print current vs baseline per endpoint and concurrency; return the regressed entries"""
+    previous = {(r['endpoint'], r['concurrency']): r for r in baseline['results']}
+    regressions = []
+    print(f"\n{'endpoint':<10} {'conc':>4} {'req/s':>9} {'base':>9} {'delta':>7} "
+          f"{'p99 ms':>9} {'base':>9} {'delta':>7}")
+    for result in current['results']:
+        key = (result['endpoint'], result['concurrency'])
+        base = previous.get(key)
+        if base is None:
+            continue
+        rps_delta = result['rps'] / base['rps'] - 1 if base['rps'] else 0.0
+        p99_delta = result['p99_ms'] / base['p99_ms'] - 1 if base['p99_ms'] else 0.0
+        flags = []
+        if rps_delta < -threshold:
+            flags.append('throughput')
+        if p99_delta > latency_threshold:
+            flags.append('p99')
+        if flags:
+            regressions.append((key, flags))
+        print(f"{key[0]:<10} {key[1]:>4} {result['rps']:>9.0f} {base['rps']:>9.0f} {rps_delta:>+7.0%} "
+              f"{result['p99_ms']:>9.2f} {base['p99_ms']:>9.2f} {p99_delta:>+7.0%}"
+              f"{'  REGRESSION: ' + ', '.join(flags) if flags else ''}")
+    return regressions
+
+
+def csv_list(convert):
+    return lambda value: [convert(item) for item in value.split(',') if item]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--endpoints', type=csv_list(str), default=list(ENDPOINTS),
+                        help=f"Comma-separated subset of {', '.join(ENDPOINTS)}")
+    parser.add_argument('--concurrency', type=csv_list(int), default=[1, 8, 32])
+    parser.add_argument('--duration', type=float, default=5.0, help='Measured seconds per level')
+    parser.add_argument('--warmup', type=float, default=1.0, help='Unmeasured seconds before each level')
+    parser.add_argument('--seed-books', type=int, default=1000)
+    parser.add_argument('--apm', action='store_true', help='Enable the APM agent against a local intake stand-in')
+    parser.add_argument('--output', help='Write results as JSON')
+    parser.add_argument('--baseline', help='Compare against a saved results file')
+    parser.add_argument('--results', help='Compare this saved results file instead of running')
+    parser.add_argument('--threshold', type=float, default=0.10, help='Allowed throughput drop (fraction)')
+    parser.add_argument('--latency-threshold', type=float, default=0.25, help='Allowed p99 growth (fraction)')
+    parser.add_argument('--serve', metavar='DB_PATH', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.seed_books, args.apm)
+        return
+    unknown = set(args.endpoints) - set(ENDPOINTS)
+    if unknown:
+        parser.error(f"unknown endpoints: {', '.join(sorted(unknown))}")
+
+    if args.results:
+        with open(args.results) as f:
+            current = json.load(f)
+    else:
+        current = run(args)
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(current, f, indent=2)
+            print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(current, baseline, args.threshold, args.latency_threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) against {args.baseline}")
+            sys.exit(1)
+        print(f"\nNo regressions against {args.baseline}")
+
+
+if __name__ == '__main__':
+    main()
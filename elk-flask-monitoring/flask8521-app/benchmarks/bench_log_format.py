@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Formatter cost per record: current text format vs ECS JSON
+
+Usage: python benchmarks/bench_log_format.py [--records N]
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from log_format import EcsJsonFormatter
+
+TEXT_FORMAT = '%(asctime)s %(levelname)s: %(message)s'
+
+
+def make_records():
+    """A mix resembling the book routes' log lines"""
+    info = logging.LogRecord('app', logging.INFO, __file__, 1,
+                             "Book fetched: ID=%s, Title=%s", (42, "The Great Gatsby"), None)
+    info.operation = 'get_book'
+    info.elasticapm_trace_id = '0af7651916cd43dd8448eb211c80319c'
+    info.elasticapm_transaction_id = 'b7ad6b7169203331'
+    error = logging.LogRecord('app', logging.ERROR, __file__, 1,
+                              "Get book failed: Invalid book ID: invalid", None, None)
+    error.operation = 'get_book'
+    error.error_type = 'validation'
+    tagged = logging.LogRecord('app', logging.ERROR, __file__, 1,
+                               "DATABASE_CONNECTION_ERROR: Connection pool exhausted after 5.0s wait",
+                               None, None)
+    return [info, error, tagged]
+
+
+def bench(formatter, records, n):
+    start = time.perf_counter()
+    for i in range(n):
+        formatter.format(records[i % len(records)])
+    return (time.perf_counter() - start) / n
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--records', type=int, default=200000)
+    args = parser.parse_args()
+
+    records = make_records()
+    formatters = [
+        ('text', logging.Formatter(TEXT_FORMAT)),
+        ('ecs-json', EcsJsonFormatter(service_name='flask-app', environment='development')),
+    ]
+    # Warm up both paths before timing
+    for _, formatter in formatters:
+        bench(formatter, records, 1000)
+
+    print(f"{'formatter':<10} {'ns/record':>10}")
+    results = {}
+    for name, formatter in formatters:
+        results[name] = bench(formatter, records, args.records)
+        print(f"{name:<10} {results[name] * 1e9:>10.0f}")
+    print(f"ecs-json / text: {results['ecs-json'] / results['text']:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
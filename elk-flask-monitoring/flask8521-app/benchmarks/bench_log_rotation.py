@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Log write cost per request with and without rotation and background gzip
+
+Each simulated request logs a few ECS JSON records through a sync-mode
+handler. The rotating handler uses a small ``--max-bytes`` so it rotates
+many times during the run, with ``compress_delay=0`` so the compressor
+thread is busy for most of it. The run is split into ten windows; if
+rotation and compression stayed off the request path, the per-window p50
+and p99 match the plain FileHandler.
+
+Usage: python benchmarks/bench_log_rotation.py [--requests N] [--max-bytes BYTES]
+"""
+
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from log_format import EcsJsonFormatter
+from log_rotation import CompressingRotatingFileHandler
+
+WINDOWS = 10
+
+
+def log_request(logger, i):
+    """The records one GET /books/<id> request writes"""
+    logger.debug(f"Fetching book ID={i}", extra={'operation': 'get_book'})
+    logger.info(f"Book fetched: ID={i}, Title=The Great Gatsby", extra={'operation': 'get_book'})
+    if i % 10 == 0:
+        logger.error(f"Get book failed: Book ID {i} not found", extra={'operation': 'get_book'})
+
+
+def percentile(sorted_values, pct):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * pct / 100))]
+
+
+def run(name, handler, requests):
+    handler.setFormatter(EcsJsonFormatter(service_name='flask-app', environment='bench'))
+    logger = logging.getLogger(f"bench.{name}")
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    logger.addHandler(handler)
+    for i in range(1000):
+        log_request(logger, i)
+
+    costs = []
+    start = time.perf_counter()
+    for i in range(requests):
+        t0 = time.perf_counter()
+        log_request(logger, i)
+        costs.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - start
+    logger.removeHandler(handler)
+
+    size = len(costs) // WINDOWS
+    windows = []
+    for w in range(WINDOWS):
+        window = sorted(costs[w * size:(w + 1) * size])
+        windows.append((percentile(window, 50), percentile(window, 99)))
+    everything = sorted(costs)
+    return {
+        'us_per_request': elapsed / requests * 1e6,
+        'p50': percentile(everything, 50) * 1e6,
+        'p99': percentile(everything, 99) * 1e6,
+        'max': everything[-1] * 1e6,
+        'windows': windows,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=200000)
+    parser.add_argument('--max-bytes', type=int, default=2 * 1024 * 1024)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench-log-rotation-')
+    plain = logging.FileHandler(os.path.join(workdir, 'plain.log'))
+    rotating = CompressingRotatingFileHandler(os.path.join(workdir, 'app.log'), max_bytes=args.max_bytes,
+                                              backup_count=1000, compress_delay=0)
+    results = {
+        'plain': run('plain', plain, args.requests),
+        'rotating': run('rotating', rotating, args.requests),
+    }
+    # Let the compressor finish so its totals are complete
+    while rotating.stats()['pending']:
+        time.sleep(0.05)
+    stats = rotating.stats()
+
+    print(f"{'handler':<10} {'us/req':>8} {'p50 us':>8} {'p99 us':>8} {'max us':>9}")
+    for name, result in results.items():
+        print(f"{name:<10} {result['us_per_request']:>8.1f} {result['p50']:>8.1f} "
+              f"{result['p99']:>8.1f} {result['max']:>9.0f}")
+    print(f"\nrotations {stats['rotations']}, compressed {stats['compressed']} "
+          f"({stats['compress_seconds']:.2f}s of background gzip)")
+    print(f"\n{'window':<8} {'plain p50':>10} {'p99':>8} {'rotating p50':>13} {'p99':>8}")
+    for w in range(WINDOWS):
+        (plain_p50, plain_p99), (rot_p50, rot_p99) = results['plain']['windows'][w], results['rotating']['windows'][w]
+        print(f"{w + 1:<8} {plain_p50 * 1e6:>10.1f} {plain_p99 * 1e6:>8.1f} {rot_p50 * 1e6:>13.1f} {rot_p99 * 1e6:>8.1f}")
+    print(f"\nFiles in {workdir}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Per-request cost of recording metrics, and of rendering /metrics
+
+Measures, in microseconds per request:
+- ``record``: the histogram observation alone
+- ``dispatch``: what RequestMetrics adds around full_dispatch_request,
+  inside a pushed request context for ``/books/<book_id>``
+- ``record xN``: ``record`` from ``--threads`` threads at once
+
+The ``record`` rows run once with the SHARDS lock shards and once with a
+single shared lock. ``expose`` is the cost of rendering the whole registry
+once every route has data.
+
+Usage: python benchmarks/bench_metrics.py [--iterations 200000] [--threads 8]
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from flask import Flask
+
+import metrics
+
+ROUTES = ('/', '/success', '/books', '/books/<book_id>', '/books/bulk', '/slow', '/random')
+
+
+def build(shards):
+    metrics.SHARDS = shards
+    app = Flask('bench')
+    app.add_url_rule('/books/<book_id>', 'get_book', lambda book_id: 'ok')
+    registry = metrics.MetricsRegistry()
+    return app, registry, metrics.RequestMetrics(app, registry)
+
+
+def per_call_us(fn, iterations):
+    started = time.perf_counter()
+    fn(iterations)
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def bench_record(request_metrics, iterations):
+    def run(n):
+        record = request_metrics.record
+        for i in range(n):
+            record('/books/<book_id>', 'GET', 200, 0.002 + (i % 50) * 0.0001)
+    return per_call_us(run, iterations)
+
+
+def bench_threads(request_metrics, iterations, threads):
+    per_thread = iterations // threads
+
+    def run(_):
+        workers = [threading.Thread(target=bench_record, args=(request_metrics, per_thread))
+                   for _ in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+    return per_call_us(run, per_thread * threads)
+
+
+def bench_dispatch(app, request_metrics, iterations):
+    with app.test_request_context('/books/7'):
+        def run(n):
+            finish, now = request_metrics._finish, time.perf_counter
+            for _ in range(n):
+                finish(now(), 200)
+        return per_call_us(run, iterations)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=200000)
+    parser.add_argument('--threads', type=int, default=8)
+    args = parser.parse_args()
+
+    rows = []
+    for shards in (metrics.SHARDS, 1):
+        app, registry, request_metrics = build(shards)
+        rows.append((f'record ({shards} shards)', bench_record(request_metrics, args.iterations)))
+        rows.append((f'record x{args.threads} ({shards} shards)',
+                     bench_threads(request_metrics, args.iterations, args.threads)))
+    rows.append(('dispatch', bench_dispatch(app, request_metrics, args.iterations)))
+
+    for route in ROUTES:
+        for status in (200, 404, 500):
+            request_metrics.record(route, 'GET', status, 0.01)
+    started = time.perf_counter()
+    text = registry.expose()
+    expose_ms = (time.perf_counter() - started) * 1000
+
+    print(f"{'path':<26} {'us/request':>10}")
+    for name, us in rows:
+        print(f"{name:<26} {us:>10.2f}")
+    print(f"\nexpose: {expose_ms:.2f} ms for {len(text.splitlines())} lines")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Book search latency against table size: in-process index vs a table scan
+
+For each table size, seeds the SQLite stand-in with synthetic titles and
+authors (Zipf-distributed words, like real titles), builds the index the
+way the startup warmup does (load_books pages through the table), then
+runs the same queries two ways:
+- ``index``: BookSearchIndex.search, what GET /books/search serves
+- ``scan``: the MATCH ... AGAINST statement of the FULLTEXT fallback, which
+  the stand-in answers with a scan of every row
+
+Queries are taken from the seeded titles: one word, two words, and a word
+followed by a three-letter prefix. MySQL's FULLTEXT index can't run here;
+the scan shows what a search costs without any index.
+
+Usage: python benchmarks/bench_search.py [--sizes 1000,10000,100000] [--queries 2000]
+"""
+
+import argparse
+import itertools
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..'))
+sys.path.insert(0, BENCH_DIR)
+
+import sqlite_mysql  # noqa: E402
+from search_index import BookSearchIndex  # noqa: E402
+
+SYLLABLES = ['ka', 'lo', 'mi', 'ra', 'den', 'tor', 'vel', 'sha', 'no', 'quin', 'bri', 'mar', 'es', 'tu', 'gol']
+SCAN_SQL = ("SELECT id, title, author FROM books WHERE MATCH(title, author) AGAINST (%s IN BOOLEAN MODE) "
+            "ORDER BY id LIMIT %s")
+
+
+def make_words(rng, count):
+    words = set()
+    while len(words) < count:
+        words.add(''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def seed(path, size, rng):
+    words = make_words(rng, 20000)
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(words))))
+    first_names, last_names = make_words(rng, 500), make_words(rng, 2000)
+    conn = sqlite_mysql.Connection(path)
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS books (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            title VARCHAR(255) NOT NULL UNIQUE,
+            author VARCHAR(255) NOT NULL
+        )
+    ''')
+    titles = []
+    for start in range(0, size, 500):
+        rows = []
+        for i in range(start, min(start + 500, size)):
+            title = ' '.join(rng.choices(words, cum_weights=cum_weights, k=rng.randint(2, 6))).title() + f' {i}'
+            rows.append((title, f"{rng.choice(first_names)} {rng.choice(last_names)}".title()))
+        cursor.execute(
+            "INSERT IGNORE INTO books (title, author) VALUES " + ", ".join(["(%s, %s)"] * len(rows)),
+            [value for row in rows for value in row]
+        )
+        titles.extend(title for title, _ in rows)
+    conn.commit()
+    conn.close()
+    return titles
+
+
+def make_queries(titles, count, rng):
+    queries = []
+    for i in range(count):
+        words = rng.choice(titles).lower().split()[:-1]
+        kind = i % 3
+        if kind == 0:
+            queries.append(rng.choice(words))
+        elif kind == 1:
+            queries.append(' '.join(rng.sample(words, 2)))
+        else:
+            queries.append(f"{words[0]} {words[-1][:3]}")
+    return queries
+
+
+def latencies(search, queries):
+    results = []
+    for query in queries:
+        started = time.perf_counter()
+        search(query)
+        results.append((time.perf_counter() - started) * 1e6)
+    return results
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def load_books(path, page=1000):
+    conn = sqlite_mysql.Connection(path)
+    cursor = conn.cursor()
+    after_id = 0
+    while True:
+        cursor.execute("SELECT id, title, author FROM books WHERE id > %s ORDER BY id LIMIT %s", (after_id, page))
+        rows = cursor.fetchall()
+        yield from rows
+        if len(rows) < page:
+            break
+        after_id = rows[-1][0]
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='1000,10000,100000')
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--scan-queries', type=int, default=30, help='Scans are slow; run fewer of them')
+    parser.add_argument('--limit', type=int, default=20)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench-search-')
+    print(f"{'books':>8} {'build s':>8} {'index MB':>9} {'tokens':>7} "
+          f"{'index p50':>10} {'index p99':>10} {'scan p50':>10} {'scan p99':>10}  (us)")
+    for size in (int(s) for s in args.sizes.split(',')):
+        rng = random.Random(size)
+        path = os.path.join(workdir, f'books-{size}.db')
+        titles = seed(path, size, rng)
+        queries = make_queries(titles, args.queries, rng)
+
+        index = BookSearchIndex()
+        started = time.perf_counter()
+        index.rebuild(load_books(path))
+        build_s = time.perf_counter() - started
+        tracemalloc.start()
+        probe = BookSearchIndex()
+        probe.rebuild(load_books(path))
+        index_mb = tracemalloc.get_traced_memory()[0] / 1e6
+        tracemalloc.stop()
+        del probe
+
+        indexed = latencies(lambda q: index.search(q, args.limit), queries)
+        conn = sqlite_mysql.Connection(path)
+        cursor = conn.cursor()
+
+        def scan(query):
+            words = query.split()
+            cursor.execute(SCAN_SQL, (" ".join(f"+{w}" for w in words[:-1]) + f" +{words[-1]}*", args.limit))
+            cursor.fetchall()
+        scanned = latencies(scan, queries[:args.scan_queries])
+        conn.close()
+
+        print(f"{size:>8} {build_s:>8.2f} {index_mb:>9.1f} {index.stats()['tokens']:>7} "
+              f"{statistics.median(indexed):>10.0f} {percentile(indexed, 0.99):>10.0f} "
+              f"{statistics.median(scanned):>10.0f} {percentile(scanned, 0.99):>10.0f}")
+
+
+if __name__ == '__main__':
+    main()
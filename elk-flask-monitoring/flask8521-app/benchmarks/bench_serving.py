@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Requests per second: app.run(debug=True) dev server vs gunicorn workers
+
+Both servers run the real app.py against the SQLite stand-in
+(benchmarks/sqlite_mysql.py) with APM disabled and logs in a temporary
+directory. The dev server is started exactly like ``python app.py`` does
+(debugger and reloader on); gunicorn uses gunicorn.conf.py with
+``--workers``/``--threads`` passed as GUNICORN_WORKERS/GUNICORN_THREADS.
+``/success`` and ``GET /books/<id>`` are driven closed-loop from
+``--clients`` load processes, so the load generator is not the single-core
+bottleneck it would be in one process.
+
+Usage: python benchmarks/bench_serving.py [--workers 4] [--threads 4] [--concurrency 64] [--duration 10]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from multiprocessing import Pool
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(BENCH_DIR, '..')
+sys.path.insert(0, APP_DIR)
+sys.path.insert(0, os.path.join(APP_DIR, '..'))
+
+from bench_endpoints import drive  # noqa: E402
+from load_engine import LatencyHistogram  # noqa: E402
+
+ENDPOINTS = ('success', 'get_book')
+SEED_BOOKS = 1000
+
+
+def serve_dev(db_path, port):
+    """Child process: what ``python app.py`` runs, on another port"""
+    import sqlite_mysql
+    sqlite_mysql.install(db_path)
+    os.environ.setdefault('ELASTIC_APM_ENABLED', 'false')
+    import app as flask_app
+    flask_app.app.run(host='127.0.0.1', port=port, debug=True)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port, process, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"Server exited with {process.returncode}")
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise SystemExit(f"Server did not listen on port {port}")
+
+
+def start_server(mode, args, workdir, port):
+    db_path = os.path.join(workdir, 'books.db')
+    env = dict(os.environ, LOG_FILE=os.path.join(workdir, f'{mode}.log'), BENCH_DB_PATH=db_path,
+               ELASTIC_APM_ENABLED='false', GUNICORN_WORKERS=str(args.workers), GUNICORN_THREADS=str(args.threads))
+    if mode == 'dev':
+        command = [sys.executable, os.path.abspath(__file__), '--serve-dev', db_path, '--port', str(port)]
+    else:
+        command = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--pythonpath', BENCH_DIR,
+                   '--bind', f'127.0.0.1:{port}', 'standin_wsgi:app']
+    output = open(os.path.join(workdir, f'{mode}-server.out'), 'w')
+    process = subprocess.Popen(command, cwd=APP_DIR, env=env, stdout=output, stderr=subprocess.STDOUT,
+                               start_new_session=True)
+    wait_for_port(port, process)
+    return process, output
+
+
+def stop_server(process, output):
+    # The dev server's reloader and gunicorn's workers share the process group
+    os.killpg(process.pid, signal.SIGTERM)
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        os.killpg(process.pid, signal.SIGKILL)
+        process.wait()
+    output.close()
+
+
+def client(job):
+    """One load process: ``concurrency`` closed-loop workers on one endpoint"""
+    base_url, endpoint, concurrency, duration, warmup = job
+    if endpoint == 'success':
+        def build():
+            return 'GET', '/success', None
+    else:
+        def build():
+            return 'GET', f"/books/{random.randint(1, SEED_BOOKS)}", None
+    return asyncio.run(drive(base_url, build, concurrency, duration, warmup))
+
+
+def measure(base_url, endpoint, args):
+    per_client = max(1, args.concurrency // args.clients)
+    jobs = [(base_url, endpoint, per_client, args.duration, args.warmup)] * args.clients
+    with Pool(args.clients) as pool:
+        results = pool.map(client, jobs)
+    histogram = LatencyHistogram()
+    for result in results:
+        histogram.merge(LatencyHistogram.from_dict(result['histogram']))
+    return {
+        'rps': sum(result['rps'] for result in results),
+        'errors': sum(result['errors'] for result in results),
+        'p50_ms': histogram.value_at(50) * 1000,
+        'p99_ms': histogram.value_at(99) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, default=(os.cpu_count() or 1) * 2 + 1)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--concurrency', type=int, default=64, help='Total in-flight requests')
+    parser.add_argument('--clients', type=int, default=min(4, os.cpu_count() or 1), help='Load processes')
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--warmup', type=float, default=2.0)
+    parser.add_argument('--output', help='Write results as JSON')
+    parser.add_argument('--serve-dev', metavar='DB_PATH', help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve_dev:
+        serve_dev(args.serve_dev, args.port)
+        return
+
+    import sqlite_mysql
+    workdir = tempfile.mkdtemp(prefix='bench-serving-')
+    sqlite_mysql.seed_books(os.path.join(workdir, 'books.db'), SEED_BOOKS)
+
+    results = {}
+    for mode in ('dev', 'gunicorn'):
+        port = free_port()
+        process, output = start_server(mode, args, workdir, port)
+        try:
+            for endpoint in ENDPOINTS:
+                results[(mode, endpoint)] = measure(f"http://127.0.0.1:{port}", endpoint, args)
+        finally:
+            stop_server(process, output)
+
+    print(f"{os.cpu_count()} CPU(s); gunicorn {args.workers} workers x {args.threads} threads; "
+          f"{args.concurrency} concurrent requests from {args.clients} load process(es)\n")
+    print(f"{'server':<10} {'endpoint':<10} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7} {'vs dev':>7}")
+    for (mode, endpoint), result in results.items():
+        ratio = result['rps'] / results[('dev', endpoint)]['rps']
+        print(f"{mode:<10} {endpoint:<10} {result['rps']:>8.0f} {result['p50_ms']:>8.2f} "
+              f"{result['p99_ms']:>8.2f} {result['errors']:>7} {ratio:>6.1f}x")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump([dict(mode=mode, endpoint=endpoint, **result) for (mode, endpoint), result in results.items()],
+                      f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Time from process start until app.py serves /health and /ready, per STARTUP_MODE
+
+Each run starts a fresh child process that imports app.py, backed by the
+SQLite stand-in, and serves it with werkzeug. With ``--db-down N`` the
+stand-in refuses connections (errno 2003) for the first N seconds, like
+MySQL still starting when the app container comes up. The parent polls
+/health and /ready and records when each first answered 200. It then reads
+the startup phases app.py measured itself, including the import time of
+elasticapm. mysql.connector is imported by the stand-in before app.py, so
+the child times that import and reports it on stdout. In blocking mode a
+database that is down fails the import, which is reported as ``failed``.
+
+Usage: python benchmarks/bench_startup.py [--runs 3] [--db-down 0,3]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(BENCH_DIR, '..')
+sys.path.insert(0, APP_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from bench_serving import free_port  # noqa: E402
+
+MODES = ('blocking', 'background')
+PHASES = ('import.flask', 'import.mysql.connector', 'import.elasticapm', 'app_import')
+
+
+def serve(db_path, db_down, port):
+    """Child process: refuse connections for ``db_down`` seconds, import app.py and serve it"""
+    up_at = time.monotonic() + db_down
+    started = time.perf_counter()
+    import mysql.connector
+    print(f"IMPORT {(time.perf_counter() - started) * 1000:.1f}", flush=True)
+    from mysql.connector import errorcode, errors
+    import sqlite_mysql
+    connect = sqlite_mysql.install(db_path)
+
+    def starting_connect(**kwargs):
+        if time.monotonic() < up_at:
+            raise errors.InterfaceError(msg="Can't connect to MySQL server (still starting)",
+                                        errno=errorcode.CR_CONN_HOST_ERROR)
+        return connect(**kwargs)
+    mysql.connector.connect = starting_connect
+
+    import app as flask_app
+    from werkzeug.serving import make_server
+    make_server('127.0.0.1', port, flask_app.app, threaded=True).serve_forever()
+
+
+def get_status(url):
+    try:
+        with urllib.request.urlopen(url, timeout=1) as response:
+            return response.status, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+    except OSError:
+        return None, None
+
+
+def run_once(mode, db_down, workdir, timeout):
+    port = free_port()
+    env = dict(os.environ, STARTUP_MODE=mode, ELASTIC_APM_ENABLED='false', READY_PROBE_INTERVAL='0.1',
+               LOG_FILE=os.path.join(workdir, f'app-{mode}.log'))
+    db_path = os.path.join(workdir, 'books.db')
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, __file__, '--serve', db_path, str(db_down), str(port)],
+                               env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    mysql_import_ms = float(process.stdout.readline().split()[1])
+    base = f"http://127.0.0.1:{port}"
+    live_ms = ready_ms = None
+    body = None
+    try:
+        while time.perf_counter() - started < timeout and process.poll() is None:
+            if live_ms is None:
+                status, body = get_status(f"{base}/health")
+                if status == 200:
+                    live_ms = (time.perf_counter() - started) * 1000
+            if live_ms is not None and get_status(f"{base}/ready")[0] == 200:
+                ready_ms = (time.perf_counter() - started) * 1000
+                break
+            time.sleep(0.01)
+        if ready_ms is not None:
+            body = get_status(f"{base}/health")[1]
+    finally:
+        process.kill()
+        process.wait()
+    phases = json.loads(body)['startup_ms'] if body else {}
+    if phases:
+        phases['import.mysql.connector'] = mysql_import_ms
+    return {'live_ms': live_ms, 'ready_ms': ready_ms, 'phases': phases}
+
+
+def median(values):
+    values = [v for v in values if v is not None]
+    return statistics.median(values) if values else None
+
+
+def cell(value, width=9):
+    return f"{value:>{width}.0f}" if value is not None else f"{'failed':>{width}}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--serve', nargs=3, metavar=('DB_PATH', 'DB_DOWN', 'PORT'), help=argparse.SUPPRESS)
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--db-down', default='0,3', help='Comma-separated seconds MySQL refuses connections')
+    parser.add_argument('--timeout', type=float, default=30.0)
+    args = parser.parse_args()
+    if args.serve:
+        db_path, db_down, port = args.serve
+        serve(db_path, float(db_down), int(port))
+        return
+
+    import sqlite_mysql
+    workdir = tempfile.mkdtemp(prefix='bench-startup-')
+    sqlite_mysql.seed_books(os.path.join(workdir, 'books.db'), 100)
+
+    print(f"median of {args.runs} runs, ms since process start; phases in ms as measured by app.py\n")
+    print(f"{'mode':<11} {'db down':>7} {'/health':>9} {'/ready':>9} " + ' '.join(f"{p:>22}" for p in PHASES))
+    for db_down in (float(v) for v in args.db_down.split(',')):
+        for mode in MODES:
+            runs = [run_once(mode, db_down, workdir, args.timeout) for _ in range(args.runs)]
+            phases = [median([r['phases'].get(p) for r in runs]) for p in PHASES]
+            print(f"{mode:<11} {db_down:>6.0f}s {cell(median([r['live_ms'] for r in runs]))} "
+                  f"{cell(median([r['ready_ms'] for r in runs]))} "
+                  + ' '.join(cell(p, 22) if p is not None else f"{'-':>22}" for p in phases))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+"""
+SQLite-backed stand-in for mysql.connector, for benchmarks without a MySQL server
+
+``install(path)`` replaces ``mysql.connector.connect`` before the app is
+imported. Each connection is a separate sqlite3 connection to the same
+database file, so the app's pool, transactions and concurrency behave like
+they would against a real server. Only the SQL the app uses is translated.
+``install(path, latency)`` adds a ``time.sleep(latency)`` to every query as
+a stand-in for the network round trip to MySQL. ``refuse(connect_timeout)``
+makes every connect fail like an unreachable server instead. FULLTEXT
+indexes become plain indexes and ``MATCH ... AGAINST (... IN BOOLEAN MODE)``
+a scan that checks each ``+word`` and ``+prefix*`` term, so searches return
+what MySQL would, but not at its speed.
+"""
+
+import re
+import sqlite3
+import threading
+import time
+
+import mysql.connector
+from mysql.connector import errorcode, errors
+
+_TRANSLATIONS = [
+    (re.compile(r'%s'), '?'),
+    (re.compile(r'\bINSERT IGNORE\b', re.I), 'INSERT OR IGNORE'),
+    (re.compile(r'\bINT AUTO_INCREMENT PRIMARY KEY\b', re.I), 'INTEGER PRIMARY KEY AUTOINCREMENT'),
+    (re.compile(r'\bTIMESTAMP DEFAULT CURRENT_TIMESTAMP\b', re.I), 'TEXT DEFAULT CURRENT_TIMESTAMP'),
+    (re.compile(r'\bALTER TABLE (\w+) ADD FULLTEXT INDEX (\w+) (\([^)]*\))', re.I),
+     r'CREATE INDEX IF NOT EXISTS \2 ON \1 \3'),
+    (re.compile(r'\bMATCH\((\w+), (\w+)\) AGAINST \(\? IN BOOLEAN MODE\)', re.I),
+     r"mysql_match(\1 || ' ' || \2, ?)"),
+]
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def mysql_match(text, terms):
+    words = re.findall(r'\w+', text.casefold())
+    for term in terms.casefold().split():
+        term = term.lstrip('+')
+        if term.endswith('*'):
+            if not any(word.startswith(term[:-1]) for word in words):
+                return 0
+        elif term not in words:
+            return 0
+    return 1
+
+
+def translate(sql):
+    with _cache_lock:
+        translated = _cache.get(sql)
+    if translated is None:
+        translated = sql
+        for pattern, replacement in _TRANSLATIONS:
+            translated = pattern.sub(replacement, translated)
+        with _cache_lock:
+            _cache[sql] = translated
+    return translated
+
+
+class Cursor:
+    def __init__(self, conn):
+        self._conn = conn
+        self._cursor = conn._db.cursor()
+        self._latency = conn._latency
+        self.lastrowid = None
+        self.rowcount = -1
+        self._returning = False
+
+    def execute(self, sql, params=()):
+        sql = translate(sql)
+        # MySQL reports the first id a multi-row insert generated. With INSERT IGNORE
+        # the inserted rows need not be the last ones, so ask SQLite which they were
+        self._returning = sql.lstrip()[:6].upper() == 'INSERT'
+        if self._returning:
+            sql += ' RETURNING rowid'
+        if self._latency:
+            time.sleep(self._latency)
+        try:
+            self._cursor.execute(sql, tuple(params or ()))
+            ids = [row[0] for row in self._cursor.fetchall()] if self._returning else None
+        except sqlite3.IntegrityError as e:
+            raise errors.IntegrityError(msg=str(e), errno=errorcode.ER_DUP_ENTRY)
+        except sqlite3.OperationalError as e:
+            raise errors.OperationalError(msg=str(e), errno=errorcode.ER_LOCK_WAIT_TIMEOUT)
+        if self._returning:
+            self.rowcount = len(ids)
+            self.lastrowid = min(ids) if ids else 0
+        else:
+            self.rowcount = self._cursor.rowcount
+            self.lastrowid = self._cursor.lastrowid
+
+    @property
+    def description(self):
+        return None if self._returning else self._cursor.description
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchmany(self, size=1):
+        return self._cursor.fetchmany(size)
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def close(self):
+        self._cursor.close()
+
+
+class Connection:
+    def __init__(self, path, latency=0.0, **kwargs):
+        self._latency = latency
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level='DEFERRED')
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.create_function('mysql_match', 2, mysql_match, deterministic=True)
+        self._open = True
+
+    def cursor(self, *args, **kwargs):
+        return Cursor(self)
+
+    @property
+    def in_transaction(self):
+        return self._db.in_transaction
+
+    def commit(self):
+        self._db.commit()
+
+    def rollback(self):
+        self._db.rollback()
+
+    def is_connected(self):
+        return self._open
+
+    def ping(self, reconnect=False, attempts=1, delay=0):
+        if not self._open:
+            raise errors.InterfaceError(msg="Connection closed", errno=errorcode.CR_SERVER_GONE_ERROR)
+
+    def close(self):
+        self._open = False
+        self._db.close()
+
+
+def install(path, latency=0.0):
+    """Route every mysql.connector.connect(**DB_CONFIG) call to ``path``"""
+    def connect(**kwargs):
+        return Connection(path, latency, **kwargs)
+    mysql.connector.connect = connect
+    return connect
+
+
+def refuse(connect_timeout):
+    """Make every connect wait ``connect_timeout`` seconds and fail with errno 2003, like MySQL being down"""
+    def connect(**kwargs):
+        time.sleep(connect_timeout)
+        raise errors.InterfaceError(msg="Can't connect to MySQL server (connect timeout)",
+                                    errno=errorcode.CR_CONN_HOST_ERROR)
+    mysql.connector.connect = connect
+    return connect
+
+
+def seed_books(path, count):
+    """Create the books table in ``path`` with ``count`` rows, as init_db would"""
+    conn = Connection(path)
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS books (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            title VARCHAR(255) NOT NULL UNIQUE,
+            author VARCHAR(255) NOT NULL
+        )
+    ''')
+    for start in range(0, count, 500):
+        rows = [(f"Seed Book {i}", f"Author {i % 97}") for i in range(start, min(start + 500, count))]
+        cursor.execute(
+            "INSERT IGNORE INTO books (title, author) VALUES " + ", ".join(["(%s, %s)"] * len(rows)),
+            [value for row in rows for value in row]
+        )
+    conn.commit()
+    conn.close()
@@ -0,0 +1,21 @@
+"""
+WSGI entry point for benchmarks: app.py backed by the SQLite stand-in
+
+    BENCH_DB_PATH=/tmp/books.db gunicorn -c gunicorn.conf.py --pythonpath benchmarks standin_wsgi:app
+
+Imported in each worker after the fork, like app.py itself. BENCH_DB_LATENCY
+adds that many seconds to every query (see sqlite_mysql.install).
+BENCH_DB_DOWN=<seconds> makes every connect time out after that long
+instead (sqlite_mysql.refuse).
+"""
+
+import os
+
+import sqlite_mysql
+
+sqlite_mysql.install(os.environ['BENCH_DB_PATH'], float(os.getenv('BENCH_DB_LATENCY', '0')))
+if os.getenv('BENCH_DB_DOWN'):
+    sqlite_mysql.refuse(float(os.environ['BENCH_DB_DOWN']))
+os.environ.setdefault('ELASTIC_APM_ENABLED', 'false')
+
+from app import app  # noqa: E402,F401
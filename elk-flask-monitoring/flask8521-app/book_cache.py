@@ -0,0 +1,86 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class BookCache:
+    """
+    Bounded in-process LRU cache of book rows keyed by book id.
+
+    Entries expire ``ttl`` seconds after they were loaded. Write paths must
+    call ``invalidate`` for any id they touch. A disabled cache never stores
+    anything, so every lookup falls through to MySQL.
+    """
+
+    def __init__(self, max_size=1024, ttl=60.0, enabled=True):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.enabled = enabled
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'expirations': 0,
+            'invalidations': 0,
+        }
+
+    def get(self, book_id):
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(book_id)
+            if entry is None:
+                self._counters['misses'] += 1
+                return None
+            row, expires_at = entry
+            if expires_at <= now:
+                del self._entries[book_id]
+                self._counters['expirations'] += 1
+                self._counters['misses'] += 1
+                return None
+            self._entries.move_to_end(book_id)
+            self._counters['hits'] += 1
+            return row
+
+    def put(self, book_id, row):
+        if not self.enabled:
+            return
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            self._entries[book_id] = (row, expires_at)
+            self._entries.move_to_end(book_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._counters['evictions'] += 1
+
+    def get_or_load(self, book_id, loader):
+        row = self.get(book_id)
+        if row is None:
+            row = loader(book_id)
+            if row is not None:
+                self.put(book_id, row)
+        return row
+
+    def invalidate(self, book_id):
+        with self._lock:
+            if self._entries.pop(book_id, None) is not None:
+                self._counters['invalidations'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self._counters['hits'] + self._counters['misses']
+            return dict(
+                self._counters,
+                enabled=self.enabled,
+                size=len(self._entries),
+                max_size=self.max_size,
+                ttl=self.ttl,
+                hit_ratio=round(self._counters['hits'] / lookups, 4) if lookups else 0.0,
+            )
@@ -0,0 +1,139 @@
+import logging
+import threading
+import time
+
+from mysql.connector import Error
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Error):
+    """Raised instead of touching MySQL while the circuit is open"""
+
+    def __init__(self, retry_after):
+        super().__init__(msg=f"DATABASE_CIRCUIT_OPEN: MySQL circuit is open, retry in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Closed/open/half-open circuit breaker for MySQL access.
+
+    Closed: calls go through. ``failure_threshold`` consecutive failures
+    (errors for which ``is_failure(e)`` is true) open the circuit. Open:
+    ``before_call`` raises CircuitOpenError without waiting on anything,
+    for ``cooldown`` seconds. Half-open: up to ``half_open_max_calls`` trial
+    calls go through; ``success_threshold`` successes close the circuit and
+    a failure opens it again. A trial that never reports back frees its
+    slot after ``cooldown`` seconds.
+
+    Callers report outcomes with ``record_success`` and ``record_error``.
+    In the closed state without failures, both are a read of two attributes.
+    """
+
+    def __init__(self, failure_threshold=5, cooldown=10.0, success_threshold=1, half_open_max_calls=1,
+                 is_failure=lambda e: True, enabled=True, name='MySQL'):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.success_threshold = success_threshold
+        self.half_open_max_calls = half_open_max_calls
+        self.is_failure = is_failure
+        self.enabled = enabled
+        self.name = name
+        self.state = CLOSED
+        self._failures = 0
+        self._successes = 0
+        self._opened_at = 0.0
+        self._trials = []
+        self._last_error = None
+        self._lock = threading.Lock()
+        self._counters = {'rejected': 0, 'opened': 0, 'failures': 0, 'trials': 0}
+
+    def before_call(self):
+        if self.state == CLOSED or not self.enabled:
+            return
+        with self._lock:
+            now = time.monotonic()
+            if self.state == OPEN:
+                retry_after = self._opened_at + self.cooldown - now
+                if retry_after > 0:
+                    self._counters['rejected'] += 1
+                    raise CircuitOpenError(retry_after)
+                self._transition(HALF_OPEN)
+            if self.state == HALF_OPEN:
+                # Drop trials that never reported back
+                self._trials = [started for started in self._trials if now - started < self.cooldown]
+                if len(self._trials) >= self.half_open_max_calls:
+                    self._counters['rejected'] += 1
+                    raise CircuitOpenError(self.cooldown - (now - self._trials[0]))
+                self._trials.append(now)
+                self._counters['trials'] += 1
+
+    def record_success(self):
+        if self.state == CLOSED and not self._failures:
+            return
+        with self._lock:
+            if self.state == HALF_OPEN:
+                if self._trials:
+                    self._trials.pop(0)
+                self._successes += 1
+                if self._successes >= self.success_threshold:
+                    self._transition(CLOSED)
+            else:
+                self._failures = 0
+
+    def record_error(self, e):
+        if not self.is_failure(e):
+            return
+        with self._lock:
+            self._counters['failures'] += 1
+            self._last_error = str(e)
+            if self.state == HALF_OPEN:
+                self._transition(OPEN)
+            elif self.state == CLOSED:
+                self._failures += 1
+                if self._failures >= self.failure_threshold and self.enabled:
+                    self._transition(OPEN)
+
+    def _transition(self, state):
+        # Called with the lock held
+        previous, self.state = self.state, state
+        self._failures = 0
+        self._successes = 0
+        self._trials = []
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+            self._counters['opened'] += 1
+            reason = 'trial call failed' if previous == HALF_OPEN else \
+                f'{self.failure_threshold} consecutive failures'
+            logger.error(f"DATABASE_CIRCUIT_OPEN: {self.name} circuit opened after {reason}, "
+                         f"rejecting calls for {self.cooldown:.1f}s (last error: {self._last_error})",
+                         extra={'error_type': 'database_circuit_open'})
+        elif state == HALF_OPEN:
+            logger.warning(f"{self.name} circuit half-open, letting {self.half_open_max_calls} trial call(s) through")
+        else:
+            logger.info(f"{self.name} circuit closed")
+
+    def reset(self):
+        with self._lock:
+            if self.state != CLOSED:
+                self._transition(CLOSED)
+            self._failures = 0
+
+    def stats(self):
+        with self._lock:
+            retry_after = self._opened_at + self.cooldown - time.monotonic() if self.state == OPEN else 0.0
+            return dict(
+                self._counters,
+                state=self.state,
+                enabled=self.enabled,
+                consecutive_failures=self._failures,
+                retry_after=round(max(retry_after, 0.0), 1),
+                last_error=self._last_error,
+                failure_threshold=self.failure_threshold,
+                cooldown=self.cooldown,
+            )
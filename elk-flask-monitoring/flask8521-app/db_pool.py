@@ -0,0 +1,252 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import mysql.connector
+from mysql.connector import Error
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeoutError(Error):
+    """Raised when no connection became free before the checkout timeout"""
+
+    def __init__(self, size, timeout):
+        super().__init__(
+            msg=f"DATABASE_CONNECTION_ERROR: Connection pool exhausted "
+                f"(size={size}, waited {timeout:.1f}s)",
+            errno=2003,
+        )
+
+
+class SharedFlag:
+    """
+    On/off switch shared by every process that uses the same ``path``: the
+    flag is set while the file exists, so toggling it in one gunicorn worker
+    applies to all of them. Without a path it only lives in this process.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._value = False
+
+    def set(self):
+        if self.path:
+            with open(self.path, 'w'):
+                pass
+        self._value = True
+
+    def clear(self):
+        if self.path:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+        self._value = False
+
+    def is_set(self):
+        # One stat per call, which is small next to a MySQL round trip
+        return os.path.exists(self.path) if self.path else self._value
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of MySQL connections built from DB_CONFIG.
+
+    Connections are opened lazily up to ``size``. When every connection is
+    checked out, callers wait up to ``timeout`` seconds for one to be
+    returned. Idle connections older than ``health_check_interval`` seconds
+    are pinged on checkout and replaced if the server dropped them.
+    ``acquire_observer``, if given, is called with the seconds each
+    successful checkout took, including any wait and connect. With a
+    ``breaker`` (circuit_breaker.CircuitBreaker), checkouts are refused while
+    it is open; failed checkouts and errors on a borrowed connection are
+    reported to it, and so is every connection returned in good health.
+    ``statements`` (statement_cache.StatementCache) forgets a connection's
+    prepared statements whenever the pool closes that connection.
+    While the ``simulate_exhaustion`` flag (a SharedFlag) is set, every
+    checkout fails at once as if the pool had timed out
+    (POST /simulate-pool-exhaustion).
+    """
+
+    def __init__(self, db_config, size=5, timeout=5.0, health_check_interval=30.0,
+                 connect=mysql.connector.connect, acquire_observer=None, breaker=None, statements=None,
+                 simulate_exhaustion=None):
+        self.db_config = dict(db_config)
+        self.size = size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self._connect = connect
+        self.acquire_observer = acquire_observer
+        self.breaker = breaker
+        self.statements = statements
+        self.simulate_exhaustion = simulate_exhaustion if simulate_exhaustion is not None else SharedFlag()
+        self._idle = deque()
+        self._open = 0
+        self._cond = threading.Condition()
+        self._counters = {
+            'checkouts': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'created': 0,
+            'discarded': 0,
+        }
+
+    def get_connection(self):
+        if self.breaker is None:
+            return self._checkout()
+        self.breaker.before_call()
+        try:
+            return self._checkout()
+        except Error as e:
+            self.breaker.record_error(e)
+            raise
+
+    def _checkout(self):
+        started = time.monotonic()
+        deadline = started + self.timeout
+        conn = None
+        last_used = None
+        exhausted = self.simulate_exhaustion.is_set()
+        with self._cond:
+            if exhausted:
+                self._counters['timeouts'] += 1
+                logger.error(f"DATABASE_CONNECTION_ERROR: Connection pool exhausted (simulated, size={self.size})")
+                raise PoolTimeoutError(self.size, 0.0)
+            waited = False
+            while True:
+                if self._idle:
+                    # LIFO keeps the most recently used connections warm
+                    conn, last_used = self._idle.pop()
+                    break
+                if self._open < self.size:
+                    self._open += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._counters['timeouts'] += 1
+                    logger.error(f"DATABASE_CONNECTION_ERROR: Connection pool exhausted after "
+                                 f"{self.timeout:.1f}s wait (size={self.size})")
+                    raise PoolTimeoutError(self.size, self.timeout)
+                if not waited:
+                    waited = True
+                    self._counters['waits'] += 1
+                self._cond.wait(remaining)
+            self._counters['checkouts'] += 1
+
+        if conn is not None and time.monotonic() - last_used > self.health_check_interval:
+            if not self._is_alive(conn):
+                logger.warning("Discarding stale MySQL connection from pool")
+                self._close_quietly(conn)
+                with self._cond:
+                    self._counters['discarded'] += 1
+                conn = None
+        if conn is None:
+            try:
+                conn = self._connect(**self.db_config)
+            except Exception:
+                with self._cond:
+                    self._open -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._counters['created'] += 1
+        if self.acquire_observer is not None:
+            self.acquire_observer(time.monotonic() - started)
+        return conn
+
+    def warm(self, count):
+        """Open connections until ``count`` (at most ``size``) are open; returns how many were opened"""
+        opened = 0
+        while True:
+            with self._cond:
+                if self._open >= min(count, self.size):
+                    return opened
+                self._open += 1
+            try:
+                conn = self._connect(**self.db_config)
+            except Exception:
+                with self._cond:
+                    self._open -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._counters['created'] += 1
+            self.release(conn)
+            opened += 1
+
+    def release(self, conn, discard=False, error=None):
+        if not discard:
+            try:
+                # Drop any open transaction so the next borrower starts clean
+                if conn.in_transaction:
+                    conn.rollback()
+            except Exception:
+                discard = True
+        if discard:
+            self._close_quietly(conn)
+        with self._cond:
+            if discard:
+                self._open -= 1
+                self._counters['discarded'] += 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+        if self.breaker is not None:
+            # ``error`` is what the borrower hit; a duplicate key still means MySQL is up
+            if error is not None and self.breaker.is_failure(error):
+                self.breaker.record_error(error)
+            elif not discard:
+                self.breaker.record_success()
+
+    @contextmanager
+    def connection(self):
+        conn = self.get_connection()
+        try:
+            yield conn
+        except Error as e:
+            # A connection-level failure leaves the socket in an unknown state
+            self.release(conn, discard=not self._is_alive(conn), error=e)
+            raise
+        except BaseException:
+            self.release(conn)
+            raise
+        else:
+            self.release(conn)
+
+    def close(self):
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._open -= len(idle)
+        for conn, _ in idle:
+            self._close_quietly(conn)
+
+    def stats(self):
+        with self._cond:
+            return dict(
+                self._counters,
+                size=self.size,
+                simulate_exhaustion=self.simulate_exhaustion.is_set(),
+                open=self._open,
+                idle=len(self._idle),
+                in_use=self._open - len(self._idle),
+            )
+
+    @staticmethod
+    def _is_alive(conn):
+        try:
+            return conn.is_connected()
+        except Exception:
+            return False
+
+    def _close_quietly(self, conn):
+        if self.statements is not None:
+            self.statements.evict(conn)
+        try:
+            conn.close()
+        except Exception:
+            pass
@@ -0,0 +1,70 @@
+# Production server settings: gunicorn -c gunicorn.conf.py app:app
+#
+# Workers import app.py themselves after the fork (preload_app is off), so
+# each one opens its own MySQL pool, APM client, log queue thread and log
+# compressor. Nothing with sockets or threads is inherited from the master.
+#
+# Reload code and config without dropping requests: kill -HUP <master pid>
+# starts new workers, then stops the old ones once their requests finish.
+# SIGTERM drains the same way, bounded by GUNICORN_GRACEFUL_TIMEOUT.
+#
+# Set workers and threads through GUNICORN_WORKERS/GUNICORN_THREADS rather
+# than -w/--threads: the worker class is chosen from them here.
+#
+# SERVING_MODE=async runs gevent workers instead. gevent makes sleeps, sockets
+# and locks cooperative, so a request waiting in /slow or on MySQL parks a
+# greenlet rather than holding a thread, and one worker holds up to
+# GUNICORN_WORKER_CONNECTIONS requests at once. app.py switches to the
+# pure-Python MySQL driver in this mode, whose socket waits gevent can see.
+import multiprocessing
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.getenv('GUNICORN_WORKERS', str(multiprocessing.cpu_count() * 2 + 1)))
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+SERVING_MODE = os.getenv('SERVING_MODE', 'threads')
+if SERVING_MODE == 'async':
+    worker_class = 'gevent'
+    worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', '1000'))
+elif threads > 1:
+    # gthread variant that finishes connections accepted just before a stop
+    worker_class = 'gunicorn_worker.DrainingThreadWorker'
+else:
+    worker_class = 'sync'
+preload_app = False
+# Each worker writes its /metrics values here and a scrape sums all of them
+# (metrics.WorkerMetrics). The master empties it on start, so totals begin
+# at zero for a new server but carry over a HUP reload.
+os.environ.setdefault('METRICS_DIR', '/tmp/flask-metrics')
+# POST /simulate-pool-exhaustion creates this file and every worker's pool
+# checks it, so the simulation covers all workers; cleared on start as well
+os.environ.setdefault('POOL_EXHAUSTION_FLAG', '/tmp/flask-pool-exhaustion')
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '30'))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', '5'))
+# Recycle workers now and then; jitter keeps them from restarting together
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '0'))
+max_requests_jitter = max_requests // 10
+# app.py logs to app.log; gunicorn's own logs go to the container output
+accesslog = os.getenv('GUNICORN_ACCESS_LOG') or None
+errorlog = '-'
+
+
+def on_starting(server):
+    import shutil
+    if os.environ['METRICS_DIR']:
+        shutil.rmtree(os.environ['METRICS_DIR'], ignore_errors=True)
+    if os.environ['POOL_EXHAUSTION_FLAG'] and os.path.exists(os.environ['POOL_EXHAUSTION_FLAG']):
+        os.remove(os.environ['POOL_EXHAUSTION_FLAG'])
+
+
+def post_fork(server, worker):
+    server.log.info(f"Worker {worker.pid} forked; app.py is imported in the worker")
+
+
+def worker_exit(server, worker):
+    # Runs after the worker stopped accepting and finished in-flight requests
+    import sys
+    app_module = sys.modules.get('app')
+    if app_module is not None and hasattr(app_module, 'shutdown'):
+        app_module.shutdown()
@@ -0,0 +1,43 @@
+import time
+
+from gunicorn.workers.gthread import ThreadWorker
+
+
+class DrainingThreadWorker(ThreadWorker):
+    """
+    gthread worker that does not drop just-accepted connections on shutdown.
+
+    Accepting and keep-alive work as in the stock worker: a connection waits
+    in the poller until its request bytes arrive, so idle or slow clients
+    hold no pool thread. On a graceful stop (SIGTERM, or a SIGHUP reload)
+    the stock worker leaves its loop at once and closes the poller, so a
+    connection accepted just before the signal is closed unanswered. Here
+    the worker stops listening and closes idle keep-alive connections, but
+    keeps polling until every accepted connection has been answered, or
+    for at most half of graceful_timeout; the rest is left for requests
+    still running on the thread pool, which the stock worker waits for.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._drain_deadline = None
+
+    def handle_exit(self, sig, frame):
+        # Runs in the signal handler; the poller is changed from the loop
+        if self._drain_deadline is None:
+            self._drain_deadline = time.monotonic() + self.cfg.graceful_timeout / 2
+
+    def murder_keepalived(self):
+        # Called on every pass of the stock run() loop
+        draining = self._drain_deadline is not None
+        if draining:
+            with self._lock:
+                for sock in self.sockets:
+                    if sock in self.poller.get_map():
+                        self.poller.unregister(sock)
+                # Idle keep-alive connections have no request in progress
+                for conn in self._keep:
+                    conn.timeout = 0
+        super().murder_keepalived()
+        if draining and (self.nr_conns <= 0 or time.monotonic() >= self._drain_deadline):
+            self.alive = False
@@ -0,0 +1,187 @@
+import atexit
+import itertools
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from flask import has_request_context, request
+
+# Set on records that stand for more than one occurrence; EcsJsonFormatter
+# writes it as log.count, and alert rules sum it instead of counting lines
+COUNT_ATTR = 'log_count'
+
+
+def parse_levels(value):
+    """Parse 'logger=LEVEL,logger=LEVEL' into a dict; 'root' is the root logger"""
+    levels = {}
+    for item in filter(None, (part.strip() for part in value.split(','))):
+        name, _, level = item.rpartition('=')
+        levels[name] = level
+    return levels
+
+
+def parse_route_rates(value):
+    """Parse 'rule=rate,rule=rate' into a dict, e.g. '/books/<book_id>=0.05'"""
+    rates = {}
+    for item in filter(None, (part.strip() for part in value.split(','))):
+        rule, _, rate = item.rpartition('=')
+        rates[rule] = float(rate)
+    return rates
+
+
+def logger_levels():
+    """Effective level of the root logger and every logger created so far"""
+    levels = {'root': logging.getLevelName(logging.getLogger().level)}
+    for name, log in sorted(logging.Logger.manager.loggerDict.items()):
+        if isinstance(log, logging.Logger):
+            levels[name] = logging.getLevelName(log.getEffectiveLevel())
+    return levels
+
+
+def set_logger_levels(levels):
+    """Apply {logger name: level name}; raises ValueError before changing anything if one is unknown"""
+    resolved = {}
+    for name, level in levels.items():
+        value = logging.getLevelName(str(level).upper())
+        if not isinstance(value, int):
+            raise ValueError(f"Unknown log level for {name}: {level}")
+        resolved[name] = value
+    for name, value in resolved.items():
+        logging.getLogger(None if name == 'root' else name).setLevel(value)
+
+
+class InfoSampler(logging.Filter):
+    """
+    Keeps 1 in N INFO records logged while serving the listed routes.
+
+    Routes are Flask rules as in APM_ROUTE_SAMPLE_RATES
+    (``/books/<book_id>``), with N instead of a probability. A kept record
+    gets ``log_count = N``, so counts in Elasticsearch stay right when
+    summed. Other levels and routes are not touched. The decision is stored
+    on the record, so attaching the filter to several handlers samples each
+    record once.
+    """
+
+    def __init__(self, route_rates):
+        super().__init__()
+        self.route_rates = {rule: int(rate) for rule, rate in route_rates.items() if rate > 1}
+        self._sequence = {rule: itertools.count() for rule in self.route_rates}
+        self._lock = threading.Lock()
+        self._counters = {'kept': 0, 'dropped': 0}
+
+    def filter(self, record):
+        keep = record.__dict__.get('_info_sampler_keep')
+        if keep is not None:
+            return keep
+        keep = True
+        if record.levelno == logging.INFO and self.route_rates and has_request_context() \
+                and request.url_rule is not None:
+            rule = request.url_rule.rule
+            rate = self.route_rates.get(rule)
+            if rate:
+                keep = next(self._sequence[rule]) % rate == 0
+                if keep:
+                    setattr(record, COUNT_ATTR, rate)
+                with self._lock:
+                    self._counters['kept' if keep else 'dropped'] += 1
+        record._info_sampler_keep = keep
+        return keep
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, route_rates=self.route_rates)
+
+
+class DuplicateSuppressor(logging.Filter):
+    """
+    Collapses identical records within ``window`` seconds into one summary.
+
+    Applies to records at ``level`` and above. The first record for a
+    (logger, level, message) key passes and opens a window. Identical
+    records inside the window are counted and dropped. When it closes,
+    "<message> (repeated N times)" is logged through the same logger with
+    ``log_count = N``. Every occurrence is then either its own line or
+    counted in a summary, so ``sum(log.count)`` matches what was logged. At
+    most ``max_keys`` windows are open; opening one more closes the oldest
+    early.
+    """
+
+    def __init__(self, window=10.0, level=logging.WARNING, max_keys=1000):
+        super().__init__()
+        self.window = window
+        self.level = level
+        self.max_keys = max_keys
+        # key -> [closes_at, suppressed count, last suppressed record]
+        self._windows = OrderedDict()
+        # Windows closed early to make room; summarized by the flusher thread
+        self._evicted = []
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._counters = {'suppressed': 0, 'summaries': 0, 'evicted': 0}
+        self._flusher = threading.Thread(target=self._run, name='log-dedup', daemon=True)
+        self._flusher.start()
+        atexit.register(self.close)
+
+    def filter(self, record):
+        keep = record.__dict__.get('_dedup_keep')
+        if keep is not None:
+            return keep
+        keep = True
+        if record.levelno >= self.level and not getattr(record, 'log_summary', False):
+            key = (record.name, record.levelno, record.getMessage())
+            with self._lock:
+                entry = self._windows.get(key)
+                if entry is not None:
+                    entry[1] += getattr(record, COUNT_ATTR, 1)
+                    entry[2] = record
+                    self._counters['suppressed'] += 1
+                    keep = False
+                else:
+                    if len(self._windows) >= self.max_keys:
+                        _, oldest = self._windows.popitem(last=False)
+                        self._counters['evicted'] += 1
+                        if oldest[1]:
+                            self._evicted.append(oldest)
+                    self._windows[key] = [record.created + self.window, 0, None]
+        record._dedup_keep = keep
+        return keep
+
+    def _run(self):
+        tick = min(1.0, self.window / 4)
+        while not self._stopped.wait(tick):
+            self.flush(time.time())
+
+    def flush(self, now=None):
+        """Close windows that ended before ``now`` (all of them if None) and log their summaries"""
+        with self._lock:
+            closed, self._evicted = self._evicted, []
+            # Windows have one length, so insertion order is closing order
+            while self._windows:
+                key, entry = next(iter(self._windows.items()))
+                if now is not None and entry[0] > now:
+                    break
+                del self._windows[key]
+                if entry[1]:
+                    closed.append(entry)
+            self._counters['summaries'] += len(closed)
+        for _, count, last in closed:
+            summary = logging.makeLogRecord({
+                k: v for k, v in last.__dict__.items() if not k.startswith('_')
+            })
+            summary.msg = f"{last.getMessage()} (repeated {count} times)"
+            summary.args = None
+            summary.exc_info = summary.exc_text = summary.stack_info = None
+            summary.log_summary = True
+            setattr(summary, COUNT_ATTR, count)
+            logging.getLogger(last.name).handle(summary)
+
+    def close(self):
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        self.flush()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, open_windows=len(self._windows), window=self.window)
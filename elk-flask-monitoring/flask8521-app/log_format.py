@@ -0,0 +1,95 @@
+import json
+import logging
+import time
+
+# Message tags and the error.type they map to; this is the table the
+# Filebeat script processor used to derive with substring matches.
+ERROR_TAGS = {
+    'DATABASE_CONNECTION_ERROR': 'database_connection',
+    'DATABASE_CIRCUIT_OPEN': 'database_circuit_open',
+    'DATABASE_ERROR': 'database_general',
+    'VALIDATION_ERROR': 'validation',
+    'BUSINESS_LOGIC_ERROR': 'business_logic',
+    'UNEXPECTED_ERROR': 'unexpected',
+}
+
+ALERT_SEVERITY = {
+    'database_connection': 'critical',
+    'database_circuit_open': 'high',
+    'database_general': 'high',
+    'validation': 'medium',
+    'business_logic': 'medium',
+    'unexpected': 'high',
+}
+
+
+class EcsJsonFormatter(logging.Formatter):
+    """
+    Format records as one ECS-style JSON object per line.
+
+    ``error.type`` and ``operation`` come from the record's ``error_type`` and
+    ``operation`` attributes (pass them with ``extra=``). When no error type
+    is given, a leading ``TAG:`` from ``ERROR_TAGS`` is used instead.
+    ``alert.severity`` is derived from the error type. ``log.count`` is the
+    number of occurrences a record stands for (see log_filters); it is
+    written on every WARNING and above, and on sampled or summary records
+    below that, so alerts can sum it over error records. APM trace and
+    transaction ids are copied from the attributes set by the elasticapm
+    log record factory.
+    """
+
+    def __init__(self, service_name='flask-app', environment=None):
+        super().__init__()
+        self.service_name = service_name
+        self.environment = environment
+        # strftime is the slowest part of a record; reuse it within a second
+        self._second_cache = (None, '')
+        self._encode = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+
+    def _timestamp(self, created):
+        second = int(created)
+        cached_second, text = self._second_cache
+        if second != cached_second:
+            text = time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(second))
+            self._second_cache = (second, text)
+        return f"{text}.{int((created - second) * 1000):03d}Z"
+
+    def format(self, record):
+        message = record.getMessage()
+        doc = {
+            '@timestamp': self._timestamp(record.created),
+            'log.level': record.levelname.lower(),
+            'log.logger': record.name,
+            'message': message,
+            'service.name': self.service_name,
+        }
+        if self.environment:
+            doc['service.environment'] = self.environment
+
+        error_type = getattr(record, 'error_type', None)
+        if error_type is None and record.levelno >= logging.WARNING:
+            error_type = ERROR_TAGS.get(message.partition(':')[0])
+        if error_type is not None:
+            doc['error.type'] = error_type
+            severity = ALERT_SEVERITY.get(error_type)
+            if severity:
+                doc['alert.severity'] = severity
+        count = getattr(record, 'log_count', None)
+        if count is not None:
+            doc['log.count'] = count
+        elif record.levelno >= logging.WARNING:
+            doc['log.count'] = 1
+        operation = getattr(record, 'operation', None)
+        if operation is not None:
+            doc['operation'] = operation
+
+        trace_id = getattr(record, 'elasticapm_trace_id', None)
+        if trace_id:
+            doc['trace.id'] = trace_id
+            doc['transaction.id'] = record.elasticapm_transaction_id
+
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            doc['error.stack_trace'] = record.exc_text
+        return self._encode(doc)
@@ -0,0 +1,188 @@
+import atexit
+import logging
+import threading
+from collections import deque
+
+OVERFLOW_POLICIES = ('block', 'drop_oldest', 'drop_debug')
+
+
+class QueueLogHandler(logging.Handler):
+    """Handler installed on the root logger; it only enqueues records"""
+
+    def __init__(self, pipeline):
+        super().__init__()
+        self.pipeline = pipeline
+
+    def prepare(self, record):
+        # Resolve the message and traceback now, while the arguments and
+        # exception are still valid, so the writer thread only formats.
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def emit(self, record):
+        try:
+            self.pipeline.put(self.prepare(record))
+        except Exception:
+            self.handleError(record)
+
+    def close(self):
+        self.pipeline.stop()
+        super().close()
+
+
+class QueueLogPipeline:
+    """
+    Bounded in-memory log queue drained by a single background writer.
+
+    Request threads only append to the queue. The writer thread takes up to
+    ``batch_size`` records at a time, writes them to every target handler
+    and flushes each target once per batch. When the queue is full the
+    ``policy`` decides what happens:
+
+    - ``block``: the logging thread waits for room
+    - ``drop_oldest``: the oldest queued record is discarded
+    - ``drop_debug``: a queued DEBUG record is discarded first, then the
+      incoming record if it is DEBUG, otherwise the oldest record
+    """
+
+    def __init__(self, targets, max_size=10000, policy='drop_debug', batch_size=256,
+                 flush_interval=0.5):
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown log overflow policy: {policy}")
+        self.targets = list(targets)
+        self.max_size = max_size
+        self.policy = policy
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.handler = QueueLogHandler(self)
+        self._queue = deque()
+        self._queued_debug = 0
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._counters = {
+            'enqueued': 0,
+            'written': 0,
+            'batches': 0,
+            'blocked': 0,
+            'dropped': 0,
+            'dropped_debug': 0,
+        }
+        self._writer = threading.Thread(target=self._run, name='log-writer', daemon=True)
+        self._writer.start()
+        atexit.register(self.stop)
+
+    def put(self, record):
+        with self._cond:
+            stopped = self._stopped
+        if stopped:
+            # Late records after shutdown go straight to the targets
+            self._write([record])
+            return
+        with self._cond:
+            if len(self._queue) >= self.max_size:
+                if not self._make_room(record):
+                    return
+            self._queue.append(record)
+            if record.levelno <= logging.DEBUG:
+                self._queued_debug += 1
+            self._counters['enqueued'] += 1
+            if len(self._queue) >= self.batch_size:
+                self._cond.notify_all()
+
+    def _make_room(self, record):
+        """Apply the overflow policy; False means the new record was dropped"""
+        if self.policy == 'block':
+            self._counters['blocked'] += 1
+            self._cond.notify_all()
+            while len(self._queue) >= self.max_size and not self._stopped:
+                self._cond.wait()
+            return True
+        if self.policy == 'drop_debug':
+            if self._queued_debug:
+                for i, queued in enumerate(self._queue):
+                    if queued.levelno <= logging.DEBUG:
+                        del self._queue[i]
+                        self._queued_debug -= 1
+                        self._count_drop(queued)
+                        return True
+            if record.levelno <= logging.DEBUG:
+                self._count_drop(record)
+                return False
+        self._count_drop(self._pop())
+        return True
+
+    def _pop(self):
+        record = self._queue.popleft()
+        if record.levelno <= logging.DEBUG:
+            self._queued_debug -= 1
+        return record
+
+    def _count_drop(self, record):
+        self._counters['dropped'] += 1
+        if record.levelno <= logging.DEBUG:
+            self._counters['dropped_debug'] += 1
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._queue and not self._stopped:
+                    self._cond.wait(self.flush_interval)
+                if not self._queue and self._stopped:
+                    return
+                batch = [self._pop()
+                         for _ in range(min(self.batch_size, len(self._queue)))]
+                # Wake producers blocked on a full queue
+                self._cond.notify_all()
+            if batch:
+                self._write(batch)
+
+    def _write(self, batch):
+        for target in self.targets:
+            target.acquire()
+            try:
+                # Rotating handlers reopen app.log here if another worker moved it
+                before_write = getattr(target, 'before_write', None)
+                if before_write is not None:
+                    before_write()
+                stream = getattr(target, 'stream', None)
+                if stream is None:
+                    for record in batch:
+                        target.handle(record)
+                    continue
+                lines = []
+                for record in batch:
+                    if record.levelno >= target.level and target.filter(record):
+                        lines.append(target.format(record) + target.terminator)
+                if lines:
+                    stream.write(''.join(lines))
+                    target.flush()
+            except Exception:
+                target.handleError(batch[-1])
+            finally:
+                target.release()
+        with self._cond:
+            self._counters['written'] += len(batch)
+            self._counters['batches'] += 1
+
+    def stop(self, timeout=5.0):
+        with self._cond:
+            if self._stopped:
+                return
+            self._stopped = True
+            self._cond.notify_all()
+        self._writer.join(timeout)
+        for target in self.targets:
+            target.flush()
+
+    def stats(self):
+        with self._cond:
+            return dict(
+                self._counters,
+                policy=self.policy,
+                queued=len(self._queue),
+                max_size=self.max_size,
+            )
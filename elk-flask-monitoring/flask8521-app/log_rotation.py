@@ -0,0 +1,220 @@
+import fcntl
+import glob
+import gzip
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+
+SEGMENT_TIME_FORMAT = '%Y%m%d-%H%M%S'
+SEGMENT_SUFFIX = re.compile(r'\.(\d{8}-\d{6})(?:-(\d+))?(\.gz)?$')
+
+logger = logging.getLogger(__name__)
+
+
+def segment_order(path):
+    stamp, suffix, _ = SEGMENT_SUFFIX.search(path).groups()
+    return stamp, int(suffix or 0)
+
+
+class CompressingRotatingFileHandler(logging.FileHandler):
+    """
+    FileHandler that rotates by size and/or time and gzips old segments.
+
+    The active file keeps its name (``app.log``). On rotation it is renamed
+    to ``app.log.<UTC time>`` and a new file is opened; the rename keeps the
+    inode, so Filebeat finishes the renamed file from its stored offset and
+    starts the new one at zero. A background thread compresses segments to
+    ``app.log.<UTC time>.gz`` once they are ``compress_delay`` seconds old
+    (giving Filebeat time to reach the end) and then deletes all but the
+    newest ``backup_count`` segments. Neither name matches ``app.log``.
+
+    The size check runs in ``flush()``, after a write, which both the normal
+    emit path and QueueLogPipeline's batched writes call. ``before_write()``
+    runs first: it rotates once the time boundary has passed and reopens
+    ``app.log`` if another process already moved it, so no record lands in
+    a segment that may already have been compressed and removed.
+
+    Several processes (gunicorn workers) can share one file: rotation takes
+    an flock on ``app.log.lock``, and a process that finds ``app.log``
+    already replaced by another one just reopens it. Every process applies
+    retention; a segment another one deleted first is skipped.
+    """
+
+    def __init__(self, filename, max_bytes=0, interval=0, backup_count=14, compress=True,
+                 compress_delay=30.0, encoding=None):
+        super().__init__(filename, encoding=encoding)
+        self.max_bytes = max_bytes
+        self.interval = interval
+        self.backup_count = backup_count
+        self.compress = compress
+        self.compress_delay = compress_delay
+        self._rollover_at = self._next_rollover(time.time())
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._counters = {'rotations': 0, 'compressed': 0, 'deleted': 0, 'compress_seconds': 0.0}
+        # Segments left uncompressed by a previous run are picked up again
+        for segment in sorted(self._segments()):
+            if not segment.endswith('.gz'):
+                self._pending.append(segment)
+        self._worker = threading.Thread(target=self._run, name='log-compressor', daemon=True)
+        self._worker.start()
+
+    def _next_rollover(self, now):
+        if not self.interval:
+            return None
+        # Aligned to UTC, so interval=86400 rotates at midnight and 3600 on the hour
+        return (int(now) // self.interval + 1) * self.interval
+
+    def _segments(self):
+        prefix = len(self.baseFilename)
+        return [path for path in glob.glob(glob.escape(self.baseFilename) + '.*')
+                if SEGMENT_SUFFIX.fullmatch(path[prefix:])]
+
+    def should_rollover(self):
+        if self.stream is None:
+            return False
+        if self._rollover_at is not None and time.time() >= self._rollover_at:
+            return True
+        # flush() has emptied the text layer, so the binary buffer's position is exact and cheap
+        return bool(self.max_bytes) and self.stream.buffer.tell() >= self.max_bytes
+
+    def before_write(self):
+        # One stat per write, as logging.handlers.WatchedFileHandler does
+        if self.stream is None:
+            return
+        if (self._rollover_at is not None and time.time() >= self._rollover_at) or self._rotated_elsewhere():
+            self.do_rollover()
+
+    def emit(self, record):
+        self.acquire()
+        try:
+            self.before_write()
+            super().emit(record)
+        finally:
+            self.release()
+
+    def flush(self):
+        self.acquire()
+        try:
+            super().flush()
+            if self.should_rollover():
+                self.do_rollover()
+        finally:
+            self.release()
+
+    def do_rollover(self):
+        with open(self.baseFilename + '.lock', 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                rotated_elsewhere = self._rotated_elsewhere()
+                if self.stream is not None:
+                    self.stream.close()
+                    self.stream = None
+                if not rotated_elsewhere:
+                    self._rename_active()
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+        self._rollover_at = self._next_rollover(time.time())
+        self.stream = self._open()
+
+    def _rotated_elsewhere(self):
+        """True if another process already moved the file this handler writes to"""
+        if self.stream is None:
+            return False
+        try:
+            return os.stat(self.baseFilename).st_ino != os.fstat(self.stream.fileno()).st_ino
+        except FileNotFoundError:
+            return True
+
+    def _rename_active(self):
+        now = time.time()
+        segment = f"{self.baseFilename}.{time.strftime(SEGMENT_TIME_FORMAT, time.gmtime(now))}"
+        suffix = 1
+        candidate = segment
+        while os.path.exists(candidate) or os.path.exists(candidate + '.gz'):
+            candidate = f"{segment}-{suffix}"
+            suffix += 1
+        if os.path.exists(self.baseFilename):
+            os.rename(self.baseFilename, candidate)
+            with self._cond:
+                self._pending.append(candidate)
+                self._counters['rotations'] += 1
+                self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                segment = self._pending[0]
+            # Rotation time is the segment's mtime; wait until it is old enough
+            try:
+                wait = os.path.getmtime(segment) + self.compress_delay - time.time()
+            except OSError:
+                wait = 0
+            if wait > 0:
+                time.sleep(min(wait, self.compress_delay))
+                continue
+            with self._cond:
+                self._pending.popleft()
+            try:
+                if self.compress and os.path.exists(segment):
+                    self._compress(segment)
+                self._apply_retention()
+            except OSError as e:
+                logger.error(f"Log compression failed for {segment}: {str(e)}")
+
+    def _compress(self, segment):
+        started = time.perf_counter()
+        tmp = f"{segment}.gz.{os.getpid()}.tmp"
+        try:
+            with open(segment, 'rb') as source, gzip.open(tmp, 'wb', compresslevel=6) as target:
+                while True:
+                    chunk = source.read(1 << 20)
+                    if not chunk:
+                        break
+                    target.write(chunk)
+                    # Under gevent workers this thread is a greenlet; let requests run between chunks
+                    time.sleep(0)
+            os.replace(tmp, segment + '.gz')
+            os.remove(segment)
+        except FileNotFoundError:
+            # Another worker picked up the same leftover segment
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return
+        with self._cond:
+            self._counters['compressed'] += 1
+            self._counters['compress_seconds'] += time.perf_counter() - started
+
+    def _apply_retention(self):
+        if not self.backup_count:
+            return
+        with self._cond:
+            pending = set(self._pending)
+        # Names sort by rotation time; mtimes change when a segment is compressed
+        segments = sorted(self._segments(), key=segment_order)
+        for old in segments[:-self.backup_count]:
+            if old in pending:
+                continue
+            try:
+                os.remove(old)
+            except FileNotFoundError:
+                # Another worker applied retention to the same directory first
+                continue
+            with self._cond:
+                self._counters['deleted'] += 1
+
+    def stats(self):
+        with self._cond:
+            return dict(
+                self._counters,
+                compress_seconds=round(self._counters['compress_seconds'], 3),
+                pending=len(self._pending),
+                max_bytes=self.max_bytes,
+                interval=self.interval,
+                backup_count=self.backup_count,
+            )
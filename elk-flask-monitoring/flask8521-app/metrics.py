@@ -0,0 +1,331 @@
+import bisect
+import json
+import os
+import threading
+import time
+from threading import get_ident
+
+from flask import _request_ctx_stack
+
+# Upper bounds in seconds; requests and queries in this app range from well
+# under a millisecond (cache hits) to the 1-5 s of /slow
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SHARDS = 16
+STATUS_CLASSES = {n: f"{n}xx" for n in range(1, 6)}
+
+
+def _shard():
+    # Thread stacks (and greenlets) are at least a page apart
+    return (get_ident() >> 12) % SHARDS
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _label_text(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _add(total, value):
+    # Counter and gauge values are numbers, histogram rows are lists
+    if total is None:
+        return list(value) if isinstance(value, list) else value
+    if isinstance(value, list):
+        return [a + b for a, b in zip(total, value)]
+    return total + value
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class _Sharded:
+    """Values split over SHARDS dicts with one lock each, so threads rarely share a lock"""
+
+    def __init__(self, name, documentation, labels):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._shards = [({}, threading.Lock()) for _ in range(SHARDS)]
+
+    def _merged(self, merge):
+        merged = {}
+        for values, lock in self._shards:
+            with lock:
+                items = [(key, merge(None, value)) for key, value in values.items()]
+            for key, value in items:
+                merged[key] = merge(merged.get(key), value)
+        return merged
+
+
+class Counter(_Sharded):
+    kind = 'counter'
+
+    def inc(self, labels=(), amount=1):
+        values, lock = self._shards[_shard()]
+        with lock:
+            values[labels] = values.get(labels, 0) + amount
+
+    def collect(self):
+        return self._merged(_add)
+
+    def render(self, values):
+        for labels, value in sorted(values.items()):
+            yield f"{self.name}{_label_text(self.labels, labels)} {_format_value(value)}"
+
+    def expose(self):
+        return self.render(self.collect())
+
+
+class Histogram(_Sharded):
+    """Fixed-bucket histogram; each label set keeps per-bucket counts and a sum"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, labels, seconds):
+        index = bisect.bisect_left(self.buckets, seconds)
+        values, lock = self._shards[_shard()]
+        with lock:
+            row = values.get(labels)
+            if row is None:
+                # One slot per bucket, one for +Inf, then the sum
+                row = values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            row[index] += 1
+            row[-1] += seconds
+
+    def time(self, labels=()):
+        return _Timer(self, labels)
+
+    def snapshot(self):
+        """{labels: [count per bucket..., +Inf count, sum]} summed over shards"""
+        return self._merged(_add)
+
+    def collect(self):
+        return self.snapshot()
+
+    def expose(self):
+        return self.render(self.snapshot())
+
+    def render(self, values):
+        for labels, row in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), row):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float('inf') else f'le="{bound!r}"'
+                yield f"{self.name}_bucket{_label_text(self.labels, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_label_text(self.labels, labels)} {row[-1]!r}"
+            yield f"{self.name}_count{_label_text(self.labels, labels)} {cumulative}"
+
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'started')
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(self.labels, time.perf_counter() - self.started)
+
+
+class Gauges:
+    """Values read from ``collect()`` at scrape time, e.g. pool stats"""
+
+    def __init__(self, name, documentation, labels, collect, kind='gauge'):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.kind = kind
+        self._collect = collect
+
+    def collect(self):
+        return dict(self._collect())
+
+    def render(self, values):
+        for labels, value in values.items():
+            yield f"{self.name}{_label_text(self.labels, labels)} {_format_value(value)}"
+
+    def expose(self):
+        return self.render(self.collect())
+
+
+class MetricsRegistry:
+    """Metric families rendered together in the Prometheus text format (0.0.4)"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labels=()):
+        return self.register(Counter(name, documentation, labels))
+
+    def histogram(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labels, buckets))
+
+    def gauges(self, name, documentation, labels, collect, kind='gauge'):
+        return self.register(Gauges(name, documentation, labels, collect, kind))
+
+    def kinds(self):
+        return {metric.name: metric.kind for metric in self._metrics}
+
+    def collect(self):
+        """{name: {labels: value}} for every metric in this process"""
+        return {metric.name: metric.collect() for metric in self._metrics}
+
+    def expose(self, values=None):
+        """Renders ``values`` (as returned by ``collect()``), by default this process's own"""
+        if values is None:
+            values = self.collect()
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render(values.get(metric.name, {})))
+        return '\n'.join(lines) + '\n'
+
+
+class WorkerMetrics:
+    """
+    Sums a registry over the worker processes of one server.
+
+    Each worker writes its values to ``<directory>/<pid>-<start ms>.json``
+    every ``interval`` seconds and when it stops. A scrape adds the other
+    workers' files to its own live values, so whichever worker answers
+    reports the same totals. Counters and histograms of workers that have
+    exited are kept, so totals don't drop when a worker is recycled; gauges
+    only sum live workers. The directory is emptied once per server start
+    (gunicorn.conf.py's ``on_starting``), not by the workers.
+    """
+
+    def __init__(self, registry, directory, interval=1.0):
+        self.registry = registry
+        self.directory = directory
+        self.interval = interval
+        self.path = os.path.join(directory, f"{os.getpid()}-{int(time.time() * 1000)}.json")
+        self._stopped = threading.Event()
+        self._thread = None
+        os.makedirs(directory, exist_ok=True)
+
+    def start(self):
+        self.write()
+        self._thread = threading.Thread(target=self._run, name='metrics-writer', daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.write()
+
+    def write(self):
+        values = {name: [[list(labels), value] for labels, value in family.items()]
+                  for name, family in self.registry.collect().items()}
+        # Readers open either the old file or the new one, never a partial write
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(values, f)
+        os.replace(temp_path, self.path)
+
+    def _other_workers(self):
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if not name.endswith('.json') or path == self.path:
+                continue
+            try:
+                with open(path) as f:
+                    values = json.load(f)
+            except (OSError, ValueError):
+                continue
+            yield _alive(int(name.split('-', 1)[0])), values
+
+    def collect(self):
+        merged = self.registry.collect()
+        kinds = self.registry.kinds()
+        for alive, values in self._other_workers():
+            for name, rows in values.items():
+                if name not in merged or (not alive and kinds[name] == 'gauge'):
+                    continue
+                family = merged[name]
+                for labels, value in rows:
+                    labels = tuple(labels)
+                    family[labels] = _add(family.get(labels), value)
+        return merged
+
+    def expose(self):
+        return self.registry.expose(self.collect())
+
+    def stop(self):
+        self._stopped.set()
+        self.write()
+
+
+class RequestMetrics:
+    """
+    Per-route request latency histograms and counts by status class.
+
+    Routes are Flask rules (``/books/<book_id>``), so ids don't create new
+    series; requests that match no rule are counted as ``unmatched``. The
+    histogram is labelled by route, method and status class, and
+    ``http_requests_total`` is read from its counts at scrape time, so a
+    request costs one observation. Timing wraps ``full_dispatch_request``,
+    which covers the before/after request hooks, aborts and error handlers
+    but not streaming the response body. Flask's ``request``/``g`` proxies
+    cost several microseconds per access here, so the request context is
+    read once, directly.
+    """
+
+    def __init__(self, app, registry):
+        self.latency = registry.histogram(
+            'http_request_duration_seconds', 'HTTP request latency by route, method and status class',
+            ('route', 'method', 'status'))
+        registry.gauges('http_requests_total', 'HTTP requests by route, method and status class',
+                        ('route', 'method', 'status'), self._request_counts, kind='counter')
+        dispatch = app.full_dispatch_request
+
+        def full_dispatch_request():
+            started = time.perf_counter()
+            try:
+                response = dispatch()
+            except Exception:
+                self._finish(started, 500)
+                raise
+            self._finish(started, response.status_code)
+            return response
+
+        app.full_dispatch_request = full_dispatch_request
+
+    def _finish(self, started, status_code):
+        elapsed = time.perf_counter() - started
+        req = _request_ctx_stack.top.request
+        rule = req.url_rule
+        self.record(rule.rule if rule is not None else 'unmatched', req.method, status_code, elapsed)
+
+    def record(self, route, method, status_code, seconds):
+        self.latency.observe((route, method, STATUS_CLASSES.get(status_code // 100, 'other')), seconds)
+
+    def _request_counts(self):
+        return sorted((labels, sum(row[:-1])) for labels, row in self.latency.snapshot().items())
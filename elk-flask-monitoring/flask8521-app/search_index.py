@@ -0,0 +1,234 @@
+import bisect
+import heapq
+import logging
+import re
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+TOKEN = re.compile(r'\w+')
+# Shorter last tokens are matched exactly; a one-letter prefix matches most of the table
+MIN_PREFIX = 2
+
+
+def tokenize(text):
+    return TOKEN.findall(text.casefold())
+
+
+class BookSearchIndex:
+    """
+    In-process inverted index over book titles and authors.
+
+    Every word of the title and author is a token. All query tokens must
+    match; the last one also matches as a prefix, so ``harry pot`` finds
+    "Harry Potter". Books where the last word matches exactly come first,
+    then prefix matches, each in id order.
+
+    ``rebuild(rows)`` replaces the whole index from ``(id, title, author)``
+    rows. Writes that arrive while it reads the rows are replayed on top, so
+    nothing is lost to the swap. ``add`` indexes one write. ``sync(rows)`` adds
+    rows newer than the ones already indexed (see ``max_id``); other workers'
+    writes reach this index that way. A full rebuild also picks up changes
+    that ``sync`` cannot see.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.ready = False
+        self._docs = {}
+        self._postings = {}
+        self._vocab = []
+        self._max_id = 0
+        self._pending = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._counters = {'searches': 0, 'adds': 0, 'synced': 0, 'rebuilds': 0, 'sync_errors': 0}
+        self._last_rebuild = {'seconds': None, 'at': None}
+
+    @property
+    def max_id(self):
+        return self._max_id
+
+    def _index(self, docs, postings, book_id, title, author):
+        # A tuple of interned strings: a fraction of a frozenset's memory, and as fast for a title's few words
+        tokens = tuple({sys.intern(token): None for token in tokenize(f"{title} {author}")})
+        docs[book_id] = (title, author, tokens)
+        new_tokens = []
+        for token in tokens:
+            ids = postings.get(token)
+            if ids is None:
+                postings[token] = [book_id]
+                new_tokens.append(token)
+            elif ids[-1] < book_id:
+                ids.append(book_id)
+            else:
+                # Posting lists stay sorted by id; only out-of-order syncs get here
+                bisect.insort(ids, book_id)
+        return new_tokens
+
+    def _unindex(self, book_id):
+        doc = self._docs.pop(book_id, None)
+        if doc is None:
+            return
+        for token in doc[2]:
+            ids = self._postings[token]
+            del ids[bisect.bisect_left(ids, book_id)]
+            if not ids:
+                del self._postings[token]
+                del self._vocab[bisect.bisect_left(self._vocab, token)]
+
+    def _apply(self, book_id, title, author):
+        # Called with the lock held
+        doc = self._docs.get(book_id)
+        if doc is not None and doc[0] == title and doc[1] == author:
+            # Replayed writes and sync overlaps are mostly rows already indexed
+            return
+        self._unindex(book_id)
+        for token in self._index(self._docs, self._postings, book_id, title, author):
+            bisect.insort(self._vocab, token)
+        self._max_id = max(self._max_id, book_id)
+
+    def add(self, book_id, title, author):
+        if not self.ready and self._pending is None:
+            # Never built: the first rebuild reads this row from the table
+            return
+        with self._lock:
+            self._apply(book_id, title, author)
+            if self._pending is not None:
+                self._pending.append((book_id, title, author))
+            self._counters['adds'] += 1
+
+    def sync(self, rows):
+        added = 0
+        for book_id, title, author in rows:
+            with self._lock:
+                self._apply(book_id, title, author)
+                if self._pending is not None:
+                    self._pending.append((book_id, title, author))
+            added += 1
+        with self._lock:
+            self._counters['synced'] += added
+        return added
+
+    def rebuild(self, rows):
+        started = time.perf_counter()
+        with self._lock:
+            self._pending = []
+        docs, postings, max_id = {}, {}, 0
+        try:
+            for book_id, title, author in rows:
+                self._index(docs, postings, book_id, title, author)
+                max_id = max(max_id, book_id)
+        except BaseException:
+            with self._lock:
+                self._pending = None
+            raise
+        vocab = sorted(postings)
+        with self._lock:
+            pending, self._pending = self._pending, None
+            self._docs, self._postings, self._vocab = docs, postings, vocab
+            self._max_id = max_id
+            for book_id, title, author in pending:
+                self._apply(book_id, title, author)
+            self.ready = True
+            self._counters['rebuilds'] += 1
+            self._last_rebuild = {'seconds': round(time.perf_counter() - started, 3), 'at': time.time()}
+        logger.info(f"Search index rebuilt: {len(docs)} books, {len(vocab)} tokens in "
+                    f"{self._last_rebuild['seconds']:.2f}s")
+
+    def _extensions(self, prefix):
+        # Posting lists of the words that start with ``prefix``, the word itself excluded
+        if len(prefix) < MIN_PREFIX:
+            return []
+        lists = []
+        for index in range(bisect.bisect_right(self._vocab, prefix), len(self._vocab)):
+            word = self._vocab[index]
+            if not word.startswith(prefix):
+                break
+            lists.append(self._postings[word])
+        return lists
+
+    def _collect(self, driver, required, accept, limit, found):
+        # Walk ``driver`` in id order, keep books that have every required token and pass ``accept``
+        docs = self._docs
+        for book_id in driver:
+            tokens = docs[book_id][2]
+            if all(token in tokens for token in required) and accept(tokens):
+                found.append(book_id)
+                if len(found) >= limit:
+                    return
+
+    def search(self, query, limit=20):
+        """Return up to ``limit`` (id, title, author) rows matching ``query``"""
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        last = tokens[-1]
+        required = set(tokens[:-1])
+        with self._lock:
+            self._counters['searches'] += 1
+            postings = self._postings
+            if any(token not in postings for token in required):
+                return []
+            # Each pass walks the shortest posting list and stops at ``limit`` books,
+            # so common words cost no more than rare ones
+            lists = [postings[token] for token in required]
+            found = []
+            if last in postings:
+                driver = min(lists + [postings[last]], key=len)
+                self._collect(driver, required, lambda t: last in t, limit, found)
+            extensions = self._extensions(last)
+            if len(found) < limit and extensions:
+                shortest = min(lists, key=len, default=None)
+                if shortest is not None and len(shortest) <= sum(map(len, extensions)):
+                    driver = shortest
+                else:
+                    driver = heapq.merge(*extensions)
+                self._collect(driver, required,
+                              lambda t: last not in t and any(w.startswith(last) for w in t), limit, found)
+            docs = self._docs
+            return [(book_id, docs[book_id][0], docs[book_id][1]) for book_id in found]
+
+    def start_sync(self, load_after, load_all, sync_interval=5.0, rebuild_interval=600.0):
+        """
+        Keep the index in step with MySQL from a background thread:
+        ``load_after(max_id)`` every ``sync_interval`` seconds and
+        ``rebuild(load_all())`` every ``rebuild_interval`` seconds.
+        """
+        if self._thread is not None:
+            return
+
+        def run():
+            next_rebuild = time.monotonic() + rebuild_interval
+            while not self._stopped.wait(sync_interval):
+                try:
+                    if rebuild_interval and time.monotonic() >= next_rebuild:
+                        self.rebuild(load_all())
+                        next_rebuild = time.monotonic() + rebuild_interval
+                    else:
+                        self.sync(load_after(self._max_id))
+                except Exception as e:
+                    with self._lock:
+                        self._counters['sync_errors'] += 1
+                    logger.warning(f"Search index sync failed: {str(e)}")
+
+        self._thread = threading.Thread(target=run, name='search-index-sync', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def stats(self):
+        with self._lock:
+            return dict(
+                self._counters,
+                enabled=self.enabled,
+                ready=self.ready,
+                books=len(self._docs),
+                tokens=len(self._postings),
+                max_id=self._max_id,
+                last_rebuild=dict(self._last_rebuild),
+            )
@@ -0,0 +1,102 @@
+import threading
+
+from mysql.connector import Error, errorcode
+
+
+class CoalesceTimeoutError(Error):
+    """Raised to a caller whose shared in-flight lookup did not finish in time"""
+
+    def __init__(self, key, timeout):
+        super().__init__(
+            msg=f"DATABASE_QUERY_TIMEOUT: Waited {timeout:.1f}s for the in-flight lookup of {key}",
+            errno=errorcode.ER_QUERY_TIMEOUT,
+        )
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical lookups into one call.
+
+    The first caller for a key runs ``loader(key)``. Callers that ask for the
+    same key while it runs wait up to ``timeout`` seconds and get its result
+    or its exception instead of running their own query. Nothing is kept
+    after the call returns. Write paths call ``forget`` so that later callers
+    start a fresh lookup instead of joining one that began before the write.
+    """
+
+    def __init__(self, timeout=5.0, enabled=True):
+        self.timeout = timeout
+        self.enabled = enabled
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._counters = {
+            'calls': 0,
+            'executions': 0,
+            'coalesced': 0,
+            'timeouts': 0,
+            'shared_errors': 0,
+            'max_waiters': 0,
+        }
+
+    def do(self, key, loader):
+        with self._lock:
+            self._counters['calls'] += 1
+            call = self._calls.get(key) if self.enabled else None
+            joined = call is not None
+            if joined:
+                call.waiters += 1
+                self._counters['coalesced'] += 1
+                self._counters['max_waiters'] = max(self._counters['max_waiters'], call.waiters)
+            else:
+                self._counters['executions'] += 1
+                if self.enabled:
+                    call = self._calls[key] = _Call()
+        if joined:
+            return self._wait(key, call)
+        if call is None:
+            return loader(key)
+        try:
+            call.result = loader(key)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+            call.done.set()
+
+    def _wait(self, key, call):
+        if not call.done.wait(self.timeout):
+            with self._lock:
+                self._counters['timeouts'] += 1
+            raise CoalesceTimeoutError(key, self.timeout)
+        if call.error is not None:
+            with self._lock:
+                self._counters['shared_errors'] += 1
+            raise call.error
+        return call.result
+
+    def forget(self, key):
+        with self._lock:
+            self._calls.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return dict(
+                self._counters,
+                enabled=self.enabled,
+                in_flight=len(self._calls),
+                timeout=self.timeout,
+            )
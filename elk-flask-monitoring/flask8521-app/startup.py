@@ -0,0 +1,181 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class StartupTimer:
+    """Durations of named startup phases, in milliseconds, measured from ``started``"""
+
+    def __init__(self, started=None):
+        self.started = time.perf_counter() if started is None else started
+        self._phases = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def record(self, name, seconds):
+        with self._lock:
+            self._phases[name] = round(seconds * 1000, 1)
+
+    def mark(self, name):
+        """Record the time elapsed since ``started`` under ``name``"""
+        self.record(name, time.perf_counter() - self.started)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._phases)
+
+
+class Warmup:
+    """
+    Runs startup steps on a background thread so importing app.py doesn't
+    wait on MySQL or the APM server.
+
+    Steps run in order. A step that raises is retried after ``retry_delay``
+    seconds, doubling up to ``max_retry_delay``, until it succeeds or
+    ``stop()`` is called, and later steps wait for it. ``run(retry=False)``
+    runs the steps inline and raises instead. Each step's duration,
+    including retries, is recorded in ``timer`` as ``warmup.<name>``.
+    """
+
+    def __init__(self, steps, timer, retry_delay=0.5, max_retry_delay=10.0):
+        self.steps = list(steps)
+        self.timer = timer
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.done = threading.Event()
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+        self._current = None
+        self._attempts = {name: 0 for name, _ in self.steps}
+        self._last_error = None
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name='startup-warmup', daemon=True)
+        self._thread.start()
+        return self
+
+    def run(self, retry=True):
+        for name, step in self.steps:
+            with self._lock:
+                self._current = name
+            delay = self.retry_delay
+            with self.timer.phase(f"warmup.{name}"):
+                while not self._stopped.is_set():
+                    with self._lock:
+                        self._attempts[name] += 1
+                    try:
+                        step()
+                        break
+                    except Exception as e:
+                        if not retry:
+                            raise
+                        with self._lock:
+                            self._last_error = f"{name}: {e}"
+                        logger.warning(f"Startup step {name} failed, retrying in {delay:.1f}s: {str(e)}")
+                        self._stopped.wait(delay)
+                        delay = min(delay * 2, self.max_retry_delay)
+            if self._stopped.is_set():
+                return
+        with self._lock:
+            self._current = None
+        self.timer.mark('ready_after_start')
+        self.done.set()
+        logger.info(f"Startup warmup finished: {self.timer.stats()}")
+
+    def wait(self, timeout=None):
+        return self.done.wait(timeout)
+
+    def stop(self):
+        self._stopped.set()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'done': self.done.is_set(),
+                'current_step': self._current,
+                'attempts': dict(self._attempts),
+                'last_error': self._last_error,
+            }
+
+
+class ReadinessProbe:
+    """
+    Periodically runs ``checks`` ({name: callable}) on a background thread
+    and caches the outcome, so /ready costs a dict copy instead of a query.
+
+    A check passes if it returns without raising. The probe is ready when
+    every ``gates`` callable returns true and every check passed on the last
+    run, and that run finished less than ``stale_after`` seconds ago. A probe
+    thread that is stuck therefore reports not ready instead of its last
+    good result. Transitions are logged, failures as "Health check failed".
+    """
+
+    def __init__(self, checks, interval=5.0, stale_after=None, gates=()):
+        self.checks = dict(checks)
+        self.interval = interval
+        self.stale_after = stale_after if stale_after is not None else interval * 3
+        self.gates = list(gates)
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._result = {'checks': {}, 'checked_at': None}
+        self._ready = None
+        self._counters = {'runs': 0, 'failures': 0}
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='readiness-probe', daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self.refresh()
+            self._stopped.wait(self.interval)
+
+    def refresh(self):
+        results = {}
+        for name, check in self.checks.items():
+            started = time.perf_counter()
+            try:
+                check()
+                results[name] = {'ok': True}
+            except Exception as e:
+                results[name] = {'ok': False, 'error': str(e)}
+            results[name]['latency_ms'] = round((time.perf_counter() - started) * 1000, 1)
+        passed = all(result['ok'] for result in results.values())
+        with self._lock:
+            self._result = {'checks': results, 'checked_at': time.time()}
+            self._counters['runs'] += 1
+            if not passed:
+                self._counters['failures'] += 1
+            changed = passed != self._ready
+            self._ready = passed
+        if not passed:
+            errors = '; '.join(f"{name}: {r['error']}" for name, r in results.items() if not r['ok'])
+            logger.error(f"Health check failed: {errors}")
+        elif changed:
+            logger.info("Health check passed")
+
+    def status(self):
+        with self._lock:
+            result = dict(self._result, **self._counters)
+        checked_at = result['checked_at']
+        fresh = checked_at is not None and time.time() - checked_at < self.stale_after
+        checks_ok = bool(result['checks']) and all(r['ok'] for r in result['checks'].values())
+        result['age_s'] = None if checked_at is None else round(time.time() - checked_at, 1)
+        result['ready'] = fresh and checks_ok and all(gate() for gate in self.gates)
+        return result
+
+    def stop(self):
+        self._stopped.set()
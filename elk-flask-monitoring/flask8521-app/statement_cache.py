@@ -0,0 +1,103 @@
+import threading
+from collections import OrderedDict, namedtuple
+
+from mysql.connector import Error, IntegrityError
+
+Result = namedtuple('Result', 'rows rowcount lastrowid')
+
+
+class StatementCache:
+    """
+    Server-side prepared statements for the app's fixed queries, kept per
+    pooled connection.
+
+    ``execute(conn, sql, params)`` runs ``sql`` on a prepared cursor (binary
+    protocol) that ``conn`` keeps for that SQL text. MySQL therefore parses
+    each query once per connection instead of on every call. The connector
+    only reuses a statement when it gets the same string object back, so the
+    cache always executes with the first string it saw for a given text.
+    Queries built by concatenation are reused as well.
+
+    At most ``max_per_connection`` statements are kept per connection; the
+    least recently used is closed first. The pool calls ``evict(conn)`` when
+    it closes a connection, because the statements die with it. A statement
+    that fails with anything but an integrity error is dropped too, since its
+    cursor may still hold unread rows. With ``enabled`` false, queries use a
+    plain text-protocol cursor, as they did before.
+
+    A connection is only used by the thread that checked it out, so its
+    statements need no lock. Only the registry and the counters are locked.
+    """
+
+    def __init__(self, max_per_connection=16, enabled=True):
+        self.max_per_connection = max_per_connection
+        self.enabled = enabled
+        self._connections = {}
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'evicted': 0, 'dropped': 0}
+
+    def execute(self, conn, sql, params=()):
+        """Run ``sql`` on ``conn`` and return a Result with every row read"""
+        if not self.enabled:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(sql, params)
+                rows = cursor.fetchall() if cursor.description else []
+                return Result(rows, cursor.rowcount, cursor.lastrowid)
+            finally:
+                cursor.close()
+
+        with self._lock:
+            statements = self._connections.get(conn)
+            if statements is None:
+                statements = self._connections[conn] = OrderedDict()
+            entry = statements.get(sql)
+            self._counters['hits' if entry is not None else 'misses'] += 1
+        if entry is None:
+            entry = statements[sql] = (sql, conn.cursor(prepared=True))
+            if len(statements) > self.max_per_connection:
+                _, (_, oldest) = statements.popitem(last=False)
+                self._close_quietly(oldest)
+                with self._lock:
+                    self._counters['evicted'] += 1
+        else:
+            statements.move_to_end(sql)
+
+        prepared_sql, cursor = entry
+        try:
+            cursor.execute(prepared_sql, params)
+            rows = cursor.fetchall() if cursor.description else []
+        except IntegrityError:
+            raise
+        except Error:
+            statements.pop(sql, None)
+            self._close_quietly(cursor)
+            with self._lock:
+                self._counters['dropped'] += 1
+            raise
+        return Result(rows, cursor.rowcount, cursor.lastrowid)
+
+    def evict(self, conn):
+        """Forget the statements of a connection that is being closed"""
+        with self._lock:
+            statements = self._connections.pop(conn, None)
+            if statements:
+                self._counters['evicted'] += len(statements)
+
+    def stats(self):
+        with self._lock:
+            lookups = self._counters['hits'] + self._counters['misses']
+            return dict(
+                self._counters,
+                enabled=self.enabled,
+                hit_rate=round(self._counters['hits'] / lookups, 3) if lookups else None,
+                connections=len(self._connections),
+                statements=sum(len(statements) for statements in self._connections.values()),
+            )
+
+    @staticmethod
+    def _close_quietly(cursor):
+        try:
+            cursor.close()
+        except Exception:
+            pass
@@ -0,0 +1,725 @@
+#!/usr/bin/env python3
+"""
+Open-loop load engine for the error simulation scenarios
+
+Requests are issued on a fixed arrival schedule (constant or Poisson) instead
+of back to back, and each request's latency is measured from the moment it
+was *scheduled* to be sent. Queueing delay on the client or the server
+therefore shows up in the numbers instead of silently lowering the request
+rate (coordinated omission).
+
+With ``--workers N`` the rate is split across N load worker processes
+that start on a shared clock; their reports are merged into one.
+
+Usage:
+    python load_engine.py --scenario scenario1 --rate 200 --duration 60
+    python load_engine.py --scenario scenario3 --rate 500 --stand-in
+    python load_engine.py --scenario scenario1 --rate 4000 --workers 0   # one worker per CPU
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import multiprocessing
+import os
+import queue
+import random
+import signal
+import sys
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+FLASK_URL = "http://localhost:5000"
+
+
+class LatencyHistogram:
+    """
+    Log-bucketed latency histogram in the spirit of HdrHistogram.
+
+    Values are stored in microseconds in buckets that grow by ``precision``
+    (1% by default), so any percentile is reported within that relative
+    error while memory stays small. Histograms merge by adding bucket counts.
+    """
+
+    def __init__(self, precision=0.01):
+        self.precision = precision
+        self._log_base = math.log1p(precision)
+        self.counts = Counter()
+        self.total = 0
+        self.min = math.inf
+        self.max = 0.0
+
+    def record(self, seconds):
+        micros = max(seconds * 1e6, 1.0)
+        self.counts[int(math.log(micros) / self._log_base)] += 1
+        self.total += 1
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+
+    def value_at(self, percentile):
+        """Latency in seconds at ``percentile`` (0-100)"""
+        if not self.total:
+            return 0.0
+        target = max(1, math.ceil(self.total * percentile / 100.0))
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= target:
+                upper = math.exp((bucket + 1) * self._log_base) / 1e6
+                return min(max(upper, self.min), self.max)
+        return self.max
+
+    def merge(self, other):
+        self.counts.update(other.counts)
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def to_dict(self):
+        return {
+            'precision': self.precision,
+            'counts': dict(self.counts),
+            'total': self.total,
+            'min': self.min if self.total else None,
+            'max': self.max,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls(data['precision'])
+        histogram.counts.update({int(k): v for k, v in data['counts'].items()})
+        histogram.total = data['total']
+        histogram.min = data['min'] if data['min'] is not None else math.inf
+        histogram.max = data['max']
+        return histogram
+
+
+class HttpClient:
+    """
+    Minimal asyncio HTTP/1.1 client with keep-alive connection reuse.
+
+    At most ``max_connections`` requests are in flight; the rest wait for a
+    connection, and that wait is part of their measured latency.
+    """
+
+    def __init__(self, base_url, max_connections=256, timeout=10.0):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.timeout = timeout
+        self._idle = []
+        self._slots = asyncio.Semaphore(max_connections)
+
+    async def request(self, method, path, body=None):
+        """Send one request and return the response status code"""
+        payload = json.dumps(body).encode() if body is not None else b''
+        async with self._slots:
+            reused = bool(self._idle)
+            conn = self._idle.pop() if reused else await self._connect()
+            try:
+                status, keep_alive = await asyncio.wait_for(
+                    self._exchange(conn, method, path, payload), self.timeout)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                self._close(conn)
+                if not reused:
+                    raise
+                # The server closed an idle keep-alive connection; retry once
+                conn = await self._connect()
+                try:
+                    status, keep_alive = await asyncio.wait_for(
+                        self._exchange(conn, method, path, payload), self.timeout)
+                except BaseException:
+                    self._close(conn)
+                    raise
+            except BaseException:
+                self._close(conn)
+                raise
+            if keep_alive:
+                self._idle.append(conn)
+            else:
+                self._close(conn)
+            return status
+
+    async def _connect(self):
+        return await asyncio.wait_for(asyncio.open_connection(self.host, self.port), self.timeout)
+
+    async def _exchange(self, conn, method, path, payload):
+        reader, writer = conn
+        head = f"{method} {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n"
+        if payload:
+            head += f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n"
+        elif method in ('POST', 'PUT'):
+            head += "Content-Length: 0\r\n"
+        writer.write(head.encode() + b"\r\n" + payload)
+        await writer.drain()
+
+        status_line = await reader.readline()
+        if not status_line:
+            raise asyncio.IncompleteReadError(b'', None)
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        keep_alive = headers.get('connection', '').lower() != 'close' and not status_line.startswith(b'HTTP/1.0')
+        if method == 'HEAD' or status in (204, 304):
+            pass
+        elif 'content-length' in headers:
+            await reader.readexactly(int(headers['content-length']))
+        elif headers.get('transfer-encoding', '').lower() == 'chunked':
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                await reader.readexactly(size + 2)
+                if size == 0:
+                    break
+        else:
+            await reader.read()
+            keep_alive = False
+        return status, keep_alive
+
+    @staticmethod
+    def _close(conn):
+        conn[1].close()
+
+    async def close(self):
+        while self._idle:
+            self._close(self._idle.pop())
+
+
+class Operation:
+    """One weighted request type in a scenario's mix"""
+
+    def __init__(self, name, method, path, body=None, weight=1.0):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.body = body
+        self.weight = weight
+
+    def build(self):
+        path = self.path() if callable(self.path) else self.path
+        body = self.body() if callable(self.body) else self.body
+        return path, body
+
+
+class LoadReport:
+    """Per-endpoint latency histograms and outcome counts"""
+
+    def __init__(self):
+        self.histograms = {}
+        self.outcomes = {}
+        self.scheduled = 0
+        self.elapsed = 0.0
+
+    def record(self, name, latency, outcome):
+        if name not in self.histograms:
+            self.histograms[name] = LatencyHistogram()
+            self.outcomes[name] = Counter()
+        self.histograms[name].record(latency)
+        self.outcomes[name][outcome] += 1
+
+    def merge(self, other):
+        for name, histogram in other.histograms.items():
+            if name not in self.histograms:
+                self.histograms[name] = LatencyHistogram(histogram.precision)
+                self.outcomes[name] = Counter()
+            self.histograms[name].merge(histogram)
+            self.outcomes[name].update(other.outcomes[name])
+        self.scheduled += other.scheduled
+        self.elapsed = max(self.elapsed, other.elapsed)
+        return self
+
+    def to_dict(self):
+        return {
+            'histograms': {name: h.to_dict() for name, h in self.histograms.items()},
+            'outcomes': {name: dict(c) for name, c in self.outcomes.items()},
+            'scheduled': self.scheduled,
+            'elapsed': self.elapsed,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        report = cls()
+        report.histograms = {name: LatencyHistogram.from_dict(h) for name, h in data['histograms'].items()}
+        report.outcomes = {name: Counter(c) for name, c in data['outcomes'].items()}
+        report.scheduled = data['scheduled']
+        report.elapsed = data['elapsed']
+        return report
+
+    def print(self, title):
+        print("\n" + "=" * 88)
+        print(title)
+        print("=" * 88)
+        completed = sum(h.total for h in self.histograms.values())
+        rate = completed / self.elapsed if self.elapsed else 0.0
+        print(f"Scheduled: {self.scheduled}  Completed: {completed}  "
+              f"Elapsed: {self.elapsed:.1f}s  Achieved: {rate:.1f} req/s")
+        print(f"{'endpoint':<16}{'count':>8}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}"
+              f"{'p99.9 ms':>10}{'max ms':>10}  outcomes")
+        total_outcomes = Counter()
+        for name in sorted(self.histograms):
+            h = self.histograms[name]
+            outcomes = self.outcomes[name]
+            total_outcomes.update(outcomes)
+            mix = ' '.join(f"{k}:{v}" for k, v in sorted(outcomes.items()))
+            print(f"{name:<16}{h.total:>8}{h.value_at(50) * 1000:>10.1f}{h.value_at(90) * 1000:>10.1f}"
+                  f"{h.value_at(99) * 1000:>10.1f}{h.value_at(99.9) * 1000:>10.1f}{h.max * 1000:>10.1f}  {mix}")
+        errors = sum(v for k, v in total_outcomes.items() if not k.startswith('2'))
+        if completed:
+            print(f"Error mix: {errors}/{completed} ({errors / completed:.1%}) non-2xx -> "
+                  + ', '.join(f"{k}: {v}" for k, v in total_outcomes.most_common() if not k.startswith('2')))
+
+
+class OpenLoopEngine:
+    """
+    Drives a weighted mix of operations at a fixed arrival rate.
+
+    ``arrival`` is ``constant`` (evenly spaced) or ``poisson`` (exponential
+    gaps with the same mean). Requests are never held back because earlier
+    ones are still running; only ``max_connections`` limits how many are on
+    the wire at once.
+    """
+
+    def __init__(self, base_url=FLASK_URL, rate=50.0, duration=30.0, max_connections=256,
+                 timeout=10.0, arrival='constant', seed=None):
+        self.base_url = base_url
+        self.rate = rate
+        self.duration = duration
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.arrival = arrival
+        self.random = random.Random(seed)
+        self._stopping = False
+
+    def stop(self):
+        """Stop scheduling; requests already sent are still awaited"""
+        self._stopping = True
+
+    def schedule(self):
+        """Offsets in seconds from the start at which requests are due"""
+        offset = 0.0
+        while True:
+            if self.arrival == 'poisson':
+                offset += self.random.expovariate(self.rate)
+            else:
+                offset += 1.0 / self.rate
+            if offset >= self.duration:
+                return
+            yield offset
+
+    async def run(self, operations, start_at=None):
+        loop = asyncio.get_running_loop()
+        client = HttpClient(self.base_url, self.max_connections, self.timeout)
+        report = LoadReport()
+        weights = [op.weight for op in operations]
+        tasks = set()
+        start = start_at if start_at is not None else loop.time()
+        try:
+            for offset in self.schedule():
+                intended = start + offset
+                delay = intended - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                if self._stopping:
+                    break
+                op = self.random.choices(operations, weights)[0]
+                task = loop.create_task(self._fire(client, op, intended, report))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                report.scheduled += 1
+            if tasks:
+                await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await client.close()
+        report.elapsed = loop.time() - start
+        return report
+
+    async def _fire(self, client, op, intended, report):
+        path, body = op.build()
+        try:
+            outcome = str(await client.request(op.method, path, body))
+        except asyncio.TimeoutError:
+            outcome = 'timeout'
+        except (OSError, asyncio.IncompleteReadError, ValueError, IndexError):
+            outcome = 'connection_error'
+        report.record(op.name, asyncio.get_running_loop().time() - intended, outcome)
+
+
+def load_definition(name):
+    """
+    The open-loop view of a scenario in scenarios/ (see scenario_engine.py):
+    its title, its setup and teardown hooks and the request mix of all its
+    phases. --rate and --duration take the place of its rate profiles, and
+    hooks timed with ``at`` are not sent.
+    """
+    # Imported here because scenario_engine imports this module
+    from scenario_engine import load_scenario
+
+    scenario = load_scenario(name)
+    operations = []
+    for phase in scenario.phases:
+        operations.extend(op for op in phase.operations if op not in operations)
+    return {'title': scenario.title, 'setup': scenario.setup, 'operations': operations,
+            'teardown': scenario.teardown}
+
+
+def scenario_names():
+    from scenario_engine import list_scenarios
+    return list_scenarios()
+
+
+async def _send_hooks(base_url, hooks, timeout):
+    client = HttpClient(base_url, 1, timeout)
+    try:
+        for method, path in hooks:
+            if method == 'wait':
+                await asyncio.sleep(path)
+                continue
+            try:
+                status = await client.request(method, path)
+                print(f"  {method} {path}: {status}")
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError) as e:
+                print(f"  {method} {path}: failed ({e})")
+    finally:
+        await client.close()
+
+
+async def run_scenario(name, engine):
+    scenario = load_definition(name)
+    print(f"{scenario['title']} - open loop at {engine.rate:g} req/s for {engine.duration:g}s")
+    await _send_hooks(engine.base_url, scenario['setup'], engine.timeout)
+    try:
+        report = await engine.run(scenario['operations'])
+    finally:
+        await _send_hooks(engine.base_url, scenario['teardown'], engine.timeout)
+    report.print(scenario['title'])
+    return report
+
+
+# --- Distributed mode: one engine per worker process ---------------------
+
+# Time between the last worker reporting ready and the shared start
+START_GRACE = 0.5
+
+
+async def _run_share(engine, scenario, start_time, phase, stop):
+    loop = asyncio.get_running_loop()
+    # start_time is wall-clock time, the same in every worker
+    start_at = loop.time() + (start_time - time.time()) + phase
+
+    async def watch():
+        while not stop.is_set():
+            await asyncio.sleep(0.1)
+        engine.stop()
+
+    watcher = loop.create_task(watch())
+    try:
+        return await engine.run(load_definition(scenario)['operations'], start_at)
+    finally:
+        watcher.cancel()
+
+
+def _load_worker(index, workers, options, go, start_time, stop, results):
+    """Worker process: runs 1/workers of the scenario's rate and sends back its report"""
+    # Ctrl-C reaches the whole process group; the coordinator decides what it means
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    engine = OpenLoopEngine(options['url'], options['rate'] / workers, options['duration'],
+                            max(1, options['max_connections'] // workers), options['timeout'],
+                            options['arrival'])
+    # Constant arrivals are phase-shifted so that the workers' requests interleave evenly
+    phase = index / options['rate'] if options['arrival'] == 'constant' else 0.0
+    results.put(('ready', index, None))
+    go.wait()
+    try:
+        report = asyncio.run(_run_share(engine, options['scenario'], start_time.value, phase, stop))
+        results.put(('report', index, report.to_dict()))
+    except Exception as e:
+        results.put(('error', index, f"{type(e).__name__}: {e}"))
+
+
+async def _next_message(results, processes):
+    # Waits in a thread so that the event loop (and a stand-in server on it) keeps running
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            return await loop.run_in_executor(None, results.get, True, 0.5)
+        except queue.Empty:
+            if not any(p.is_alive() for p in processes):
+                return None
+
+
+async def run_distributed(name, engine, workers):
+    """
+    Run a scenario across ``workers`` processes, each with an equal share of
+    ``engine.rate`` and ``engine.max_connections``.
+
+    Every worker starts on the same wall-clock instant once all of them are
+    up. Setup and teardown hooks are sent once, by the coordinator. The first
+    Ctrl-C stops the workers from scheduling and collects what they measured
+    so far; a second one kills them.
+    """
+    scenario = load_definition(name)
+    print(f"{scenario['title']} - open loop at {engine.rate:g} req/s for {engine.duration:g}s "
+          f"across {workers} workers ({engine.rate / workers:g} req/s each)")
+    # spawn, not fork: the coordinator already has an event loop running
+    context = multiprocessing.get_context('spawn')
+    go, stop, results = context.Event(), context.Event(), context.Queue()
+    start_time = context.Value('d', 0.0)
+    options = {
+        'scenario': name, 'url': engine.base_url, 'rate': engine.rate, 'duration': engine.duration,
+        'max_connections': engine.max_connections, 'timeout': engine.timeout, 'arrival': engine.arrival,
+    }
+    processes = [context.Process(target=_load_worker, name=f'load-worker-{index}', daemon=True,
+                                 args=(index, workers, options, go, start_time, stop, results))
+                 for index in range(workers)]
+
+    interrupted = False
+
+    def interrupt():
+        nonlocal interrupted
+        interrupted = True
+        if stop.is_set():
+            print("\nKilling load workers")
+            for process in processes:
+                process.terminate()
+        else:
+            print("\nStopping load workers (Ctrl-C again to kill them)")
+            stop.set()
+
+    loop = asyncio.get_running_loop()
+    try:
+        loop.add_signal_handler(signal.SIGINT, interrupt)
+    except (NotImplementedError, RuntimeError):
+        pass
+    for process in processes:
+        process.start()
+
+    report, per_worker, hooks_sent = LoadReport(), {}, False
+    try:
+        waiting = set(range(workers))
+        while waiting and not stop.is_set():
+            message = await _next_message(results, processes)
+            if message is None:
+                break
+            waiting.discard(message[1])
+        if not waiting and not stop.is_set():
+            await _send_hooks(engine.base_url, scenario['setup'], engine.timeout)
+            hooks_sent = True
+            start_time.value = time.time() + START_GRACE
+        go.set()
+
+        pending = set(range(workers))
+        while pending:
+            message = await _next_message(results, processes)
+            if message is None:
+                break
+            kind, index, payload = message
+            if kind == 'report':
+                per_worker[index] = LoadReport.from_dict(payload)
+                report.merge(per_worker[index])
+            elif kind == 'error':
+                print(f"  worker {index} failed: {payload}")
+            pending.discard(index)
+        if pending:
+            print(f"  no report from workers {sorted(pending)}")
+    finally:
+        go.set()
+        stop.set()
+        for process in processes:
+            process.join(timeout=engine.timeout)
+            if process.is_alive():
+                process.terminate()
+        try:
+            loop.remove_signal_handler(signal.SIGINT)
+        except (NotImplementedError, RuntimeError):
+            pass
+        if hooks_sent:
+            await _send_hooks(engine.base_url, scenario['teardown'], engine.timeout)
+
+    for index in sorted(per_worker):
+        share = per_worker[index]
+        completed = sum(h.total for h in share.histograms.values())
+        rate = completed / share.elapsed if share.elapsed else 0.0
+        print(f"  worker {index}: scheduled {share.scheduled}, completed {completed}, {rate:.1f} req/s")
+    report.print(f"{scenario['title']} ({len(per_worker)}/{workers} workers)")
+    if interrupted:
+        raise KeyboardInterrupt
+    return report
+
+
+# --- Local stand-in for the Flask app ------------------------------------
+
+class StandInServer:
+    """
+    Asyncio HTTP server that mimics the Flask app's routes for engine tests.
+
+    Every request waits ``latency`` seconds (exponentially distributed around
+    that mean) and then returns the status the real route would: 404 for
+    paths the app doesn't define and 405 for the wrong method. While pool
+    exhaustion is simulated, database routes answer 503.
+    """
+
+    ROUTES = {
+        '/': ('GET',), '/success': ('GET',), '/bad-request': ('POST',), '/error': ('GET',),
+        '/slow': ('GET',), '/generate-error': ('GET',), '/random': ('GET',),
+        '/books': ('GET', 'POST'), '/books/bulk': ('POST',), '/books/export': ('GET',),
+        '/books/search': ('GET',), '/health': ('GET',), '/ready': ('GET',), '/metrics': ('GET',),
+        '/simulate-pool-exhaustion': ('POST',), '/reset-pool': ('POST',),
+        '/pool-stats': ('GET',), '/log-stats': ('GET',), '/apm-stats': ('GET',),
+        '/statement-stats': ('GET', 'POST'), '/circuit-stats': ('GET', 'POST'),
+        '/search-stats': ('GET', 'POST'), '/log-levels': ('GET', 'POST'),
+        '/cache-stats': ('GET', 'POST'), '/coalesce-stats': ('GET', 'POST'),
+    }
+    DB_ROUTES = ('/books', '/ready')
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.005, error_rate=0.0):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.error_rate = error_rate
+        self.pool_exhausted = False
+        self.requests = 0
+        self._server = None
+        self._handlers = {}
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        self._server.close()
+        # Closing the transports lets each handler see EOF and return
+        for task, writer in list(self._handlers.items()):
+            writer.transport.abort()
+        await asyncio.gather(*self._handlers, return_exceptions=True)
+        await self._server.wait_closed()
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def _route(self, method, path):
+        methods = self.ROUTES.get(path)
+        if methods is None:
+            # /books/<book_id> is the only route with a variable part
+            if not (path.startswith('/books/') and path.count('/') == 2):
+                return 404
+            methods = ('GET',)
+        if method not in methods:
+            return 405
+        if path == '/simulate-pool-exhaustion':
+            self.pool_exhausted = True
+            return 200
+        if path == '/reset-pool':
+            self.pool_exhausted = False
+            return 200
+        if self.pool_exhausted and path.startswith(self.DB_ROUTES):
+            return 503
+        if random.random() < self.error_rate or path == '/error':
+            return 500
+        if path == '/bad-request':
+            return 400
+        if path not in self.ROUTES:
+            book_id = path.rsplit('/', 1)[1]
+            if not book_id.isdigit() or int(book_id) <= 0:
+                return 400
+            return 200 if int(book_id) <= 100 else 404
+        if path == '/books' and method == 'POST':
+            return 201
+        return 200
+
+    async def _handle(self, reader, writer):
+        task = asyncio.current_task()
+        self._handlers[task] = writer
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode().split(' ', 2)
+                length = 0
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    if name.strip().lower() == 'content-length':
+                        length = int(value)
+                if length:
+                    await reader.readexactly(length)
+                self.requests += 1
+                if self.latency:
+                    await asyncio.sleep(random.expovariate(1.0 / self.latency))
+                status = self._route(method, path.split('?', 1)[0])
+                body = json.dumps({"status": status}).encode()
+                writer.write(f"HTTP/1.1 {status} X\r\nContent-Type: application/json\r\n"
+                             f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            self._handlers.pop(task, None)
+            writer.close()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Open-loop load engine for the error simulation scenarios")
+    parser.add_argument('--scenario', choices=scenario_names() + ['all'], default='scenario1',
+                        help="Definition in scenarios/ whose request mix and hooks to use")
+    parser.add_argument('--url', default=FLASK_URL, help="Target base URL")
+    parser.add_argument('--rate', type=float, default=50.0, help="Arrival rate in requests per second")
+    parser.add_argument('--duration', type=float, default=30.0, help="Seconds to generate load")
+    parser.add_argument('--arrival', choices=('constant', 'poisson'), default='constant')
+    parser.add_argument('--max-connections', type=int, default=256)
+    parser.add_argument('--timeout', type=float, default=10.0)
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Load worker processes sharing the rate; 0 means one per CPU")
+    parser.add_argument('--stand-in', action='store_true',
+                        help="Run against a local stand-in server instead of --url")
+    parser.add_argument('--stand-in-latency', type=float, default=0.005,
+                        help="Mean stand-in service time in seconds")
+    return parser
+
+
+async def _main(args):
+    stand_in = None
+    if args.stand_in:
+        stand_in = await StandInServer(latency=args.stand_in_latency).start()
+        args.url = stand_in.url
+        print(f"Stand-in server listening on {args.url}")
+    names = scenario_names() if args.scenario == 'all' else [args.scenario]
+    workers = args.workers or os.cpu_count() or 1
+    try:
+        for name in names:
+            engine = OpenLoopEngine(args.url, args.rate, args.duration, args.max_connections,
+                                    args.timeout, args.arrival)
+            if workers > 1:
+                await run_distributed(name, engine, workers)
+            else:
+                await run_scenario(name, engine)
+    finally:
+        if stand_in:
+            await stand_in.stop()
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        asyncio.run(_main(args))
+    except KeyboardInterrupt:
+        print("\nLoad run cancelled by user")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,450 @@
+#!/usr/bin/env python3
+"""
+Indexed offline analyzer for app.log and the Kibana log dumps
+
+Each file is memory-mapped and parsed once into a small per-minute index
+saved next to it (``<file>.idx.json``). The index records the byte offset it
+has read up to, so later runs only parse what was appended since. Queries
+are answered from the index alone, without rescanning the log.
+
+Understood line formats:
+    2025-05-10 15:26:08,204 ERROR: Get book failed: ...   Flask text format (UTC)
+    {"@timestamp": ..., "log.level": ..., ...}            ECS JSON (app.log, Kibana)
+    [2025-05-10T15:26:08.204+00:00][INFO ][status] ...    Kibana bracketed format
+Other lines (stack traces, banners) belong to the record before them and are
+not counted.
+
+Messages are indexed by template: numbers and quoted values are replaced so
+"Book ID 7 not found" and "Book ID 8 not found" share one key. Records that
+stand for several occurrences (``log.count`` from sampling, or a
+"(repeated N times)" summary) are counted that many times. Relative
+times (``--since 1h``) count back from the newest indexed record, so old
+dumps can be queried the same way as a live app.log.
+
+Usage:
+    python log_analyzer.py query logs --level ERROR --message "Get book failed" --since 1h
+    python log_analyzer.py query flask8521-app/app.log --group-by error_type --bucket 5m
+    python log_analyzer.py lines kibanalogs.txt --level WARN --since 30m
+    python log_analyzer.py index logs kibana.txt kibanalogs.txt
+"""
+
+import argparse
+import calendar
+import hashlib
+import json
+import mmap
+import os
+import re
+import sys
+import time
+from collections import Counter, defaultdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'flask8521-app'))
+from log_format import ERROR_TAGS  # noqa: E402
+
+INDEX_VERSION = 2
+INDEX_SUFFIX = '.idx.json'
+BUCKET_SECONDS = 60
+FINGERPRINT_BYTES = 1024
+DIMENSIONS = ('level', 'logger', 'error_type', 'operation', 'template')
+
+FLASK_LINE = re.compile(rb'(\d{4}-\d\d-\d\d \d\d:\d\d):(\d\d),\d{3} (\w+): (.*)')
+BRACKET_LINE = re.compile(rb'\[(\d{4}-\d\d-\d\dT\d\d:\d\d):(\d\d)\.\d+([+-]\d\d:\d\d|Z)?\]\[(\w+)\s*\]\[([^\]]*)\]\s?(.*)')
+TEMPLATE_SUBS = [
+    (re.compile(r"'[^']*'|\"[^\"]*\""), '*'),
+    (re.compile(r'\b[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\b'), '#'),
+    (re.compile(r'\d+'), '#'),
+]
+TEMPLATE_MAX_LENGTH = 160
+REPEATED_SUFFIX = re.compile(r' \(repeated (\d+) times\)$')
+LEVELS = {'WARN': 'WARNING', 'FATAL': 'CRITICAL', 'ERR': 'ERROR'}
+
+_minute_cache = {}
+
+
+def minute_epoch(minute, tz=None):
+    """Epoch seconds of 'YYYY-MM-DDTHH:MM' (or with a space), shifted by a '+HH:MM' offset"""
+    key = (minute, tz)
+    epoch = _minute_cache.get(key)
+    if epoch is None:
+        epoch = calendar.timegm(time.strptime(minute.replace(' ', 'T'), '%Y-%m-%dT%H:%M'))
+        if tz and tz != 'Z':
+            sign = -1 if tz[0] == '+' else 1
+            epoch += sign * (int(tz[1:3]) * 3600 + int(tz[4:6]) * 60)
+        _minute_cache[key] = epoch
+    return epoch
+
+
+def template_of(message):
+    message = message.split('\n', 1)[0]
+    for pattern, replacement in TEMPLATE_SUBS:
+        message = pattern.sub(replacement, message)
+    return message[:TEMPLATE_MAX_LENGTH]
+
+
+def split_repeated(message, count=None):
+    """Strip a "(repeated N times)" suffix; returns (message, occurrences)"""
+    match = REPEATED_SUFFIX.search(message)
+    if match is None:
+        return message, count or 1
+    return message[:match.start()], count or int(match.group(1))
+
+
+def normalize_level(level):
+    level = level.strip().upper()
+    return LEVELS.get(level, level)
+
+
+def error_type_of(message, level):
+    if level in ('WARNING', 'ERROR', 'CRITICAL'):
+        return ERROR_TAGS.get(message.partition(':')[0], '')
+    return ''
+
+
+def parse_line(line):
+    """Return (epoch_second, level, logger, error_type, operation, message, count) or None"""
+    first = line[:1]
+    if first == b'{':
+        try:
+            doc = json.loads(line)
+        except ValueError:
+            return None
+        stamp = doc.get('@timestamp')
+        if not isinstance(stamp, str) or len(stamp) < 19:
+            return None
+        log = doc.get('log') if isinstance(doc.get('log'), dict) else {}
+        level = normalize_level(str(doc.get('log.level') or log.get('level') or ''))
+        count = doc.get('log.count') or log.get('count')
+        message, count = split_repeated(str(doc.get('message', '')), count if isinstance(count, int) else None)
+        error = doc.get('error') if isinstance(doc.get('error'), dict) else {}
+        error_type = doc.get('error.type') or error.get('type') or error_type_of(message, level)
+        epoch = minute_epoch(stamp[:16]) + int(stamp[17:19])
+        return (epoch, level, str(doc.get('log.logger') or log.get('logger') or ''),
+                str(error_type), str(doc.get('operation') or ''), message, count)
+    if first == b'[':
+        match = BRACKET_LINE.match(line)
+        if match is None:
+            return None
+        minute, second, tz, level, logger, message = match.groups()
+        level = normalize_level(level.decode())
+        message, count = split_repeated(message.decode('utf-8', 'replace'))
+        epoch = minute_epoch(minute.decode(), tz.decode() if tz else None) + int(second)
+        return epoch, level, logger.decode('utf-8', 'replace'), error_type_of(message, level), '', message, count
+    if first.isdigit():
+        match = FLASK_LINE.match(line)
+        if match is None:
+            return None
+        minute, second, level, message = match.groups()
+        level = normalize_level(level.decode())
+        message, count = split_repeated(message.decode('utf-8', 'replace'))
+        return (minute_epoch(minute.decode()) + int(second), level, '', error_type_of(message, level), '',
+                message, count)
+    return None
+
+
+class LogIndex:
+    """
+    Per-minute counts for one log file, keyed by (level, logger, error_type,
+    operation, template), plus the byte range each minute's records span.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.index_path = path + INDEX_SUFFIX
+        self.reset()
+
+    def reset(self):
+        self.offset = 0
+        self.inode = None
+        self.fingerprint = None
+        self.records = 0
+        self.keys = []
+        self._key_ids = {}
+        # bucket epoch -> [first byte offset, end byte offset, Counter(key id -> count)]
+        self.buckets = {}
+
+    def load(self):
+        try:
+            with open(self.index_path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if data.get('version') != INDEX_VERSION:
+            return False
+        self.offset = data['offset']
+        self.inode = data['inode']
+        self.fingerprint = data['fingerprint']
+        self.records = data['records']
+        self.keys = [tuple(key) for key in data['keys']]
+        self._key_ids = {key: i for i, key in enumerate(self.keys)}
+        self.buckets = {
+            int(epoch): [first, end, Counter({int(k): n for k, n in counts.items()})]
+            for epoch, (first, end, counts) in data['buckets'].items()
+        }
+        return True
+
+    def save(self):
+        data = {
+            'version': INDEX_VERSION,
+            'offset': self.offset,
+            'inode': self.inode,
+            'fingerprint': self.fingerprint,
+            'records': self.records,
+            'keys': self.keys,
+            'buckets': {str(epoch): bucket for epoch, bucket in self.buckets.items()},
+        }
+        tmp = self.index_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(data, f, separators=(',', ':'))
+        os.replace(tmp, self.index_path)
+
+    def _key_id(self, key):
+        key_id = self._key_ids.get(key)
+        if key_id is None:
+            key_id = self._key_ids[key] = len(self.keys)
+            self.keys.append(key)
+        return key_id
+
+    def update(self):
+        """Parse bytes appended since the checkpoint; returns the number of bytes read"""
+        stat = os.stat(self.path)
+        loaded = self.load()
+        with open(self.path, 'rb') as f:
+            head = f.read(FINGERPRINT_BYTES)
+        fingerprint = hashlib.sha1(head).hexdigest()
+        if not loaded or stat.st_ino != self.inode or stat.st_size < self.offset or \
+                (self.fingerprint != fingerprint and self.offset >= FINGERPRINT_BYTES):
+            # New, rotated or truncated file: start over
+            self.reset()
+        self.inode = stat.st_ino
+        self.fingerprint = fingerprint
+        if stat.st_size == self.offset:
+            return 0
+
+        start = self.offset
+        with open(self.path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            pos = start
+            size = len(mm)
+            buckets = self.buckets
+            while pos < size:
+                end = mm.find(b'\n', pos)
+                if end == -1:
+                    # Incomplete last line; it is parsed once it is terminated
+                    break
+                parsed = parse_line(mm[pos:end].rstrip(b'\r'))
+                if parsed is not None:
+                    epoch, level, logger, error_type, operation, message, count = parsed
+                    bucket_epoch = epoch - epoch % BUCKET_SECONDS
+                    bucket = buckets.get(bucket_epoch)
+                    if bucket is None:
+                        bucket = buckets[bucket_epoch] = [pos, end + 1, Counter()]
+                    else:
+                        bucket[0] = min(bucket[0], pos)
+                        bucket[1] = max(bucket[1], end + 1)
+                    bucket[2][self._key_id((level, logger, error_type, operation, template_of(message)))] += count
+                    self.records += 1
+                pos = end + 1
+        self.offset = pos
+        self.save()
+        return pos - start
+
+    def matching_keys(self, filters):
+        return {i for i, key in enumerate(self.keys) if key_matches(key, filters)}
+
+    def newest(self):
+        return max(self.buckets) + BUCKET_SECONDS if self.buckets else None
+
+
+def key_matches(key, filters):
+    for dimension, wanted in filters.items():
+        value = key[DIMENSIONS.index(dimension)]
+        if dimension == 'template':
+            if wanted.lower() not in value.lower():
+                return False
+        elif value.lower() != wanted.lower():
+            return False
+    return True
+
+
+def parse_duration(value):
+    units = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+    if value and value[-1] in units and value[:-1].isdigit():
+        return int(value[:-1]) * units[value[-1]]
+    raise argparse.ArgumentTypeError(f"expected a duration like 30m, 1h or 2d, got {value!r}")
+
+
+def parse_time(value, newest):
+    """'1h' counts back from ``newest``; otherwise an ISO time in UTC"""
+    if value is None:
+        return None
+    try:
+        return newest - parse_duration(value)
+    except argparse.ArgumentTypeError:
+        pass
+    value = value.rstrip('Z').replace(' ', 'T')
+    for fmt in ('%Y-%m-%dT%H:%M:%S', '%Y-%m-%dT%H:%M', '%Y-%m-%d'):
+        try:
+            return calendar.timegm(time.strptime(value, fmt))
+        except ValueError:
+            continue
+    raise SystemExit(f"Invalid time: {value}")
+
+
+def format_epoch(epoch):
+    return time.strftime('%Y-%m-%d %H:%M', time.gmtime(epoch))
+
+
+def open_indexes(paths, quiet=False):
+    indexes = []
+    for path in paths:
+        index = LogIndex(path)
+        started = time.perf_counter()
+        read = index.update()
+        if not quiet and read:
+            print(f"Indexed {read} new bytes of {path} in {(time.perf_counter() - started) * 1000:.0f} ms",
+                  file=sys.stderr)
+        indexes.append(index)
+    return indexes
+
+
+def time_range(indexes, args):
+    newest = max((index.newest() for index in indexes if index.buckets), default=0)
+    return parse_time(args.since, newest), parse_time(args.until, newest)
+
+
+def filters_from(args):
+    filters = {}
+    for dimension in ('level', 'logger', 'error_type', 'operation'):
+        value = getattr(args, dimension)
+        if value:
+            filters[dimension] = normalize_level(value) if dimension == 'level' else value
+    if args.message:
+        filters['template'] = args.message
+    return filters
+
+
+def cmd_index(args):
+    for index in open_indexes(args.files, quiet=True):
+        first = format_epoch(min(index.buckets)) if index.buckets else '-'
+        last = format_epoch(max(index.buckets)) if index.buckets else '-'
+        print(f"{index.path}: {index.records} records, {len(index.keys)} keys, "
+              f"{first} .. {last}, checkpoint at byte {index.offset}")
+
+
+def cmd_query(args):
+    indexes = open_indexes(args.files)
+    started = time.perf_counter()
+    since, until = time_range(indexes, args)
+    filters = filters_from(args)
+    step = args.bucket
+    series = defaultdict(Counter)
+    totals = Counter()
+    for index in indexes:
+        wanted = index.matching_keys(filters)
+        if not wanted:
+            continue
+        group_position = DIMENSIONS.index(args.group_by) if args.group_by else None
+        for epoch, (_, _, counts) in index.buckets.items():
+            if (since is not None and epoch + BUCKET_SECONDS <= since) or (until is not None and epoch >= until):
+                continue
+            row = series[epoch - epoch % step]
+            for key_id, count in counts.items():
+                if key_id in wanted:
+                    group = index.keys[key_id][group_position] if group_position is not None else 'count'
+                    row[group] += count
+                    totals[group] += count
+    elapsed = (time.perf_counter() - started) * 1000
+
+    groups = [group for group, _ in totals.most_common(args.top)]
+    if args.json:
+        print(json.dumps({
+            'filters': filters,
+            'bucket_seconds': step,
+            'totals': dict(totals),
+            'series': [{'time': format_epoch(epoch), **{g: series[epoch][g] for g in groups}}
+                       for epoch in sorted(series) if any(series[epoch][g] for g in groups)],
+        }, indent=2))
+        return
+    width = max([len(str(group)) for group in groups] + [5])
+    print(f"{'time (UTC)':<16}  " + '  '.join(f"{str(group) or '-':>{width}}" for group in groups))
+    for epoch in sorted(series):
+        row = series[epoch]
+        if any(row[group] for group in groups):
+            print(f"{format_epoch(epoch):<16}  " + '  '.join(f"{row[group]:>{width}}" for group in groups))
+    print(f"{'total':<16}  " + '  '.join(f"{totals[group]:>{width}}" for group in groups))
+    print(f"Answered from the index in {elapsed:.1f} ms", file=sys.stderr)
+
+
+def cmd_lines(args):
+    """Print the raw lines of matching records, reading only the byte ranges of matching minutes"""
+    indexes = open_indexes(args.files)
+    since, until = time_range(indexes, args)
+    filters = filters_from(args)
+    printed = 0
+    for index in indexes:
+        wanted = index.matching_keys(filters)
+        ranges = sorted(
+            (first, end) for epoch, (first, end, counts) in index.buckets.items()
+            if (since is None or epoch + BUCKET_SECONDS > since) and (until is None or epoch < until)
+            and any(key_id in wanted for key_id in counts)
+        )
+        if not ranges:
+            continue
+        with open(index.path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            pos = 0
+            for first, end in ranges:
+                pos = max(pos, first)
+                while pos < end:
+                    line_end = mm.find(b'\n', pos)
+                    line = mm[pos:line_end]
+                    pos = line_end + 1
+                    parsed = parse_line(line.rstrip(b'\r'))
+                    if parsed is None:
+                        continue
+                    epoch, level, logger, error_type, operation, message, _ = parsed
+                    if (since is not None and epoch < since) or (until is not None and epoch >= until):
+                        continue
+                    if key_matches((level, logger, error_type, operation, template_of(message)), filters):
+                        print(line.decode('utf-8', 'replace'))
+                        printed += 1
+                        if args.limit and printed >= args.limit:
+                            return
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    index = commands.add_parser('index', help='Build or update indexes and print a summary')
+    index.add_argument('files', nargs='+')
+
+    for name, helptext in (('query', 'Counts per time bucket from the index'),
+                           ('lines', 'Raw lines of matching records')):
+        command = commands.add_parser(name, help=helptext)
+        command.add_argument('files', nargs='+')
+        command.add_argument('--level', help='e.g. ERROR, WARNING, INFO')
+        command.add_argument('--logger')
+        command.add_argument('--error-type', dest='error_type', help='e.g. database_connection')
+        command.add_argument('--operation', help='e.g. get_book')
+        command.add_argument('--message', help='Substring of the message template')
+        command.add_argument('--since', help='Duration back from the newest record (1h) or UTC time')
+        command.add_argument('--until', help='Duration back from the newest record or UTC time')
+        if name == 'query':
+            command.add_argument('--bucket', type=parse_duration, default=60, help='Bucket size, e.g. 1m, 5m, 1h')
+            command.add_argument('--group-by', choices=DIMENSIONS)
+            command.add_argument('--top', type=int, default=8, help='Groups shown with --group-by')
+            command.add_argument('--json', action='store_true')
+        else:
+            command.add_argument('--limit', type=int, default=0)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if getattr(args, 'bucket', BUCKET_SECONDS) % BUCKET_SECONDS:
+        raise SystemExit(f"--bucket must be a multiple of {BUCKET_SECONDS}s")
+    {'index': cmd_index, 'query': cmd_query, 'lines': cmd_lines}[args.command](args)
+
+
+if __name__ == '__main__':
+    main()
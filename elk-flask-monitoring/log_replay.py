@@ -0,0 +1,456 @@
+#!/usr/bin/env python3
+"""
+Replay the request mix recorded in app.log against a Flask app
+
+The app logs one record per request ("Book fetched: ID=7, Title=...",
+"Slow endpoint accessed, slept for 2.1 seconds", "Get book failed: Invalid
+book ID: abc", ...). This tool streams one or more log files (plain or
+.gz rotated backups, ECS JSON or Flask text format) and turns each record
+back into the request that produced it. That includes the method, path,
+body and the status the app answered with. The requests are then sent again
+with their original spacing, at ``--speed`` times the original rate, or as
+fast as ``--concurrency`` connections allow (``--speed max``).
+
+Reconstruction details:
+- Timestamps are read to the millisecond. /slow requests are moved back by
+  the sleep they logged, since the record is written when they finish.
+- A sampled INFO record (``log.count`` N, see INFO_SAMPLE_RATES) stands for
+  itself and the N-1 requests after it. Those are spread evenly until the
+  next kept record of that kind, reusing ids and titles seen recently. A
+  "(repeated N times)" summary is spread over the time since the previous
+  record with the same message. Text-format logs carry no count, so their
+  sampled routes replay at the sampled rate.
+- Titles get a per-run suffix, so added books are new in the target and
+  duplicates in the log are duplicates again. Book ids are sent as logged,
+  so replay against a copy of the source database to get the same hits.
+- Records that can't be traced to a request (startup, toggles) are skipped
+  and summarized at the end.
+
+Latency is measured from when each request was due, as in load_engine.py,
+so a target that falls behind shows it in the percentiles.
+
+Usage:
+    python log_replay.py flask8521-app/logs/app.log --dry-run
+    python log_replay.py app.log.2.gz app.log.1.gz app.log --speed 5 --concurrency 64
+    python log_replay.py app.log --speed max --concurrency 32 --url http://localhost:5000
+    python log_replay.py app.log --speed 10 --stand-in
+"""
+
+import argparse
+import asyncio
+import gzip
+import heapq
+import json
+import random
+import re
+import sys
+import time
+from collections import Counter, deque, namedtuple
+from urllib.parse import quote
+
+from load_engine import FLASK_URL, HttpClient, LoadReport, StandInServer
+from log_analyzer import parse_line, template_of
+
+ReplayRequest = namedtuple('ReplayRequest', 'at name method path body expected')
+
+MILLIS = re.compile(rb'^\d{4}-\d\d-\d\d[ T]\d\d:\d\d:\d\d[,.](\d{3})|"@timestamp": ?"[^"]{19}\.(\d{3})')
+REPEATED = re.compile(rb' \(repeated \d+ times\)')
+# Flask logs these next to the route's own record; replaying them would count the request twice
+SKIPPED = re.compile(r'Exception on \S+ \[\w+\]')
+# How far out of order worker processes' lines can be; the reorder buffer holds this much
+REORDER_WINDOW = 15.0
+# LOG_DEDUP_WINDOW: a summary with no earlier record of its message covers this much time
+DEDUP_WINDOW = 10.0
+# A sampled record's group closes at the next kept record of its kind, or after this long
+SAMPLE_WINDOW = 60.0
+RECENT = 200
+
+
+class LogReconstructor:
+    """
+    Turns app.log records into the requests that produced them, in time order.
+
+    ``requests(lines)`` is a generator, so arbitrarily long logs are replayed
+    with memory bounded by what is logged in ``REORDER_WINDOW`` (or
+    ``SAMPLE_WINDOW`` for sampled routes) seconds.
+    """
+
+    def __init__(self, run_id=None, seed=None):
+        self.run_id = run_id if run_id is not None else int(time.time())
+        self.random = random.Random(seed)
+        self.skipped = Counter()
+        self.records = 0
+        self._titles = {}
+        self._recent_ids = deque(maxlen=RECENT)
+        self._recent_titles = deque(maxlen=RECENT)
+        self._generated = 0
+        self._last_seen = {}
+        self._groups = {}
+        self._heap = []
+        self._order = 0
+        self._emitted = None
+        self.rules = [
+            (re.compile(r'Home endpoint accessed$'), lambda m: ('home', 'GET', '/', None, 200)),
+            (re.compile(r'Success endpoint accessed$'), lambda m: ('success', 'GET', '/success', None, 200)),
+            (re.compile(r"Bad request: missing 'value'"),
+             lambda m: ('bad_request', 'POST', '/bad-request', {}, 400)),
+            (re.compile(r'Bad request endpoint accessed$'),
+             lambda m: ('bad_request', 'POST', '/bad-request', {"value": 1}, 200)),
+            (re.compile(r'Error endpoint accessed$'), lambda m: ('error', 'GET', '/error', None, 500)),
+            (re.compile(r'Slow endpoint accessed, slept for ([\d.]+) seconds'),
+             lambda m: ('slow', 'GET', '/slow', None, 200)),
+            (re.compile(r'Generated test error for alerting$'),
+             lambda m: ('generate_error', 'GET', '/generate-error', None, 500)),
+            (re.compile(r'Random endpoint failed$'), lambda m: ('random', 'GET', '/random', None, 500)),
+            (re.compile(r'Random endpoint succeeded$'), lambda m: ('random', 'GET', '/random', None, 200)),
+            (re.compile(r'Book added: ID=(\d+), Title=(.*)$'),
+             lambda m: self._add_book(m.group(2), 201)),
+            (re.compile(r"Add book failed: Book with title '(.*)' already registered$"),
+             lambda m: self._add_book(m.group(1), 409)),
+            (re.compile(r'Invalid book data: missing title or author'),
+             lambda m: ('add_book', 'POST', '/books', {}, 400)),
+            (re.compile(r'(?:MySQL|Unexpected) error adding book'),
+             lambda m: self._add_book(None, 500)),
+            (re.compile(r'Book fetched: ID=(\d+), Title=(.*)$'), lambda m: self._get_book(m.group(1), 200)),
+            (re.compile(r'Get book failed: Book with ID (\S+) not found$'),
+             lambda m: self._get_book(m.group(1), 404)),
+            (re.compile(r'Get book failed: Invalid book ID: (.*)$'), lambda m: self._get_book(m.group(1), 400)),
+            (re.compile(r'(?:MySQL|Unexpected) error fetching book'), lambda m: self._get_book(None, 500)),
+            (re.compile(r'Bulk books added: (\d+) created, (\d+) duplicate, (\d+) invalid'),
+             lambda m: self._bulk(*map(int, m.groups()))),
+            (re.compile(r'Invalid bulk book data'),
+             lambda m: ('bulk_add_books', 'POST', '/books/bulk', {}, 400)),
+            (re.compile(r'MySQL error bulk adding books'), lambda m: self._bulk(1, 0, 0, 500)),
+            (re.compile(r'Books listed: (\d+) books'), lambda m: self._list_books(int(m.group(1)), 200)),
+            (re.compile(r'List books failed'), lambda m: ('list_books', 'GET', '/books?limit=0', None, 400)),
+            (re.compile(r'MySQL error listing books'), lambda m: self._list_books(None, 500)),
+            (re.compile(r'Books exported: \d+ books as (\w+)'),
+             lambda m: ('export_books', 'GET', f'/books/export?format={m.group(1)}', None, 200)),
+            (re.compile(r'Export books failed: unsupported format (.*)$'),
+             lambda m: ('export_books', 'GET', f'/books/export?format={quote(m.group(1))}', None, 400)),
+            (re.compile(r'MySQL error exporting books'),
+             lambda m: ('export_books', 'GET', '/books/export', None, 500)),
+            (re.compile(r'Books searched: \d+ results'), lambda m: self._search(200)),
+            (re.compile(r'Search books failed: q must'),
+             lambda m: ('search_books', 'GET', '/books/search?q=', None, 400)),
+            (re.compile(r'Search books failed: limit'),
+             lambda m: ('search_books', 'GET', '/books/search?q=book&limit=0', None, 400)),
+            (re.compile(r'MySQL error searching books'), lambda m: self._search(500)),
+            (re.compile(r'DATABASE_CIRCUIT_OPEN: (\w+) rejected'),
+             lambda m: self._for_operation(m.group(1), 503)),
+        ]
+
+    # --- Request builders --------------------------------------------------
+
+    def _title(self, title):
+        if title is None:
+            self._generated += 1
+            return f"Replay book {self.run_id}-{self._generated}"
+        suffix = f" #{self.run_id}"
+        replayed = self._titles.get(title)
+        if replayed is None:
+            replayed = self._titles[title] = title[:255 - len(suffix)] + suffix
+            self._recent_titles.append(title)
+        return replayed
+
+    def _add_book(self, title, expected):
+        return 'add_book', 'POST', '/books', {"title": self._title(title), "author": "Replay Author"}, expected
+
+    def _get_book(self, book_id, expected):
+        if book_id is None:
+            book_id = self.random.choice(self._recent_ids) if self._recent_ids else '1'
+        elif expected == 200:
+            self._recent_ids.append(book_id)
+        return 'get_book', 'GET', f"/books/{quote(book_id, safe='')}", None, expected
+
+    def _bulk(self, created, duplicate, invalid, expected=200):
+        items = [{"title": self._title(None), "author": "Replay Author"} for _ in range(max(created, 1))]
+        items += [dict(items[0]) for _ in range(duplicate)] + [{} for _ in range(invalid)]
+        return 'bulk_add_books', 'POST', '/books/bulk', items, expected
+
+    def _list_books(self, count, expected):
+        path = f"/books?limit={count}" if count and count <= 500 else '/books'
+        return 'list_books', 'GET', path, None, expected
+
+    def _search(self, expected):
+        # Queries aren't logged; search for words of titles seen in the log
+        word = (self.random.choice(self._recent_titles).split() or ['book'])[0] if self._recent_titles else 'book'
+        return 'search_books', 'GET', f"/books/search?q={quote(word)}", None, expected
+
+    def _for_operation(self, operation, expected):
+        builders = {
+            'get_book': lambda: self._get_book(None, expected),
+            'add_book': lambda: self._add_book(None, expected),
+            'bulk_add_books': lambda: self._bulk(1, 0, 0, expected),
+            'list_books': lambda: self._list_books(None, expected),
+            'export_books': lambda: ('export_books', 'GET', '/books/export', None, expected),
+            'search_books': lambda: self._search(expected),
+        }
+        builder = builders.get(operation)
+        return builder() if builder else None
+
+    # --- Record stream -----------------------------------------------------
+
+    def build(self, message):
+        """The (name, method, path, body, expected) that logged ``message``, or None"""
+        for pattern, handler in self.rules:
+            match = pattern.match(message)
+            if match:
+                return handler(match)
+        return None
+
+    def _push(self, at, request):
+        # Clamp lines that arrive later than the reorder window allows, so replay stays in order
+        if self._emitted is not None and at < self._emitted:
+            at = self._emitted
+        self._order += 1
+        heapq.heappush(self._heap, (at, self._order, request))
+
+    def _sampled_copy(self, request):
+        # The requests a sampled record stands for weren't logged: vary ids and titles like traffic does
+        name, _, _, _, expected = request
+        if name == 'get_book' and expected == 200:
+            return self._get_book(None, expected)
+        if name == 'add_book' and expected == 201:
+            return self._add_book(None, expected)
+        return request
+
+    def _close_group(self, name, end):
+        start, count, request = self._groups.pop(name)
+        gap = max(end - start, 0.0) / count
+        for i in range(1, count):
+            self._push(start + gap * i, self._sampled_copy(request))
+
+    def _drain(self, now):
+        for name, (start, _, _) in list(self._groups.items()):
+            if now - start > SAMPLE_WINDOW:
+                self._close_group(name, now)
+        horizon = now - REORDER_WINDOW
+        if self._groups:
+            horizon = min(horizon, min(group[0] for group in self._groups.values()))
+        while self._heap and self._heap[0][0] <= horizon:
+            at, _, request = heapq.heappop(self._heap)
+            self._emitted = at
+            yield ReplayRequest(at, *request)
+
+    def requests(self, lines):
+        now = None
+        for line in lines:
+            line = line.rstrip(b'\r\n')
+            parsed = parse_line(line)
+            if parsed is None:
+                continue
+            epoch, _, _, _, _, message, count = parsed
+            millis = MILLIS.search(line)
+            at = epoch + int((millis.group(1) or millis.group(2))) / 1000 if millis else float(epoch)
+            self.records += 1
+            request = self.build(message)
+            if request is None:
+                if not SKIPPED.match(message):
+                    self.skipped[template_of(message)] += count
+                continue
+            name = request[0]
+            if name == 'slow':
+                at -= float(re.search(r'slept for ([\d.]+)', message).group(1))
+            now = at if now is None else max(now, at)
+
+            if count > 1 and REPEATED.search(line):
+                # A duplicate summary, logged at its last occurrence: spread back to the record before it
+                start = self._last_seen.get((name, message), at - DEDUP_WINDOW)
+                gap = (at - start) / count
+                for i in range(count):
+                    self._push(at - gap * i, request)
+            else:
+                if name in self._groups:
+                    self._close_group(name, at)
+                self._push(at, request)
+                if count > 1:
+                    # A sampled record: it is the first of ``count`` requests up to the next kept one
+                    self._groups[name] = (at, count, request)
+            self._last_seen[(name, message)] = at
+            yield from self._drain(now)
+
+        for name in list(self._groups):
+            start = self._groups[name][0]
+            self._close_group(name, max(now, start))
+        while self._heap:
+            at, _, request = heapq.heappop(self._heap)
+            yield ReplayRequest(at, *request)
+
+
+def read_lines(paths):
+    for path in paths:
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rb') as f:
+            yield from f
+
+
+class ReplayResult(LoadReport):
+    """LoadReport plus how well the replay kept to the original schedule and statuses"""
+
+    def __init__(self):
+        super().__init__()
+        self.status_matched = 0
+        self.status_expected = Counter()
+        self.max_lag = 0.0
+        self.span = 0.0
+
+
+async def replay(requests, base_url, speed=1.0, concurrency=64, timeout=10.0, limit=0):
+    """
+    Send ``requests`` to ``base_url``. With a ``speed``, request i is due at
+    ``(at_i - at_0) / speed`` seconds after the start, whatever is still in
+    flight; with ``speed=None`` the next one goes out as soon as fewer than
+    ``concurrency`` are in flight.
+    """
+    loop = asyncio.get_running_loop()
+    client = HttpClient(base_url, concurrency, timeout)
+    result = ReplayResult()
+    slots = asyncio.Semaphore(concurrency) if speed is None else None
+    tasks = set()
+    start = first_at = None
+
+    async def fire(request, intended):
+        try:
+            outcome = str(await client.request(request.method, request.path, request.body))
+        except asyncio.TimeoutError:
+            outcome = 'timeout'
+        except (OSError, asyncio.IncompleteReadError, ValueError, IndexError):
+            outcome = 'connection_error'
+        finally:
+            if slots is not None:
+                slots.release()
+        result.record(request.name, loop.time() - intended, outcome)
+        result.status_expected[request.name] += 1
+        if outcome == str(request.expected):
+            result.status_matched += 1
+
+    try:
+        for request in requests:
+            if first_at is None:
+                first_at, start = request.at, loop.time()
+            if speed is None:
+                await slots.acquire()
+                intended = loop.time()
+            else:
+                intended = start + (request.at - first_at) / speed
+                delay = intended - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                else:
+                    result.max_lag = max(result.max_lag, -delay)
+            task = loop.create_task(fire(request, intended))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            result.scheduled += 1
+            result.span = request.at - first_at
+            if limit and result.scheduled >= limit:
+                break
+        if tasks:
+            await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await client.close()
+    result.elapsed = loop.time() - start if start is not None else 0.0
+    return result
+
+
+def print_dry_run(reconstructor, requests, limit):
+    names = Counter()
+    expected = Counter()
+    per_second = Counter()
+    first = last = None
+    for i, request in enumerate(requests):
+        if limit and i >= limit:
+            break
+        names[request.name] += 1
+        expected[f"{request.name} {request.expected}"] += 1
+        per_second[int(request.at)] += 1
+        first = request.at if first is None else first
+        last = request.at
+    total = sum(names.values())
+    span = (last - first) if total else 0.0
+    print(f"Reconstructed {total} requests from {reconstructor.records} records over {span:.1f}s "
+          f"({total / span if span else 0:.1f} req/s average, {max(per_second.values(), default=0)} peak)")
+    print(f"{'endpoint':<16}{'count':>8}{'share':>8}  expected statuses")
+    for name, count in names.most_common():
+        statuses = ' '.join(f"{key.split()[1]}:{n}" for key, n in sorted(expected.items())
+                            if key.split()[0] == name)
+        print(f"{name:<16}{count:>8}{count / total:>8.1%}  {statuses}")
+    print_skipped(reconstructor)
+
+
+def print_skipped(reconstructor):
+    if reconstructor.skipped:
+        print(f"Skipped {sum(reconstructor.skipped.values())} records that map to no request, most common:")
+        for template, count in reconstructor.skipped.most_common(5):
+            print(f"  {count:>6}  {template}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('logs', nargs='+', help="Log files in chronological order (.gz backups first)")
+    parser.add_argument('--url', default=FLASK_URL, help="Target base URL")
+    parser.add_argument('--speed', default='1',
+                        help="Multiple of the original rate (1, 10, 0.5), or 'max' for no pacing")
+    parser.add_argument('--concurrency', type=int, default=64, help="Maximum requests in flight")
+    parser.add_argument('--timeout', type=float, default=10.0)
+    parser.add_argument('--limit', type=int, default=0, help="Stop after this many requests")
+    parser.add_argument('--seed', type=int, help="Seed for the ids and titles picked for sampled requests")
+    parser.add_argument('--dry-run', action='store_true', help="Print the reconstructed mix without sending it")
+    parser.add_argument('--output', help="Write the report as JSON to this file")
+    parser.add_argument('--stand-in', action='store_true',
+                        help="Replay against a local stand-in server instead of --url")
+    parser.add_argument('--stand-in-latency', type=float, default=0.005)
+    return parser
+
+
+async def _main(args, speed):
+    reconstructor = LogReconstructor(seed=args.seed)
+    requests = reconstructor.requests(read_lines(args.logs))
+    if args.dry_run:
+        print_dry_run(reconstructor, requests, args.limit)
+        return
+    stand_in = None
+    if args.stand_in:
+        stand_in = await StandInServer(latency=args.stand_in_latency).start()
+        args.url = stand_in.url
+        print(f"Stand-in server listening on {args.url}")
+    pacing = 'max speed' if speed is None else f"{speed:g}x speed"
+    print(f"Replaying {', '.join(args.logs)} against {args.url} at {pacing}, "
+          f"{args.concurrency} connections")
+    try:
+        result = await replay(requests, args.url, speed, args.concurrency, args.timeout, args.limit)
+    finally:
+        if stand_in:
+            await stand_in.stop()
+    result.print(f"REPLAY of {result.span:.1f}s of logged traffic at {pacing}")
+    completed = sum(result.status_expected.values())
+    if completed:
+        print(f"Status matched the log for {result.status_matched}/{completed} requests "
+              f"({result.status_matched / completed:.1%})")
+    if speed is not None:
+        print(f"Dispatch fell behind schedule by at most {result.max_lag * 1000:.1f} ms")
+    print_skipped(reconstructor)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(dict(result.to_dict(), speed=args.speed, status_matched=result.status_matched,
+                           max_lag=result.max_lag, span=result.span), f, indent=2)
+        print(f"Report written to {args.output}")
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    speed = None if args.speed == 'max' else float(args.speed)
+    if speed is not None and speed <= 0:
+        raise SystemExit("--speed must be positive or 'max'")
+    try:
+        asyncio.run(_main(args, speed))
+    except KeyboardInterrupt:
+        print("\nReplay cancelled by user")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,829 @@
+#!/usr/bin/env python3
+"""
+Log shipper for app.log: tail or backfill into Elasticsearch's _bulk API
+
+Records are parsed and enriched the way elk-config/filebeat/filebeat.yml
+does (NDJSON keys at the root, service.name/service.environment, the legacy
+text pipeline's error.type/alert.severity/operation extraction) and written
+to the daily ``flask-app-logs-YYYY.MM.dd`` index.
+
+Bulk requests are gzip-compressed and closed by size (``--bulk-max-bytes``),
+count (``--bulk-max-docs``) or age (``--flush-interval``). At most
+``--max-in-flight`` requests are outstanding; when they are all busy the
+reader stops reading, so a slow cluster slows the shipper down instead of
+growing memory. 429s and 5xx responses (whole requests or single items) are
+retried with exponential backoff.
+
+Read offsets are kept in a registry file and only advance once every batch
+up to that offset was acknowledged, so a restart resumes without loss. The
+registry tracks files by inode: after a rotation the renamed file is read to
+the end before the new one is opened.
+
+Usage:
+    python log_shipper.py tail /var/log/flask/app.log --url http://localhost:9200 --user elastic --password changeme
+    python log_shipper.py backfill logs kibanalogs.txt --workers 4 --url http://localhost:9200 ...
+    python log_shipper.py backfill logs --stand-in --stand-in-reject-rate 0.2   # local _bulk stand-in
+"""
+
+import argparse
+import base64
+import gzip
+import http.client
+import json
+import os
+import random
+import re
+import signal
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'flask8521-app'))
+from log_format import ALERT_SEVERITY, ERROR_TAGS  # noqa: E402
+
+INDEX_PREFIX = 'flask-app-logs-'
+# Defaults for records that don't carry them; the app's JSON records set both
+FIELDS = {'service.name': 'flask-app', 'service.environment': 'development'}
+# Operation extraction from the legacy text pipeline's script processor
+OPERATIONS = (
+    ('Failed to add book', 'add_book'),
+    ('Failed to retrieve book', 'get_book'),
+    ('Failed to list books', 'list_books'),
+)
+MULTILINE_START = re.compile(rb'\d{4}-\d{2}-\d{2}')
+TEXT_RECORD = re.compile(r'(\d{4}-\d\d-\d\d) (\d\d:\d\d:\d\d),(\d{3}) (\w+): (.*)', re.S)
+READ_SIZE = 1 << 20
+RETRYABLE_STATUSES = (429, 502, 503, 504)
+
+
+class Enricher:
+    """
+    Turn one raw record into an Elasticsearch document.
+
+    ``json`` mirrors the default input: keys under root, with
+    ``error.message``/``error.type: json`` on lines that are not JSON.
+    ``text`` mirrors the legacy input for LOG_FORMAT=text: multiline records
+    split into timestamp, level and message, with the error tags mapped to
+    error.type and alert.severity. Either way, service.name and
+    service.environment are filled in when the record has none.
+    """
+
+    def __init__(self, fmt='json', fields=None):
+        self.fmt = fmt
+        self.fields = dict(FIELDS if fields is None else fields)
+        self.host = {'name': socket.gethostname()}
+        self._encode = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+
+    def document(self, raw, path, offset):
+        text = raw.decode('utf-8', 'replace')
+        doc = {}
+        if self.fmt == 'json':
+            try:
+                decoded = json.loads(text)
+                if not isinstance(decoded, dict):
+                    raise ValueError('not an object')
+                doc.update(decoded)
+            except ValueError as e:
+                doc['message'] = text
+                doc['error.message'] = f"Error decoding JSON: {e}"
+                doc['error.type'] = 'json'
+        else:
+            self._parse_text(text, doc)
+        for name, value in self.fields.items():
+            doc.setdefault(name, value)
+        doc.setdefault('@timestamp', time.strftime('%Y-%m-%dT%H:%M:%S.000Z', time.gmtime()))
+        doc['log.file.path'] = path
+        doc['log.offset'] = offset
+        doc['host'] = self.host
+        doc['agent'] = {'type': 'log-shipper'}
+        return doc
+
+    def _parse_text(self, text, doc):
+        doc['message'] = text
+        match = TEXT_RECORD.match(text)
+        if match is None:
+            return
+        day, clock, millis, level, message = match.groups()
+        doc['@timestamp'] = f"{day}T{clock}.{millis}Z"
+        doc['log.timestamp'] = f"{day} {clock},{millis}"
+        doc['log.level'] = level.lower()
+        doc['log.message'] = message
+        for tag, error_type in ERROR_TAGS.items():
+            if tag in message:
+                doc['error.type'] = error_type
+                doc['alert.severity'] = ALERT_SEVERITY[error_type]
+                break
+        for needle, operation in OPERATIONS:
+            if needle in message:
+                doc['operation'] = operation
+                break
+
+    def action(self, raw, path, offset):
+        """The two _bulk lines (action and source) for one record"""
+        doc = self.document(raw, path, offset)
+        stamp = str(doc['@timestamp'])
+        index = INDEX_PREFIX + stamp[:10].replace('-', '.')
+        return f'{{"index":{{"_index":"{index}"}}}}\n{self._encode(doc)}\n'.encode()
+
+
+class RecordSplitter:
+    """
+    Split a byte stream into records, tracking the file offset after each.
+
+    With ``multiline`` a record runs from a line starting with a date to the
+    next such line, like the legacy input's multiline settings; the last
+    record is held back until the next one starts or ``flush()`` is called.
+    """
+
+    def __init__(self, offset=0, multiline=False):
+        self.offset = offset
+        self.multiline = multiline
+        self._buffer = b''
+        self._pending = None
+
+    def feed(self, data):
+        buffer = self._buffer + data if self._buffer else data
+        records = []
+        start = 0
+        while True:
+            newline = buffer.find(b'\n', start)
+            if newline == -1:
+                break
+            line_offset = self.offset + start
+            line = buffer[start:newline + 1]
+            start = newline + 1
+            if not self.multiline:
+                if line.strip():
+                    records.append((line.rstrip(b'\r\n'), line_offset, self.offset + start))
+            elif self._pending is None or MULTILINE_START.match(line):
+                if self._pending is not None:
+                    records.append((self._pending[1].rstrip(b'\r\n'), self._pending[0], line_offset))
+                self._pending = (line_offset, line)
+            else:
+                self._pending = (self._pending[0], self._pending[1] + line)
+        self._buffer = buffer[start:]
+        self.offset += start
+        return records
+
+    def flush(self, partial=False):
+        """Return the held-back multiline record, and with ``partial`` an unterminated last line"""
+        records = self.feed(b'\n') if partial and self._buffer else []
+        if self._pending is None:
+            return records
+        start, data = self._pending
+        self._pending = None
+        return records + ([(data.rstrip(b'\r\n'), start, self.offset)] if data.strip() else [])
+
+    @property
+    def pending(self):
+        return self._pending is not None
+
+
+class Batch:
+    def __init__(self, source, seq):
+        self.source = source
+        self.seq = seq
+        self.actions = []
+        self.size = 0
+        self.end_offset = None
+        self.created = time.monotonic()
+
+    def add(self, action, end_offset):
+        self.actions.append(action)
+        self.size += len(action)
+        self.end_offset = end_offset
+
+
+class BulkSender:
+    """
+    Send batches to ``<url>/_bulk`` from ``max_in_flight`` worker threads.
+
+    ``submit`` blocks while ``max_in_flight`` batches are outstanding. Whole
+    requests answered with 429/5xx and single items rejected with 429 are
+    retried with exponential backoff and jitter, forever unless
+    ``max_retries`` is set. Other item errors are counted and dropped, like
+    Filebeat does. ``on_done(batch)`` is called once a batch is settled.
+    """
+
+    def __init__(self, url, user=None, password=None, max_in_flight=4, max_retries=0,
+                 backoff_base=0.5, backoff_max=30.0, timeout=30.0, on_done=None):
+        parts = urlsplit(url)
+        self.scheme = parts.scheme or 'http'
+        self.host = parts.hostname
+        self.port = parts.port or (443 if self.scheme == 'https' else 9200)
+        self.path = parts.path.rstrip('/') + '/_bulk'
+        self.headers = {'Content-Type': 'application/x-ndjson', 'Content-Encoding': 'gzip'}
+        if user:
+            token = base64.b64encode(f"{user}:{password or ''}".encode()).decode()
+            self.headers['Authorization'] = f"Basic {token}"
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.on_done = on_done
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._queue = []
+        self._cond = threading.Condition()
+        self._closed = False
+        self._lock = threading.Lock()
+        self._counters = {'requests': 0, 'docs': 0, 'raw_bytes': 0, 'gzip_bytes': 0,
+                          'retries': 0, 'throttled': 0, 'dropped': 0, 'in_flight_waits': 0}
+        self._threads = [threading.Thread(target=self._worker, daemon=True) for _ in range(max_in_flight)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, batch):
+        if not self._slots.acquire(blocking=False):
+            self._count('in_flight_waits')
+            self._slots.acquire()
+        with self._cond:
+            self._queue.append(batch)
+            self._cond.notify()
+
+    def close(self):
+        """Wait for queued and in-flight batches, then stop the workers"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join()
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self._counters[name] += n
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters)
+
+    def _worker(self):
+        conn = None
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue:
+                    break
+                batch = self._queue.pop(0)
+            try:
+                conn = self._send(batch, conn)
+            finally:
+                self._slots.release()
+            if self.on_done:
+                self.on_done(batch)
+        if conn is not None:
+            conn.close()
+
+    def _connect(self):
+        cls = http.client.HTTPSConnection if self.scheme == 'https' else http.client.HTTPConnection
+        return cls(self.host, self.port, timeout=self.timeout)
+
+    def _post(self, conn, body):
+        conn.request('POST', self.path, body=body, headers=self.headers)
+        response = conn.getresponse()
+        return response.status, response.read()
+
+    def _backoff(self, attempt):
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        time.sleep(delay * random.uniform(0.5, 1.0))
+
+    def _send(self, batch, conn):
+        actions = batch.actions
+        attempt = 0
+        while actions:
+            raw = b''.join(actions)
+            body = gzip.compress(raw, compresslevel=1)
+            if conn is None:
+                conn = self._connect()
+            try:
+                status, payload = self._post(conn, body)
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                conn = None
+                status, payload = None, b''
+            self._count('requests')
+
+            if status == 200:
+                self._count('raw_bytes', len(raw))
+                self._count('gzip_bytes', len(body))
+                result = json.loads(payload)
+                if not result.get('errors'):
+                    self._count('docs', len(actions))
+                    return conn
+                retry = []
+                for action, item in zip(actions, result['items']):
+                    item_status = next(iter(item.values())).get('status', 500)
+                    if item_status < 300:
+                        self._count('docs')
+                    elif item_status in RETRYABLE_STATUSES:
+                        retry.append(action)
+                    else:
+                        self._count('dropped')
+                if retry:
+                    self._count('throttled')
+                actions = retry
+            elif status is None or status in RETRYABLE_STATUSES:
+                if status == 429:
+                    self._count('throttled')
+            else:
+                print(f"_bulk request rejected with {status}, dropping {len(actions)} docs: {payload[:200]!r}",
+                      file=sys.stderr)
+                self._count('dropped', len(actions))
+                return conn
+
+            if actions:
+                attempt += 1
+                if self.max_retries and attempt > self.max_retries:
+                    self._count('dropped', len(actions))
+                    return conn
+                self._count('retries')
+                self._backoff(attempt - 1)
+        return conn
+
+
+class Registry:
+    """
+    Durable read offsets, one entry per tracked file, keyed by path and
+    remembering the inode so a rotated file can be found again. Saved
+    atomically (write, fsync, rename).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path) as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def get(self, key):
+        with self._lock:
+            return dict(self.entries.get(key) or {})
+
+    def set(self, key, **values):
+        with self._lock:
+            self.entries.setdefault(key, {}).update(values)
+
+    def save(self):
+        with self._lock:
+            data = json.dumps(self.entries, indent=2, sort_keys=True)
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+
+class AckTracker:
+    """Highest offset below which every submitted batch of a source is settled"""
+
+    def __init__(self, offset):
+        self.committed = offset
+        self._ends = {}
+        self._done = set()
+        self._next_seq = 0
+        self._commit_seq = 0
+        self._lock = threading.Lock()
+
+    def register(self, batch_end):
+        with self._lock:
+            seq = self._next_seq
+            self._next_seq += 1
+            self._ends[seq] = batch_end
+            return seq
+
+    def done(self, seq):
+        with self._lock:
+            self._done.add(seq)
+            while self._commit_seq in self._done:
+                self._done.discard(self._commit_seq)
+                self.committed = self._ends.pop(self._commit_seq)
+                self._commit_seq += 1
+            return self.committed
+
+    def idle(self):
+        with self._lock:
+            return self._commit_seq == self._next_seq
+
+
+class Pipeline:
+    """Batches records from one source and submits them to a BulkSender"""
+
+    def __init__(self, sender, enricher, source, path, tracker, max_bytes, max_docs):
+        self.sender = sender
+        self.enricher = enricher
+        self.source = source
+        self.path = path
+        self.tracker = tracker
+        self.max_bytes = max_bytes
+        self.max_docs = max_docs
+        self.records = 0
+        self._batch = None
+
+    def add(self, raw, start, end):
+        action = self.enricher.action(raw, self.path, start)
+        if self._batch is not None and self._batch.size + len(action) > self.max_bytes:
+            self.flush()
+        if self._batch is None:
+            self._batch = Batch(self.source, None)
+        self._batch.add(action, end)
+        self.records += 1
+        if len(self._batch.actions) >= self.max_docs:
+            self.flush()
+
+    def flush(self, max_age=None):
+        batch = self._batch
+        if batch is None or (max_age is not None and time.monotonic() - batch.created < max_age):
+            return
+        self._batch = None
+        batch.seq = self.tracker.register(batch.end_offset)
+        self.sender.submit(batch)
+
+
+def file_identity(stat):
+    return {'inode': stat.st_ino, 'device': stat.st_dev}
+
+
+def find_by_inode(directory, identity):
+    """Path of the file in ``directory`` with the given inode (a rotated file), if any"""
+    try:
+        for entry in os.scandir(directory):
+            stat = entry.stat(follow_symlinks=False)
+            if stat.st_ino == identity.get('inode') and stat.st_dev == identity.get('device'):
+                return entry.path
+    except OSError:
+        pass
+    return None
+
+
+class Tailer:
+    """
+    Follow one log path across rotations and ship every record.
+
+    The registry entry for the path holds the inode and committed offset of
+    the file being read. On start, if the path now holds a different file,
+    the old one is looked up by inode in the same directory (e.g. renamed to
+    app.log.1) and finished first.
+    """
+
+    def __init__(self, path, sender_options, registry, enricher, max_bytes, max_docs,
+                 flush_interval=1.0, poll_interval=0.25, multiline_timeout=5.0):
+        self.path = os.path.abspath(path)
+        self.sender_options = sender_options
+        self.registry = registry
+        self.enricher = enricher
+        self.max_bytes = max_bytes
+        self.max_docs = max_docs
+        self.flush_interval = flush_interval
+        self.poll_interval = poll_interval
+        self.multiline_timeout = multiline_timeout
+        self.stopping = threading.Event()
+        self._trackers = {}
+        self._dirty = threading.Event()
+        self.sender = BulkSender(on_done=self._settled, **sender_options)
+
+    def _settled(self, batch):
+        tracker, identity = self._trackers[batch.source]
+        offset = tracker.done(batch.seq)
+        self.registry.set(self.path, offset=offset, **identity)
+        self._dirty.set()
+
+    def _open(self):
+        entry = self.registry.get(self.path)
+        while not self.stopping.is_set():
+            try:
+                f = open(self.path, 'rb')
+                break
+            except FileNotFoundError:
+                self.stopping.wait(self.poll_interval)
+        else:
+            return None, None, None
+        identity = file_identity(os.fstat(f.fileno()))
+        offset = 0
+        if entry and entry.get('inode') == identity['inode'] and entry.get('device') == identity['device']:
+            offset = entry.get('offset', 0)
+            if offset > os.fstat(f.fileno()).st_size:
+                offset = 0  # truncated in place
+        elif entry:
+            rotated = find_by_inode(os.path.dirname(self.path), entry)
+            if rotated:
+                f.close()
+                f = open(rotated, 'rb')
+                identity = file_identity(os.fstat(f.fileno()))
+                offset = entry.get('offset', 0)
+                print(f"Finishing rotated file {rotated} from offset {offset}", file=sys.stderr)
+        f.seek(offset)
+        return f, identity, offset
+
+    def run(self):
+        opened = self._open()
+        if opened[0] is None:
+            return
+        f, identity, offset = opened
+        self._last_save = time.monotonic()
+        while not self.stopping.is_set():
+            pipeline = self._start_source(identity, offset)
+            splitter = RecordSplitter(offset, multiline=self.enricher.fmt == 'text')
+            last_data = time.monotonic()
+            while True:
+                data = f.read(READ_SIZE)
+                self._save_registry()
+                if data:
+                    for record in splitter.feed(data):
+                        pipeline.add(*record)
+                    last_data = time.monotonic()
+                    continue
+                if splitter.pending and time.monotonic() - last_data >= self.multiline_timeout:
+                    for record in splitter.flush():
+                        pipeline.add(*record)
+                pipeline.flush(max_age=self.flush_interval)
+                if self.stopping.is_set() or self._rotated(identity):
+                    break
+                self.stopping.wait(self.poll_interval)
+
+            for record in splitter.flush():
+                pipeline.add(*record)
+            pipeline.flush()
+            f.close()
+            if self.stopping.is_set():
+                break
+            # Settle the old file before its registry entry is replaced
+            while not pipeline.tracker.idle():
+                time.sleep(self.poll_interval)
+            print(f"{self.path} was rotated, following the new file", file=sys.stderr)
+            f = None
+            while f is None and not self.stopping.is_set():
+                try:
+                    f = open(self.path, 'rb')
+                except FileNotFoundError:
+                    self.stopping.wait(self.poll_interval)
+            if f is None:
+                break
+            identity = file_identity(os.fstat(f.fileno()))
+            offset = 0
+        self.sender.close()
+        self.registry.save()
+
+    def _save_registry(self, interval=1.0):
+        now = time.monotonic()
+        if self._dirty.is_set() and now - self._last_save >= interval:
+            self._dirty.clear()
+            self.registry.save()
+            self._last_save = now
+
+    def _start_source(self, identity, offset):
+        source = (identity['device'], identity['inode'])
+        self._trackers[source] = (AckTracker(offset), identity)
+        return Pipeline(self.sender, self.enricher, source, self.path,
+                        self._trackers[source][0], self.max_bytes, self.max_docs)
+
+    def _rotated(self, identity):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        return stat.st_ino != identity['inode'] or stat.st_dev != identity['device']
+
+
+def split_ranges(path, chunk_size, multiline):
+    """Byte ranges of about ``chunk_size`` that start on record boundaries"""
+    size = os.path.getsize(path)
+    ranges = []
+    start = 0
+    with open(path, 'rb') as f:
+        while start < size:
+            end = min(size, start + chunk_size)
+            if end < size:
+                f.seek(end)
+                f.readline()
+                while multiline:
+                    line_start = f.tell()
+                    line = f.readline()
+                    if not line or MULTILINE_START.match(line):
+                        f.seek(line_start)
+                        break
+                end = f.tell()
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def ship_range(path, start, end, fmt, sender_options, max_bytes, max_docs):
+    """Backfill worker: ship records in [start, end) of ``path``; returns sender stats"""
+    enricher = Enricher(fmt)
+    sender = BulkSender(**sender_options)
+    pipeline = Pipeline(sender, enricher, path, os.path.abspath(path), AckTracker(start), max_bytes, max_docs)
+    splitter = RecordSplitter(start, multiline=fmt == 'text')
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            data = f.read(min(READ_SIZE, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            for record in splitter.feed(data):
+                pipeline.add(*record)
+    for record in splitter.flush(partial=True):
+        pipeline.add(*record)
+    pipeline.flush()
+    sender.close()
+    return dict(sender.stats(), records=pipeline.records)
+
+
+def backfill(paths, args, sender_options, registry):
+    """Ship whole files in parallel chunks; finished chunks are recorded and skipped on rerun"""
+    jobs = []
+    chunks = 0
+    for path in paths:
+        key = f"backfill:{os.path.abspath(path)}"
+        stat = os.stat(path)
+        entry = registry.get(key)
+        if entry.get('inode') != stat.st_ino or entry.get('size') != stat.st_size:
+            entry = {'inode': stat.st_ino, 'size': stat.st_size, 'done': []}
+            registry.set(key, **entry)
+        done = {tuple(r) for r in entry['done']}
+        for chunk in split_ranges(path, args.chunk_size, args.format == 'text'):
+            chunks += 1
+            if chunk not in done:
+                jobs.append((key, path, chunk))
+
+    totals = {}
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = {
+            pool.submit(ship_range, path, chunk[0], chunk[1], args.format, sender_options,
+                        args.bulk_max_bytes, args.bulk_max_docs): (key, chunk)
+            for key, path, chunk in jobs
+        }
+        for future in as_completed(futures):
+            key, chunk = futures[future]
+            stats = future.result()
+            for name, value in stats.items():
+                totals[name] = totals.get(name, 0) + value
+            entry = registry.get(key)
+            registry.set(key, done=sorted(entry['done'] + [list(chunk)]))
+            registry.save()
+    elapsed = time.perf_counter() - started
+    print(f"Backfilled {totals.get('records', 0)} records from {len(jobs)} chunks "
+          f"({chunks - len(jobs)} already done) in {elapsed:.2f}s")
+    return totals
+
+
+class StandInBulkServer:
+    """
+    Local stand-in for Elasticsearch's _bulk endpoint.
+
+    Accepts gzip or plain NDJSON and counts documents per index. With
+    ``reject_rate`` whole requests are answered with 429; with
+    ``item_reject_rate`` single items are rejected with 429 inside a 200.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, reject_rate=0.0, item_reject_rate=0.0, latency=0.0):
+        stand_in = self
+        self.reject_rate = reject_rate
+        self.item_reject_rate = item_reject_rate
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.indices = {}
+        self.requests = 0
+        self.rejected = 0
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                self._reply(200, {'version': {'number': '8.10.2'}, 'tagline': 'stand-in'})
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                if not self.path.endswith('/_bulk'):
+                    return self._reply(404, {'error': 'not found'})
+                if self.headers.get('Content-Encoding') == 'gzip':
+                    body = gzip.decompress(body)
+                if stand_in.latency:
+                    time.sleep(stand_in.latency)
+                with stand_in.lock:
+                    stand_in.requests += 1
+                    if random.random() < stand_in.reject_rate:
+                        stand_in.rejected += 1
+                        return self._reply(429, {'error': 'es_rejected_execution_exception', 'status': 429})
+                lines = body.splitlines()
+                items = []
+                with stand_in.lock:
+                    for action_line in lines[0::2]:
+                        index = json.loads(action_line)['index']['_index']
+                        if random.random() < stand_in.item_reject_rate:
+                            items.append({'index': {'_index': index, 'status': 429}})
+                            continue
+                        stand_in.indices[index] = stand_in.indices.get(index, 0) + 1
+                        items.append({'index': {'_index': index, 'status': 201}})
+                errors = any(item['index']['status'] >= 300 for item in items)
+                self._reply(200, {'took': 1, 'errors': errors, 'items': items})
+
+            def _reply(self, status, payload):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def summary(self):
+        with self.lock:
+            return {'requests': self.requests, 'rejected': self.rejected, 'docs': sum(self.indices.values()),
+                    'indices': dict(self.indices)}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+    for name, helptext in (('tail', 'Follow a log file and ship new records'),
+                           ('backfill', 'Ship whole files in parallel chunks')):
+        command = commands.add_parser(name, help=helptext)
+        command.add_argument('files', nargs='+' if name == 'backfill' else 1)
+        command.add_argument('--url', default=os.getenv('ELASTICSEARCH_URL', 'http://localhost:9200'))
+        command.add_argument('--user', default=os.getenv('ELASTICSEARCH_USER', 'elastic'))
+        command.add_argument('--password', default=os.getenv('ELASTICSEARCH_PASSWORD', 'changeme'))
+        command.add_argument('--format', choices=('json', 'text'), default='json',
+                             help="app.log format (LOG_FORMAT); 'text' enables multiline records")
+        command.add_argument('--registry', default='log_shipper_registry.json', help='Offset registry file')
+        command.add_argument('--bulk-max-bytes', type=int, default=5 * 1024 * 1024,
+                             help='Uncompressed bytes per _bulk request')
+        command.add_argument('--bulk-max-docs', type=int, default=2000)
+        command.add_argument('--max-in-flight', type=int, default=4, help='Concurrent _bulk requests')
+        command.add_argument('--max-retries', type=int, default=0, help='0 retries 429/5xx forever')
+        command.add_argument('--backoff-max', type=float, default=30.0)
+        command.add_argument('--stand-in', action='store_true', help='Ship to a local _bulk stand-in')
+        command.add_argument('--stand-in-reject-rate', type=float, default=0.0,
+                             help='Fraction of stand-in requests answered with 429')
+        if name == 'tail':
+            command.add_argument('--flush-interval', type=float, default=1.0,
+                                 help='Maximum seconds a record waits for its batch')
+        else:
+            command.add_argument('--workers', type=int, default=os.cpu_count() or 2)
+            command.add_argument('--chunk-size', type=int, default=8 * 1024 * 1024)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    stand_in = None
+    if args.stand_in:
+        stand_in = StandInBulkServer(reject_rate=args.stand_in_reject_rate).start()
+        args.url = stand_in.url
+        print(f"Shipping to stand-in _bulk endpoint at {stand_in.url}")
+    sender_options = {
+        'url': args.url, 'user': args.user, 'password': args.password,
+        'max_in_flight': args.max_in_flight, 'max_retries': args.max_retries,
+        'backoff_max': args.backoff_max,
+    }
+    registry = Registry(args.registry)
+
+    if args.command == 'backfill':
+        stats = backfill(args.files, args, sender_options, registry)
+    else:
+        tailer = Tailer(args.files[0], sender_options, registry, Enricher(args.format),
+                        args.bulk_max_bytes, args.bulk_max_docs, flush_interval=args.flush_interval)
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, lambda *_: tailer.stopping.set())
+        print(f"Tailing {tailer.path} (Ctrl-C to stop)")
+        tailer.run()
+        stats = tailer.sender.stats()
+
+    print(json.dumps(stats))
+    if stand_in:
+        print(json.dumps(stand_in.summary()))
+        stand_in.stop()
+
+
+if __name__ == '__main__':
+    main()
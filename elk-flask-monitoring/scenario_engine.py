@@ -0,0 +1,406 @@
+#!/usr/bin/env python3
+"""
+Declarative load scenarios driven by a token-bucket scheduler
+
+A scenario is a JSON (or YAML, if PyYAML is installed) file in scenarios/.
+It is a list of phases, each with a duration, a rate profile and a weighted
+mix of requests. Hooks such as /simulate-pool-exhaustion can run before the
+first phase, at given offsets during the run, and after the last phase:
+
+    {
+      "title": "Pool exhaustion under a ramp",
+      "max_connections": 16,
+      "setup": [{"method": "POST", "path": "/reset-pool"}],
+      "phases": [
+        {"name": "warm", "duration": 30, "rate": 20,
+         "mix": [{"name": "get_book", "method": "GET", "path": "/books/{randint:1:100}", "weight": 3},
+                 {"name": "list_books", "method": "GET", "path": "/books"}]},
+        {"name": "ramp", "duration": 60, "rate": {"profile": "ramp", "from": 20, "to": 200}}
+      ],
+      "hooks": [{"at": 45, "method": "POST", "path": "/simulate-pool-exhaustion"}],
+      "teardown": [{"wait": 2}, {"method": "POST", "path": "/reset-pool"}]
+    }
+
+Rate profiles (requests per second, ``t`` counted from the phase start):
+- ``steady``: ``rate``; a bare number means the same
+- ``ramp``: ``from`` to ``to``, linear over the phase
+- ``spike``: ``rate``, with ``peak`` from ``at`` for ``width`` seconds
+- ``sine``: ``rate`` +/- ``amplitude`` over ``period`` seconds
+
+A phase without ``mix`` keeps the previous phase's mix. ``"order":
+"sequence"`` sends the mix in listed order instead of drawing by weight.
+``{randint:A:B}`` in a path or body string is replaced per request.
+
+The bucket fills at the profile's rate and every whole token sends one
+request, so the count sent tracks the integral of the profile. Latency is
+measured from when each token became due, as in load_engine.py.
+
+Usage:
+    python scenario_engine.py --list
+    python scenario_engine.py scenario3 --stand-in
+    python scenario_engine.py scenarios/pool_exhaustion_cycle.json --rate-scale 2 --url http://localhost:5000
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import os
+import random
+import re
+import sys
+from collections import Counter
+
+from load_engine import FLASK_URL, HttpClient, LoadReport, OpenLoopEngine, Operation, StandInServer, _send_hooks
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+SCENARIO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scenarios')
+PLACEHOLDER = re.compile(r'\{randint:(-?\d+):(-?\d+)\}')
+# Longest sleep of the scheduler loop, so rate changes are picked up promptly
+MAX_TICK = 0.05
+# Integration step for rate profiles, in seconds
+STEP = 0.01
+# Float steps leave a whole token just under 1.0; without this the last request of a run is lost
+TOKEN_EPSILON = 1e-6
+
+
+# --- Definitions ---------------------------------------------------------
+
+def _profile(spec, duration, where):
+    """Rate function of seconds since the phase start"""
+    if isinstance(spec, (int, float)):
+        spec = {'profile': 'steady', 'rate': spec}
+    kind = spec.get('profile', 'steady')
+    try:
+        if kind == 'steady':
+            rate = float(spec['rate'])
+            return lambda t: rate
+        if kind == 'ramp':
+            low, high = float(spec['from']), float(spec['to'])
+            return lambda t: low + (high - low) * min(t / duration, 1.0)
+        if kind == 'spike':
+            rate, peak = float(spec['rate']), float(spec['peak'])
+            at, width = float(spec['at']), float(spec['width'])
+            return lambda t: peak if at <= t < at + width else rate
+        if kind == 'sine':
+            rate, amplitude = float(spec['rate']), float(spec['amplitude'])
+            period = float(spec['period'])
+            return lambda t: rate + amplitude * math.sin(2 * math.pi * t / period)
+    except KeyError as e:
+        raise ValueError(f"{where}: '{kind}' profile needs {e}")
+    raise ValueError(f"{where}: unknown rate profile '{kind}'")
+
+
+def _render(value):
+    if isinstance(value, str):
+        return PLACEHOLDER.sub(lambda m: str(random.randint(int(m.group(1)), int(m.group(2)))), value)
+    if isinstance(value, dict):
+        return {key: _render(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_render(item) for item in value]
+    return value
+
+
+def _template(value):
+    if PLACEHOLDER.search(json.dumps(value)):
+        return lambda: _render(value)
+    return value
+
+
+def _operation(spec, where):
+    if 'path' not in spec:
+        raise ValueError(f"{where}: request needs a 'path'")
+    method = spec.get('method', 'GET').upper()
+    weight = float(spec.get('weight', 1.0))
+    if weight <= 0:
+        raise ValueError(f"{where}: weight must be positive")
+    return Operation(spec.get('name', f"{method} {spec['path']}"), method,
+                     _template(spec['path']), _template(spec.get('body')), weight)
+
+
+def _hooks(specs, where):
+    hooks = []
+    for spec in specs or []:
+        if 'wait' in spec:
+            hooks.append(('wait', float(spec['wait'])))
+        elif 'path' in spec:
+            hooks.append((spec.get('method', 'POST').upper(), spec['path']))
+        else:
+            raise ValueError(f"{where}: hook needs a 'path' or a 'wait'")
+    return hooks
+
+
+class Phase:
+    def __init__(self, name, start, duration, rate, operations, order):
+        self.name = name
+        self.start = start
+        self.duration = duration
+        self.rate = rate
+        self.operations = operations
+        self.order = order
+
+
+class Scenario:
+    """A parsed scenario definition"""
+
+    def __init__(self, data, source='<scenario>'):
+        self.source = source
+        self.name = data.get('name') or os.path.splitext(os.path.basename(source))[0]
+        self.title = data.get('title', self.name)
+        self.description = data.get('description', '')
+        self.expect = data.get('expect', [])
+        self.max_connections = int(data.get('max_connections', 256))
+        self.burst = float(data['burst']) if 'burst' in data else None
+        self.progress = float(data.get('progress', 0))
+        self.setup = _hooks(data.get('setup'), f"{source} setup")
+        self.teardown = _hooks(data.get('teardown'), f"{source} teardown")
+        self.hooks = []
+        for spec in data.get('hooks', []):
+            if 'at' not in spec or 'path' not in spec:
+                raise ValueError(f"{source} hooks: a hook needs 'at' and 'path'")
+            self.hooks.append((float(spec['at']), _hooks([spec], f"{source} hooks")[0]))
+        self.hooks.sort()
+
+        self.phases = []
+        start, operations, order = 0.0, None, 'weighted'
+        for index, spec in enumerate(data.get('phases', [])):
+            where = f"{source} phase {index + 1}"
+            duration = float(spec.get('duration', 0))
+            if duration <= 0:
+                raise ValueError(f"{where}: duration must be positive")
+            if 'mix' in spec:
+                operations = [_operation(op, where) for op in spec['mix']]
+                order = spec.get('order', 'weighted')
+            if not operations:
+                raise ValueError(f"{where}: no request mix")
+            if order not in ('weighted', 'sequence'):
+                raise ValueError(f"{where}: order must be 'weighted' or 'sequence'")
+            self.phases.append(Phase(spec.get('name', f"phase{index + 1}"), start, duration,
+                                     _profile(spec.get('rate', 1), duration, where), operations, order))
+            start += duration
+        if not self.phases:
+            raise ValueError(f"{source}: no phases")
+        self.duration = start
+
+    def phase_at(self, t):
+        # A token due right at a phase's end accrued in that phase
+        for phase in self.phases:
+            if t < phase.start + phase.duration + 1e-6:
+                return phase
+        return self.phases[-1]
+
+    def rate(self, t):
+        phase = self.phase_at(t)
+        return max(phase.rate(t - phase.start), 0.0)
+
+    def expected(self, scale=1.0):
+        """Requests the profile asks for over the whole run"""
+        return scale * _integrate(self.rate, 0.0, self.duration)
+
+
+def _integrate(rate, start, end):
+    steps = max(1, math.ceil((end - start) / STEP))
+    width = (end - start) / steps
+    return sum((rate(start + i * width) + rate(start + (i + 1) * width)) / 2 * width for i in range(steps))
+
+
+def load_scenario(name_or_path):
+    """Load a definition by path, or by name from scenarios/"""
+    path = name_or_path
+    if not os.path.exists(path):
+        for extension in ('.json', '.yaml', '.yml'):
+            candidate = os.path.join(SCENARIO_DIR, name_or_path + extension)
+            if os.path.exists(candidate):
+                path = candidate
+                break
+        else:
+            raise ValueError(f"No scenario '{name_or_path}' (see --list)")
+    with open(path) as f:
+        if path.endswith(('.yaml', '.yml')):
+            if yaml is None:
+                raise ValueError(f"{path}: YAML definitions need PyYAML (pip install pyyaml)")
+            data = yaml.safe_load(f)
+        else:
+            data = json.load(f)
+    return Scenario(data, path)
+
+
+def list_scenarios():
+    names = []
+    for file_name in sorted(os.listdir(SCENARIO_DIR)):
+        name, extension = os.path.splitext(file_name)
+        if extension in ('.json', '.yaml', '.yml'):
+            names.append(name)
+    return names
+
+
+# --- Scheduler -----------------------------------------------------------
+
+class ScenarioEngine(OpenLoopEngine):
+    """
+    Sends a scenario's requests at its profile's rate from a token bucket.
+
+    Tokens accrue at ``rate(t) * rate_scale`` and each whole token sends one
+    request, picked from the current phase's mix. At most ``burst`` tokens
+    (default: one second's worth at the current rate) are banked. If the
+    event loop stalls for longer than that, the excess is dropped and counted
+    rather than sent as one burst.
+    """
+
+    def __init__(self, scenario, base_url=FLASK_URL, max_connections=None, timeout=10.0, rate_scale=1.0):
+        super().__init__(base_url, scenario.expected(rate_scale) / scenario.duration, scenario.duration,
+                         max_connections or scenario.max_connections, timeout)
+        self.scenario = scenario
+        self.rate_scale = rate_scale
+        self.dropped = 0
+        self.sent = Counter()
+
+    async def run(self, operations=None, start_at=None):
+        loop = asyncio.get_running_loop()
+        scenario = self.scenario
+        client = HttpClient(self.base_url, self.max_connections, self.timeout)
+        report = LoadReport()
+        tasks = set()
+        hooks = list(scenario.hooks)
+        sequences = {}
+        tokens, last = 0.0, 0.0
+        next_progress = scenario.progress or math.inf
+        start = start_at if start_at is not None else loop.time()
+        try:
+            while not self._stopping:
+                now = min(loop.time() - start, self.duration)
+                while hooks and hooks[0][0] <= now:
+                    _, hook = hooks.pop(0)
+                    task = loop.create_task(_send_hooks(self.base_url, [hook], self.timeout))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+
+                tokens += self.rate_scale * _integrate(scenario.rate, last, now)
+                rate = scenario.rate(now) * self.rate_scale
+                burst = scenario.burst or max(rate, 1.0)
+                if tokens > burst:
+                    self.dropped += int(tokens - burst)
+                    tokens -= int(tokens - burst)
+                while tokens >= 1 - TOKEN_EPSILON:
+                    # When this token became due: the ones still in the bucket arrived after it
+                    intended = now - max(tokens - 1, 0.0) / rate if rate > 0 else now
+                    intended = max(intended, last)
+                    phase = scenario.phase_at(intended)
+                    if phase.order == 'sequence':
+                        cycle = sequences.setdefault(id(phase), itertools.cycle(phase.operations))
+                        op = next(cycle)
+                    else:
+                        op = self.random.choices(phase.operations, [o.weight for o in phase.operations])[0]
+                    task = loop.create_task(self._fire(client, op, start + intended, report))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                    report.scheduled += 1
+                    self.sent[phase.name] += 1
+                    tokens -= 1
+                last = now
+
+                if now >= next_progress:
+                    print(f"  [{now:.0f}s] {scenario.phase_at(now).name}: {report.scheduled} sent, "
+                          f"{rate:.2f} req/s now")
+                    next_progress += scenario.progress
+                if now >= self.duration:
+                    break
+                wake = MAX_TICK if rate <= 0 else min(MAX_TICK, (1 - tokens) / rate)
+                if hooks:
+                    wake = min(wake, hooks[0][0] - now)
+                await asyncio.sleep(max(wake, 0.001))
+            if tasks:
+                await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await client.close()
+        report.elapsed = loop.time() - start
+        return report
+
+
+async def run_definition(scenario, base_url=FLASK_URL, timeout=10.0, rate_scale=1.0):
+    """Run one scenario with its setup and teardown hooks and print its report"""
+    engine = ScenarioEngine(scenario, base_url, timeout=timeout, rate_scale=rate_scale)
+    expected = scenario.expected(rate_scale)
+    print(f"{scenario.title} - {expected:.0f} requests over {scenario.duration:g}s "
+          f"({', '.join(phase.name for phase in scenario.phases)})")
+    if scenario.description:
+        print(f"  {scenario.description}")
+    await _send_hooks(base_url, scenario.setup, timeout)
+    try:
+        report = await engine.run()
+    finally:
+        await _send_hooks(base_url, scenario.teardown, timeout)
+    report.print(scenario.title)
+    target = round(expected)
+    off = (report.scheduled - target) / target if target else 0.0
+    print(f"Target: {target} requests, sent {report.scheduled} ({off:+.1%})"
+          + (f", {engine.dropped} dropped after stalls" if engine.dropped else ''))
+    if len(scenario.phases) > 1:
+        for phase in scenario.phases:
+            target = rate_scale * _integrate(lambda t: max(phase.rate(t), 0.0), 0.0, phase.duration)
+            print(f"  {phase.name}: target {target:.0f}, sent {engine.sent[phase.name]}")
+    for line in scenario.expect:
+        print(f"Expected: {line}")
+    return report
+
+
+def run_scenario_file(name_or_path, base_url=FLASK_URL, **kwargs):
+    """Blocking wrapper for error_simulator.py"""
+    return asyncio.run(run_definition(load_scenario(name_or_path), base_url, **kwargs))
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Declarative load scenarios driven by a token-bucket scheduler")
+    parser.add_argument('scenarios', nargs='*', help="Scenario names from scenarios/ or definition files")
+    parser.add_argument('--list', action='store_true', help="List the shipped scenarios")
+    parser.add_argument('--url', default=FLASK_URL, help="Target base URL")
+    parser.add_argument('--rate-scale', type=float, default=1.0, help="Multiply every rate profile")
+    parser.add_argument('--timeout', type=float, default=10.0)
+    parser.add_argument('--stand-in', action='store_true',
+                        help="Run against a local stand-in server instead of --url")
+    parser.add_argument('--stand-in-latency', type=float, default=0.005,
+                        help="Mean stand-in service time in seconds")
+    return parser
+
+
+async def _main(args, scenarios):
+    stand_in = None
+    if args.stand_in:
+        stand_in = await StandInServer(latency=args.stand_in_latency).start()
+        args.url = stand_in.url
+        print(f"Stand-in server listening on {args.url}")
+    try:
+        for scenario in scenarios:
+            await run_definition(scenario, args.url, args.timeout, args.rate_scale)
+    finally:
+        if stand_in:
+            await stand_in.stop()
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.list or not args.scenarios:
+        for name in list_scenarios():
+            scenario = load_scenario(name)
+            print(f"{name:<24}{scenario.duration:>7g}s  {scenario.title}")
+        return
+    try:
+        scenarios = [load_scenario(name) for name in args.scenarios]
+    except (ValueError, OSError) as e:
+        raise SystemExit(str(e))
+    try:
+        asyncio.run(_main(args, scenarios))
+    except KeyboardInterrupt:
+        print("\nScenario run cancelled by user")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()